@@ -5,20 +5,26 @@ import uvicorn
 import aiofiles
 import configparser
 import asyncio
+import threading
 import time
 from typing import List
 from fastapi import FastAPI, UploadFile, File
 from fastapi.responses import JSONResponse
 from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uuid
+import json
 import shutil
 
 from sources.utility import pretty_print
 from sources.logger import Logger
 from sources.schemas import QueryRequest, QueryResponse
 from sources.startup import initialize_system
+from sources.model_registry import model_registry
+from sources.cache import cache_report
+from sources.streaming import TokenStream
 
 from dotenv import load_dotenv
 
@@ -51,9 +57,19 @@ if not os.path.exists(".screenshots"):
 api.mount("/screenshots", StaticFiles(directory=".screenshots"), name="screenshots")
 
 interaction = initialize_system(config, logger)
+token_stream = TokenStream()
+# Long-lived event loop running the agents, so pooled async HTTP clients survive between queries
+agent_loop = asyncio.new_event_loop()
+threading.Thread(target=agent_loop.run_forever, daemon=True, name="agent-loop").start()
 is_generating = False
 query_resp_history = []
 
+@api.on_event("shutdown")
+def close_session():
+    if config.getboolean('MAIN', 'save_session'):
+        interaction.save_session()
+    interaction.close_session()
+
 @api.get("/screenshot")
 async def get_screenshot():
     logger.info("Screenshot endpoint called")
@@ -112,6 +128,18 @@ async def health_check():
     logger.info("Health check endpoint called")
     return {"status": "healthy", "version": "0.1.0"}
 
+@api.get("/models")
+async def models_report():
+    logger.info("Models report endpoint called")
+    provider = interaction.agents[0].llm if interaction.agents else None
+    decoding = provider.decoding_stats.report() if hasattr(provider, "decoding_stats") else {}
+    return JSONResponse(status_code=200, content={"models": model_registry.report(), "decoding": decoding})
+
+@api.get("/cache")
+async def cache_stats():
+    logger.info("Cache stats endpoint called")
+    return JSONResponse(status_code=200, content={"caches": cache_report()})
+
 @api.get("/is_active")
 async def is_active():
     logger.info("Is active endpoint called")
@@ -194,18 +222,23 @@ async def process_query(request: QueryRequest):
         return JSONResponse(status_code=429, content=query_resp.jsonify())
 
     is_generating = True
+    uid = query_resp.uid
+    token_stream.open(uid)
+    interaction.set_token_callback(
+        lambda agent_name, token: token_stream.publish(uid, {"type": "token", "agent_name": agent_name, "token": token})
+    )
 
     async def run_query_in_background(query: str):
         global is_generating
         try:
-            def run_sync():
-                asyncio.run(think_wrapper(interaction, query))
-
-            await asyncio.to_thread(run_sync)
+            future = asyncio.run_coroutine_threadsafe(think_wrapper(interaction, query), agent_loop)
+            await asyncio.wrap_future(future)
         except Exception as e:
             logger.error(f"Background query error: {str(e)}")
         finally:
             is_generating = False
+            interaction.set_token_callback(None)
+            token_stream.close(uid)
             logger.info("Processing finished")
             if config.getboolean('MAIN', 'save_session'):
                 interaction.save_session()
@@ -214,6 +247,22 @@ async def process_query(request: QueryRequest):
     query_resp.status = "Processing"
     return JSONResponse(status_code=202, content=query_resp.jsonify())
 
+@api.get("/stream/{uid}")
+async def stream_answer(uid: str):
+    """
+    Server-sent events stream of the tokens generated for the query uid returned by /query.
+    """
+    logger.info(f"Stream endpoint called for {uid}")
+    if not token_stream.exists(uid):
+        return JSONResponse(status_code=404, content={"error": "No stream for this uid"})
+
+    async def event_generator():
+        async for event in token_stream.subscribe(uid):
+            yield f"data: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     print("[Agentic Local] Starting server...")
     envport = os.getenv("BACKEND_PORT")
@@ -10,6 +10,9 @@ from sources.interaction import Interaction
 from sources.agents import Agent, CoderAgent, CasualAgent, FileAgent, PlannerAgent, BrowserAgent, McpAgent
 from sources.browser import Browser, create_driver
 from sources.utility import pretty_print
+from sources.model_registry import model_registry
+from sources.cache import cache_from_config
+from sources.session_store import get_session_store
 
 import warnings
 warnings.filterwarnings("ignore")
@@ -23,10 +26,21 @@ async def main():
     personality_folder = "custom" if config.getboolean('MAIN', 'custom_personality') else "base"
     languages = config["MAIN"]["languages"].split(' ')
 
+    response_cache = None
+    if config.getboolean('CACHE', 'llm_responses', fallback=False):
+        response_cache = cache_from_config(config, "llm_responses")
     provider = Provider(provider_name=config["MAIN"]["provider_name"],
                         model=config["MAIN"]["provider_model"],
                         server_address=config["MAIN"]["provider_server_address"],
-                        is_local=config.getboolean('MAIN', 'is_local'))
+                        is_local=config.getboolean('MAIN', 'is_local'),
+                        response_cache=response_cache,
+                        cache_sampled=config.getboolean('CACHE', 'cache_sampled', fallback=False),
+                        greedy_decoding=config.getboolean('CACHE', 'greedy_decoding', fallback=False),
+                        draft_model=config.get('SPECULATIVE', 'draft_model', fallback='') or None,
+                        speculative_agent_types=config.get('SPECULATIVE', 'agent_types', fallback='').split(),
+                        num_assistant_tokens=config.getint('SPECULATIVE', 'num_assistant_tokens', fallback=5),
+                        precision=config.get('LOCAL_MODEL', 'precision', fallback='auto'),
+                        gguf_model=config.get('LOCAL_MODEL', 'gguf_model', fallback='') or None)
 
     browser = Browser(
         create_driver(headless=config.getboolean('BROWSER', 'headless_browser'), stealth_mode=stealth_mode, lang=languages[0]),
@@ -60,6 +74,9 @@ async def main():
                               recover_last_session=config.getboolean('MAIN', 'recover_last_session'),
                               langs=languages
                             )
+    model_registry.start_idle_reaper(ttl=config.getfloat('MAIN', 'model_idle_ttl', fallback=0))
+    get_session_store().compact(max_sessions=config.getint('MAIN', 'max_saved_sessions', fallback=0),
+                                binary=config.get('MAIN', 'session_format', fallback='jsonl') == 'snapshot')
     try:
         while interaction.is_active:
             interaction.get_user()
@@ -73,6 +90,7 @@ async def main():
     finally:
         if config.getboolean('MAIN', 'save_session'):
             interaction.save_session()
+        interaction.close_session()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -37,11 +37,11 @@ function App() {
       }
       const normalizedNewAnswer = normalizeAnswer(data.answer);
       const answerExists = messages.some(
-        (msg) => normalizeAnswer(msg.content) === normalizedNewAnswer
+        (msg) => !isStreamMessage(msg) && normalizeAnswer(msg.content) === normalizedNewAnswer
       );
       if (!answerExists) {
         setMessages((prev) => [
-          ...prev,
+          ...prev.filter((msg) => !isStreamMessage(msg)),
           {
             type: "agent",
             content: data.answer,
@@ -61,6 +61,45 @@ function App() {
     }
   }, [messages]);
 
+  const isStreamMessage = (msg) => String(msg.uid || "").startsWith("stream-");
+
+  const streamAnswer = (uid) => {
+    // Show the tokens as they are generated, the final answer still comes from /latest_answer
+    const source = new EventSource(`${BACKEND_URL}/stream/${uid}`);
+    const streamId = `stream-${uid}`;
+    source.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type === "done") {
+        source.close();
+        return;
+      }
+      setMessages((prev) => {
+        const idx = prev.findIndex((msg) => msg.uid === streamId);
+        if (idx === -1) {
+          return [
+            ...prev,
+            {
+              type: "agent",
+              content: event.token,
+              agentName: event.agent_name,
+              status: "Generating...",
+              uid: streamId,
+            },
+          ];
+        }
+        const updated = [...prev];
+        updated[idx] = {
+          ...updated[idx],
+          content: updated[idx].content + event.token,
+          agentName: event.agent_name,
+        };
+        return updated;
+      });
+      scrollToBottom();
+    };
+    source.onerror = () => source.close();
+  };
+
   useEffect(() => {
     const intervalId = setInterval(() => {
       checkHealth();
@@ -165,6 +204,9 @@ function App() {
       console.log("Response:", res.data);
       const data = res.data;
       updateData(data);
+      if (data.uid) {
+        streamAnswer(data.uid);
+      }
     } catch (err) {
       console.error("Error:", err);
       const responseData = err?.response?.data;
@@ -48,6 +48,8 @@ class Agent():
         self.status_message = "Haven't started yet"
         self.stop = False
         self.verbose = verbose
+        self.token_callback = None
+        self.stop_sequences = []
         self.executor = ThreadPoolExecutor(max_workers=1)
     
     @property
@@ -120,6 +122,12 @@ class Agent():
         except Exception as e:
             raise e
     
+    def set_token_callback(self, callback: Callable | None) -> None:
+        """
+        Set a function called with each text chunk as the LLM generates it (None to disable streaming).
+        """
+        self.token_callback = callback
+
     def request_stop(self) -> None:
         """
         Request the agent to stop.
@@ -157,21 +165,59 @@ class Agent():
         end_idx = text.rfind(end_tag)+8
         return text[start_idx:end_idx]
     
-    async def llm_request(self) -> Tuple[str, str]:
+    async def llm_request(self, **options) -> Tuple[str, str]:
         """
         Asynchronously ask the LLM to process the prompt.
+        Providers with an async API are awaited directly, others run in the agent executor.
+        Args:
+            **options: Request options passed to the provider on top of llm_options() (eg: json_schema)
         """
         self.status_message = "Thinking..."
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, self.sync_llm_request)
+        if not hasattr(self.llm, "arespond"):
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, lambda: self.sync_llm_request(**options))
+        memory = self.memory.get_context()
+        thought = await self.llm.arespond(memory, self.verbose, **self.llm_options(), **options)
+        return self.handle_llm_answer(thought)
     
-    def sync_llm_request(self) -> Tuple[str, str]:
+    def llm_options(self) -> dict:
+        """
+        Get the optional arguments passed to the provider for this agent requests.
+        """
+        options = {}
+        if self.token_callback is not None:
+            callback = self.token_callback
+            options['on_token'] = lambda token: callback(self.agent_name, token)
+        if self.stop_sequences and self.llm_supports("stop"):
+            options['stop'] = self.stop_sequences
+        if self.llm_supports("agent_type"):
+            options['agent_type'] = self.type
+        return options
+
+    def get_context_budget(self):
+        """
+        Get the context budget of the provider model, None if the provider has none (the memory guess it from the model name).
+        """
+        return getattr(self.llm, "get_context_budget", lambda: None)()
+
+    def llm_supports(self, option: str) -> bool:
+        """
+        Check if the provider honors a request option (eg: stop, json_schema).
+        """
+        return getattr(self.llm, "supports_option", lambda name: False)(option)
+
+    def sync_llm_request(self, **options) -> Tuple[str, str]:
         """
         Ask the LLM to process the prompt and return the answer and the reasoning.
         """
-        memory = self.memory.get()
-        thought = self.llm.respond(memory, self.verbose)
+        memory = self.memory.get_context()
+        thought = self.llm.respond(memory, self.verbose, **self.llm_options(), **options)
+        return self.handle_llm_answer(thought)
 
+    def handle_llm_answer(self, thought: str) -> Tuple[str, str]:
+        """
+        Split the LLM answer into answer and reasoning, and push the answer to memory.
+        """
         reasoning = self.extract_reasoning_text(thought)
         answer = self.remove_reasoning_text(thought)
         self.memory.push('assistant', answer)
@@ -31,6 +31,7 @@ class BrowserAgent(Agent):
         }
         self.role = "web"
         self.type = "browser_agent"
+        self.stop_sequences = [Action.REQUEST_EXIT.value]
         self.browser = browser
         self.current_page = ""
         self.search_history = []
@@ -42,7 +43,8 @@ class BrowserAgent(Agent):
         self.memory = Memory(self.load_prompt(prompt_path),
                         recover_last_session=False, # session recovery in handled by the interaction class
                         memory_compression=False,
-                        model_provider=provider.get_model_name() if provider else None)
+                        model_provider=provider.get_model_name() if provider else None,
+                        context_budget=self.get_context_budget())
     
     def get_today_date(self) -> str:
         """Get the date"""
@@ -33,7 +33,8 @@ class PlannerAgent(Agent):
         self.memory = Memory(self.load_prompt(prompt_path),
                                 recover_last_session=False, # session recovery in handled by the interaction class
                                 memory_compression=False,
-                                model_provider=provider.get_model_name())
+                                model_provider=provider.get_model_name(),
+                                context_budget=self.get_context_budget())
         self.logger = Logger("planner_agent.log")
     
     def get_task_names(self, text: str) -> List[str]:
@@ -102,6 +103,47 @@ class PlannerAgent(Agent):
             return list(map(list, zip(names, tasks)))
         return list(map(list, zip(tasks_names, tasks)))
     
+    def plan_schema(self, allow_empty: bool = False) -> dict:
+        """
+        Get the JSON schema of a plan, used to constrain the LLM answer when the provider supports it.
+        Args:
+            allow_empty (bool): Accept an empty plan, meaning no update is needed.
+        Returns:
+            dict: The JSON schema of {"plan": [{agent, id, need, task}]}.
+        """
+        task_schema = {
+            "type": "object",
+            "properties": {
+                "agent": {"type": "string", "enum": [name.capitalize() for name in self.agents.keys()]},
+                "id": {"type": "string"},
+                "need": {"type": ["array", "null"], "items": {"type": "string"}},
+                "task": {"type": "string"}
+            },
+            "required": ["agent", "id", "need", "task"],
+            "additionalProperties": False
+        }
+        return {
+            "title": "plan",
+            "type": "object",
+            "properties": {
+                "plan": {"type": "array", "items": task_schema, "minItems": 0 if allow_empty else 1}
+            },
+            "required": ["plan"],
+            "additionalProperties": False
+        }
+
+    def is_empty_plan(self, text: str) -> bool:
+        """
+        Check if the LLM answer is an empty json plan.
+        """
+        blocks, _ = self.tools["json"].load_exec_block(text)
+        if not blocks:
+            return False
+        try:
+            return all(json.loads(block).get('plan') == [] for block in blocks)
+        except (ValueError, AttributeError):
+            return False
+
     def make_prompt(self, task: str, agent_infos_dict: dict) -> str:
         """
         Generates a prompt for the agent based on the task and previous agents work information.
@@ -142,21 +184,31 @@ class PlannerAgent(Agent):
             pretty_print(f"{task['agent']} -> {task['task']}", color="info")
         pretty_print("▔▗ E N D ▖▔", color="status")
 
-    async def make_plan(self, prompt: str) -> str:
+    async def make_plan(self, prompt: str, allow_empty: bool = False, max_attempts: int = 3) -> str:
         """
         Asks the LLM to make a plan.
+        Providers supporting structured outputs are constrained to the plan schema, so the plan parse on the first pass.
         Args:
             prompt (str): The prompt to be sent to the LLM.
+            allow_empty (bool): Accept an empty plan, meaning no update is needed.
+            max_attempts (int): Give up (empty plan) after this many answers that could not be parsed.
         Returns:
             str: The plan made by the LLM.
         """
         ok = False
+        attempts = 0
         answer = None
-        while not ok:
+        options = {}
+        if self.llm_supports("json_schema"):
+            options['json_schema'] = self.plan_schema(allow_empty)
+        elif allow_empty and self.llm_supports("stop"):
+            options['stop'] = ["NO_UPDATE"]
+        while not ok and attempts < max_attempts:
+            attempts += 1
             animate_thinking("Thinking...", color="status")
             self.memory.push('user', prompt)
-            answer, reasoning = await self.llm_request()
-            if "NO_UPDATE" in answer:
+            answer, reasoning = await self.llm_request(**options)
+            if "NO_UPDATE" in answer or (allow_empty and self.is_empty_plan(answer)):
                 return []
             agents_tasks = self.parse_agent_tasks(answer)
             if agents_tasks == []:
@@ -166,6 +218,9 @@ class PlannerAgent(Agent):
                 continue
             self.show_plan(agents_tasks, answer)
             ok = True
+        if not ok:
+            self.logger.warning(f"No plan parsed after {attempts} attempts.")
+            return []
         self.logger.info(f"Plan made:\n{answer}")
         return self.parse_agent_tasks(answer)
     
@@ -201,7 +256,7 @@ class PlannerAgent(Agent):
         Agent {id} work was a {tool_success_str} according to system interpreter.
         {next_task}
         Is the work done for task {id} leading to success or failure ? Did an agent fail with a task?
-        If agent work was good: answer "NO_UPDATE"
+        If agent work was good: answer "NO_UPDATE" (or an empty plan).
         If agent work is leading to failure: update the plan.
         If a task failed add a task to try again or recover from failure. You might have near identical task twice.
         plan should be within ```json like before.
@@ -210,7 +265,7 @@ class PlannerAgent(Agent):
         Do not change past tasks. Change next tasks.
         """
         pretty_print("Updating plan...", color="status")
-        plan = await self.make_plan(update_prompt)
+        plan = await self.make_plan(update_prompt, allow_empty=True)
         if plan == []:
             pretty_print("No plan update required.", color="info")
             return agents_tasks
@@ -0,0 +1,121 @@
+import os
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from sources.logger import Logger
+
+BLOB_THRESHOLD = 2048 # messages longer than this (chars) are stored as blobs
+PREVIEW_CHARS = 256
+
+class BlobStore:
+    """
+    Content-addressed store of large texts (tool outputs, page texts...): each text is written once,
+    zlib compressed, at <root>/<hash[:2]>/<hash>, whatever the number of messages or sessions referencing it.
+    Recently read texts are kept in a small LRU bounded in bytes.
+    """
+    def __init__(self, root: str = "conversations/blobs", max_memory_bytes: int = 8 * 1024 * 1024):
+        self.logger = Logger("memory.log")
+        self.root = root
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_ref(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def blob_path(self, ref: str) -> str:
+        return os.path.join(self.root, ref[:2], ref)
+
+    def remember(self, ref: str, text: str) -> None:
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+                return
+            self._memory[ref] = text
+            self._memory_bytes += len(text)
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def put(self, text: str) -> str:
+        """
+        Store a text, return its reference. Storing a text already stored only touches its file.
+        """
+        ref = self.make_ref(text)
+        path = self.blob_path(ref)
+        if os.path.exists(path):
+            os.utime(path) # keep it out of the garbage collection grace period
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(text.encode("utf-8")))
+            os.replace(tmp_path, path)
+        self.remember(ref, text)
+        return ref
+
+    def get(self, ref: str) -> Optional[str]:
+        """
+        Get a stored text, None if it is missing.
+        """
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+                return self._memory[ref]
+        try:
+            with open(self.blob_path(ref), "rb") as f:
+                text = zlib.decompress(f.read()).decode("utf-8")
+        except (OSError, zlib.error) as e:
+            self.logger.warning(f"Blob {ref} unreadable: {e}")
+            return None
+        self.remember(ref, text)
+        return text
+
+    def collect_garbage(self, referenced: Iterable[str], grace: float = 86400) -> int:
+        """
+        Remove the blobs no session references anymore, unless written or touched in the last grace seconds
+        (memories of running sessions may not be saved yet).
+        Returns:
+            int: Number of blobs removed
+        """
+        referenced = set(referenced)
+        removed = 0
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for ref in os.listdir(folder):
+                path = os.path.join(folder, ref)
+                if ref in referenced or now - os.path.getmtime(path) < grace:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def preview(text: str) -> str:
+        """
+        Get the short text kept in memory in place of a blob.
+        """
+        return text[:PREVIEW_CHARS] + f"... [{len(text)} chars]"
+
+_stores: Dict[str, BlobStore] = {}
+_stores_lock = threading.Lock()
+
+def get_blob_store(root: str = "conversations/blobs") -> BlobStore:
+    """
+    Get the blob store of a folder, shared by all the memories.
+    """
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = BlobStore(root)
+        return _stores[root]
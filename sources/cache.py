@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sources.logger import Logger
+
+DEFAULT_CACHE_PATH = ".cache/agentic_cache.db"
+
+class PersistentCache:
+    """
+    PersistentCache is a string key/value store with an in-memory LRU in front of a SQLite table.
+    Entries expire after ttl seconds (0 to never expire).
+    When the on-disk entries of the namespace exceed max_disk_bytes, the least recently accessed are evicted.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 namespace: str = "default",
+                 max_memory_items: int = 256,
+                 max_disk_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 86400):
+        self.logger = Logger("cache.log")
+        self.path = path
+        self.namespace = namespace
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                                namespace TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                value TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                accessed REAL NOT NULL,
+                                PRIMARY KEY (namespace, key))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (namespace, accessed)")
+        self._conn.commit()
+        caches[namespace] = self
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Hash json serializable parts into a cache key.
+        """
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get a value, looking in memory first then on disk.
+        Returns:
+            Optional[str]: The value, None on miss or if the entry expired
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self.is_expired(entry[1]):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+            row = self._conn.execute("SELECT value, created FROM entries WHERE namespace = ? AND key = ?",
+                                     (self.namespace, key)).fetchone()
+            if row is None or self.is_expired(row[1]):
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                               (time.time(), self.namespace, key))
+            self._conn.commit()
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a value in memory and on disk, then evict the oldest entries if the disk budget is exceeded.
+        """
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            self._remember(key, value, now)
+            self._conn.execute("INSERT OR REPLACE INTO entries (namespace, key, value, size, created, accessed) "
+                               "VALUES (?, ?, ?, ?, ?, ?)",
+                               (self.namespace, key, value, size, now, now))
+            self._evict_disk()
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+                                   (self.namespace,)).fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed ASC",
+                                  (self.namespace,)).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?",
+                               [(self.namespace, key) for key in evicted])
+        for key in evicted:
+            self._memory.pop(key, None)
+        self.evictions += len(evicted)
+        self.logger.info(f"Cache {self.namespace}: evicted {len(evicted)} entries to stay under {self.max_disk_bytes} bytes.")
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, disk_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+                                                     (self.namespace,)).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "disk_bytes": disk_bytes
+        }
+
+caches: Dict[str, PersistentCache] = {}
+
+def cache_from_config(config, namespace: str, ttl: Optional[float] = None) -> PersistentCache:
+    """
+    Create a cache of a namespace with the settings of the [CACHE] section of config.ini.
+    Args:
+        ttl (float, optional): Overrides the configured ttl, for entries that never go stale (0 to never expire)
+    """
+    return PersistentCache(path=config.get('CACHE', 'path', fallback=DEFAULT_CACHE_PATH),
+                           namespace=namespace,
+                           max_memory_items=config.getint('CACHE', 'max_memory_items', fallback=256),
+                           max_disk_bytes=int(config.getfloat('CACHE', 'max_disk_mb', fallback=64) * 1024 * 1024),
+                           ttl=config.getfloat('CACHE', 'ttl', fallback=86400) if ttl is None else ttl)
+
+def cache_report() -> dict:
+    """
+    Get the hit/miss counters of every cache created in the process.
+    """
+    return {namespace: cache.stats() for namespace, cache in caches.items()}
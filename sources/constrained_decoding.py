@@ -0,0 +1,205 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+State = Tuple[tuple, ...]
+
+class SchemaPrefixMatcher:
+    """
+    SchemaPrefixMatcher checks, character by character, that a text is a prefix of a JSON document matching a schema.
+    Documents are matched in their compact canonical form: properties in the schema order, ", " and ": " separators.
+    Supported schema subset: object (every property), array (items, minItems, maxItems), string (enum), integer, null
+    and a list of types (["array", "null"]), told apart by the first character of the value.
+    States are immutable tuples, so the candidate tokens of a decoding step are all tried from the same state.
+    """
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+
+    def initial_state(self) -> State:
+        return (("value", self.schema),)
+
+    def is_complete(self, state: State) -> bool:
+        """
+        Tell whether a state is the end of a document (a trailing integer can still end there).
+        """
+        return state is not None and all(frame[0] == "int" and frame[1] > 0 for frame in state)
+
+    def feed(self, state: Optional[State], text: str) -> Optional[State]:
+        """
+        Advance a state with a text.
+        Returns:
+            Optional[State]: The new state, None if the text leave the schema
+        """
+        for char in text:
+            if state is None:
+                return None
+            state = self.feed_char(state, char)
+        return state
+
+    def expand(self, schema: Dict[str, Any]) -> State:
+        """
+        Get the frames matching a value of a schema, top of the stack last.
+        """
+        kind = schema.get("type")
+        if isinstance(kind, list):
+            return (("one_of", tuple({**schema, "type": option} for option in kind)),)
+        if kind == "object":
+            frames = []
+            opening = "{"
+            for i, (name, prop) in enumerate(schema.get("properties", {}).items()):
+                frames.append(("lit", f'{opening if i == 0 else ", "}"{name}": ', 0))
+                frames.append(("value", prop))
+            frames.append(("lit", "}", 0) if frames else ("lit", "{}", 0))
+        elif kind == "array":
+            frames = [("lit", "[", 0), ("arr_first", schema.get("items", {}),
+                                        schema.get("minItems", 0), schema.get("maxItems"))]
+        elif kind == "string":
+            enum = tuple(schema["enum"]) if "enum" in schema else None
+            frames = [("lit", '"', 0), ("str", enum, "", False)]
+        elif kind == "integer":
+            frames = [("int", 0)]
+        elif kind == "null":
+            frames = [("lit", "null", 0)]
+        else:
+            raise ValueError(f"Unsupported schema type for constrained decoding: {kind}")
+        return tuple(reversed(frames))
+
+    def feed_char(self, stack: State, char: str) -> Optional[State]:
+        while stack:
+            frame, rest = stack[-1], stack[:-1]
+            kind = frame[0]
+            if kind == "value":
+                stack = rest + self.expand(frame[1])
+                continue
+            if kind == "lit":
+                _, text, pos = frame
+                if text[pos] != char:
+                    return None
+                return rest if pos + 1 == len(text) else rest + (("lit", text, pos + 1),)
+            if kind == "str":
+                return self.feed_string(frame, rest, char)
+            if kind == "one_of":
+                for option in frame[1]:
+                    state = self.feed_char(rest + self.expand(option), char)
+                    if state is not None:
+                        return state
+                return None
+            if kind == "int":
+                if char.isascii() and char.isdigit():
+                    return rest + (("int", frame[1] + 1),)
+                if frame[1] == 0:
+                    return None
+                stack = rest # the integer ended, the char belongs to what follows
+                continue
+            if kind == "arr_first":
+                _, items, min_items, max_items = frame
+                if char == "]" and min_items == 0:
+                    return rest
+                if max_items == 0:
+                    return None
+                stack = rest + (("arr_next", items, 1, min_items, max_items), ("value", items))
+                continue
+            if kind == "arr_next":
+                _, items, count, min_items, max_items = frame
+                if char == "]" and count >= min_items:
+                    return rest
+                if char == "," and (max_items is None or count < max_items):
+                    return rest + (("arr_next", items, count + 1, min_items, max_items), ("value", items), ("lit", " ", 0))
+                return None
+            raise ValueError(f"Unknown frame: {kind}")
+        return None # the document is complete, nothing can follow
+
+    def feed_string(self, frame: tuple, rest: State, char: str) -> Optional[State]:
+        _, enum, buffer, escaped = frame
+        if escaped:
+            if enum is not None or char not in '"\\/bfnrtu':
+                return None
+            return rest + (("str", None, "", False),)
+        if char == "\\":
+            return None if enum is not None else rest + (("str", None, "", True),)
+        if char == '"':
+            if enum is not None and buffer not in enum:
+                return None
+            return rest
+        if char < " ":
+            return None
+        if enum is None:
+            return rest + (frame,)
+        buffer += char
+        if not any(value.startswith(buffer) for value in enum):
+            return None
+        return rest + (("str", enum, buffer, False),)
+
+class JsonSchemaLogitsProcessor:
+    """
+    Logits processor for transformers generate(), masking every token that would make the answer leave a JSON schema.
+    The best top_k tokens are checked first, the rest of the vocabulary only if none of them fit.
+    Once the document is complete only the end of sequence tokens are allowed.
+    """
+    def __init__(self, schema: Dict[str, Any], tokenizer: Any, eos_token_id: List[int], top_k: int = 32):
+        self.matcher = SchemaPrefixMatcher(schema)
+        self.tokenizer = tokenizer
+        self.eos_ids = [i for i in (eos_token_id if isinstance(eos_token_id, list) else [eos_token_id]) if i is not None]
+        self.top_k = top_k
+        self.prompt_length = None
+        self._token_text: Dict[int, str] = {}
+        self._rows: Dict[int, Tuple[List[int], List[Optional[State]]]] = {}
+
+    def token_text(self, token_id: int) -> str:
+        if token_id not in self._token_text:
+            text = self.tokenizer.decode([token_id], skip_special_tokens=False)
+            # partial utf-8 bytes can't be checked on their own
+            self._token_text[token_id] = "" if "\ufffd" in text else text
+        return self._token_text[token_id]
+
+    def row_state(self, row: int, generated: List[int]) -> Optional[State]:
+        """
+        Get the matcher state of a batch row after its generated tokens.
+        The state after each token is kept, so only new tokens are fed; when the row shrinks or diverges
+        (draft tokens rejected by assisted generation) the states past the common prefix are dropped.
+        """
+        tokens, states = self._rows.get(row, ([], [self.matcher.initial_state()]))
+        common = 0
+        for cached, token_id in zip(tokens, generated):
+            if cached != token_id:
+                break
+            common += 1
+        del tokens[common:]
+        del states[common + 1:]
+        for token_id in generated[common:]:
+            state = states[-1]
+            if token_id not in self.eos_ids and state is not None:
+                state = self.matcher.feed(state, self.token_text(token_id))
+            tokens.append(token_id)
+            states.append(state)
+        self._rows[row] = (tokens, states)
+        return states[-1]
+
+    def allowed_tokens(self, state: Optional[State], scores: Any) -> List[int]:
+        import torch
+
+        if state is None or self.matcher.is_complete(state):
+            return self.eos_ids
+        order = torch.argsort(scores, descending=True).tolist()
+        allowed = []
+        for start in range(0, len(order), self.top_k):
+            for token_id in order[start:start + self.top_k]:
+                if token_id in self.eos_ids:
+                    continue
+                text = self.token_text(token_id)
+                if text and self.matcher.feed(state, text) is not None:
+                    allowed.append(token_id)
+            if allowed:
+                break
+        return allowed or self.eos_ids
+
+    def __call__(self, input_ids: Any, scores: Any) -> Any:
+        import torch
+
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+        for row in range(input_ids.shape[0]):
+            state = self.row_state(row, input_ids[row, self.prompt_length:].tolist())
+            allowed = self.allowed_tokens(state, scores[row])
+            mask = torch.full_like(scores[row], float("-inf"))
+            mask[allowed] = 0
+            scores[row] = scores[row] + mask
+        return scores
@@ -0,0 +1,153 @@
+import hashlib
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from sources.logger import Logger
+from sources.context_budget import ContextBudget
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+class ContextAssembler:
+    """
+    ContextAssembler builds the messages sent to the LLM for a long session:
+    the system prompt pinned first, a summary of the dropped turns, then the most recent turns that fit the token budget.
+    To keep the provider prefix caches hitting, the window start does not slide at every turn:
+    once the budget overflows, old turns are dropped in one block down to the low watermark,
+    and the layout stays append-only until the next overflow.
+    """
+    def __init__(self, budget: ContextBudget,
+                 summary_fn: Optional[Callable[[dict], Optional[str]]] = None,
+                 content_fn: Optional[Callable[[dict], str]] = None,
+                 low_watermark: float = 0.5,
+                 summary_share: float = 0.2,
+                 digest_tokens: int = 96,
+                 cache_size: int = 1024):
+        """
+        Args:
+            budget (ContextBudget): Token budget of the model
+            summary_fn (Callable, optional): Getter of the summary of a dropped message, must not block:
+                returns None while no summary is ready, the head of the message is kept meanwhile
+            content_fn (Callable, optional): Getter of the full content of a message, message['content'] if None
+            low_watermark (float): Share of the prompt budget filled right after old turns are dropped
+            summary_share (float): Maximum share of the prompt budget used by the summary
+            digest_tokens (int): Maximum tokens of the digest of one dropped message
+            cache_size (int): Number of message digests cached
+        """
+        self.logger = Logger("memory.log")
+        self.budget = budget
+        self.summary_fn = summary_fn
+        self.content_fn = content_fn
+        self.low_watermark = low_watermark
+        self.summary_share = summary_share
+        self.digest_tokens = digest_tokens
+        self.cache_size = cache_size
+        self._digests: OrderedDict = OrderedDict()
+        self._first_kept = None
+        self._summary_message = None
+
+    def reset(self) -> None:
+        self._first_kept = None
+        self._summary_message = None
+
+    @staticmethod
+    def content_hash(message: dict) -> str:
+        text = f"{message.get('role', '')}\n{message.get('content', '')}\n{message.get('blob', '')}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def digest(self, message: dict) -> str:
+        """
+        Get the cached one line digest of a dropped message.
+        """
+        key = self.content_hash(message)
+        if key in self._digests:
+            self._digests.move_to_end(key)
+            return self._digests[key]
+        summary = self.summary_fn(message) if self.summary_fn is not None else None
+        if summary is None:
+            content = self.content_fn(message) if self.content_fn is not None else message.get('content', '')
+        else:
+            content = summary
+        content = " ".join(self.budget.truncate(str(content).strip(), self.digest_tokens).split())
+        digest = f"- {message.get('role', 'user')}: {content}"
+        if summary is None and self.summary_fn is not None:
+            return digest # not cached: the summary replaces the head of the message once ready
+        self._digests[key] = digest
+        if len(self._digests) > self.cache_size:
+            self._digests.popitem(last=False)
+        return digest
+
+    def summary_message(self, dropped: List[dict]) -> Optional[dict]:
+        """
+        Get the summary message of the dropped messages, the oldest digests go first when it exceeds its share.
+        The same dropped messages always give the same message object, so the layout is unchanged between turns.
+        """
+        if not dropped:
+            return None
+        digests = [self.digest(message) for message in dropped]
+        max_tokens = int(self.budget.prompt_limit * self.summary_share)
+        while len(digests) > 1 and self.budget.count("\n".join(digests)) > max_tokens:
+            digests.pop(0)
+        content = SUMMARY_HEADER + "\n" + "\n".join(digests)
+        if self._summary_message is None or self._summary_message['content'] != content:
+            self._summary_message = {'role': 'user', 'content': content}
+        return self._summary_message
+
+    def replace_message(self, old: dict, new: dict) -> None:
+        """
+        Follow the replacement of a memory message by another dict (e.g. its summary), the window start is tracked by identity.
+        """
+        if self._first_kept is old:
+            self._first_kept = new
+
+    def find_first_kept(self, messages: List[dict]) -> int:
+        """
+        Get the index of the first message of the window, 1 if the window was not slid yet or its start was removed.
+        """
+        if self._first_kept is not None:
+            for i in range(1, len(messages)):
+                if messages[i] is self._first_kept:
+                    return i
+        return 1
+
+    def next_cut(self, messages: List[dict], cut: int) -> int:
+        """
+        Get the window start after dropping old turns down to the low watermark.
+        The window starts on an assistant message, so the summary (user) and the window alternate roles.
+        """
+        target = int(self.budget.prompt_limit * self.low_watermark)
+        # reserve the room of the summary share, the summary is capped to it
+        target -= int(self.budget.prompt_limit * self.summary_share)
+        last = len(messages) - 1
+        new_cut = last
+        tokens = self.budget.count_message(messages[0]) + self.budget.count_message(messages[last])
+        while new_cut - 1 > cut and tokens + self.budget.count_message(messages[new_cut - 1]) <= target:
+            new_cut -= 1
+            tokens += self.budget.count_message(messages[new_cut])
+        if messages[new_cut].get('role') == 'user' and new_cut + 1 <= last \
+                and messages[new_cut + 1].get('role') == 'assistant':
+            new_cut += 1
+        return new_cut
+
+    def assemble(self, messages: List[dict]) -> List[dict]:
+        """
+        Build the messages sent to the LLM.
+        Args:
+            messages (list): The whole memory, system prompt first
+        Returns:
+            list: The system prompt, the summary of the dropped turns if any and the recent turns
+        """
+        if len(messages) < 2:
+            return list(messages)
+        cut = self.find_first_kept(messages)
+        summary = self.summary_message(messages[1:cut])
+        context = [messages[0]] + ([summary] if summary else []) + messages[cut:]
+        if self.budget.fits(context):
+            self._first_kept = messages[cut]
+            return context
+        new_cut = self.next_cut(messages, cut)
+        summary = self.summary_message(messages[1:new_cut])
+        context = [messages[0]] + ([summary] if summary else []) + messages[new_cut:]
+        self._first_kept = messages[new_cut]
+        self.logger.info(f"Context window slid: {new_cut - 1} old messages summarized, "
+                         f"{self.budget.count_messages(context)}/{self.budget.prompt_limit} tokens used.")
+        return context
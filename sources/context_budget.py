@@ -0,0 +1,176 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+# Context window of the known model families, the most specific names first.
+KNOWN_CONTEXT_SIZES = [
+    ("gpt-4.1", 1047576),
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4", 8192),
+    ("gpt-3.5", 16385),
+    ("o1", 200000),
+    ("o3", 200000),
+    ("o4", 200000),
+    ("gemini", 1048576),
+    ("claude", 200000),
+    ("deepseek-r1", 131072),
+    ("deepseek-chat", 65536),
+    ("deepseek-reasoner", 65536),
+    ("qwen3", 40960),
+    ("qwen2.5", 32768),
+    ("qwen2", 32768),
+    ("qwq", 131072),
+    ("llama3.1", 131072),
+    ("llama-3.1", 131072),
+    ("llama3.2", 131072),
+    ("llama-3.2", 131072),
+    ("llama3.3", 131072),
+    ("llama-3.3", 131072),
+    ("llama3", 8192),
+    ("llama-3", 8192),
+    ("mixtral", 32768),
+    ("mistral", 32768),
+    ("gemma3", 131072),
+    ("gemma-3", 131072),
+    ("gemma2", 8192),
+    ("gemma-2", 8192),
+    ("phi4", 16384),
+    ("phi3", 4096),
+]
+DEFAULT_CONTEXT_SIZE = 4096
+MESSAGE_OVERHEAD = 4 # role and chat template tokens around each message
+
+_PIECES = re.compile(r"\w+|[^\w\s]|\n")
+
+def known_context_size(model_name: Optional[str]) -> Optional[int]:
+    """
+    Get the context window of a model from its name, None for unknown models.
+    """
+    if not model_name:
+        return None
+    name = model_name.lower()
+    for pattern, size in KNOWN_CONTEXT_SIZES:
+        if pattern in name:
+            return size
+    return None
+
+def approximate_token_count(text: str) -> int:
+    """
+    Approximate the BPE token count of a text: words count one token per 4 chars,
+    punctuation and newlines one token each, non-ascii chars about one token each.
+    """
+    count = 0
+    for piece in _PIECES.findall(text):
+        if not piece.isascii():
+            count += len(piece)
+        elif piece[0].isalnum() or piece[0] == "_":
+            count += (len(piece) + 3) // 4
+        else:
+            count += 1
+    return count
+
+def approximate_counter(model_name: Optional[str]) -> Callable[[str], int]:
+    """
+    Get a fast token counter for a model without a local tokenizer.
+    Use tiktoken when installed (exact for OpenAI models, close for the others), the heuristic otherwise.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return approximate_token_count
+    name = (model_name or "").lower()
+    encoding = tiktoken.get_encoding("o200k_base" if any(p in name for p in ("gpt-4o", "gpt-4.1", "o1", "o3", "o4"))
+                                     else "cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+class ContextBudget:
+    """
+    ContextBudget counts the tokens of the conversation against the model context window.
+    Text counts are memoized, message counts are cached on the message under 'tokens'
+    so a history is only counted once per message as it grows.
+    """
+    def __init__(self, model_name: Optional[str],
+                 max_context: Optional[int] = None,
+                 count_fn: Optional[Callable[[str], int]] = None,
+                 reserve_tokens: Optional[int] = None,
+                 cache_size: int = 2048):
+        """
+        Args:
+            model_name (str): Name of the model
+            max_context (int, optional): Context window served by the backend, guessed from the model name if None
+            count_fn (Callable, optional): Exact token counter (the model tokenizer), approximated if None
+            reserve_tokens (int, optional): Tokens kept free for the answer, LLM_MAX_NEW_TOKENS by default
+            cache_size (int): Number of text counts memoized
+        """
+        self.model_name = model_name
+        self.max_context = max_context or known_context_size(model_name) or DEFAULT_CONTEXT_SIZE
+        self.exact = count_fn is not None
+        self.count_fn = count_fn or approximate_counter(model_name)
+        if reserve_tokens is None:
+            reserve_tokens = int(os.getenv("LLM_MAX_NEW_TOKENS", "512"))
+        self.reserve_tokens = min(reserve_tokens, self.max_context // 2)
+        self.cache_size = cache_size
+        self._counts: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text.
+        """
+        if not text:
+            return 0
+        key = (len(text), hash(text))
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        count = self.count_fn(text)
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return count
+
+    def count_message(self, message: dict) -> int:
+        """
+        Count the tokens of a message, using the count cached on the message if any.
+        """
+        cached = message.get('tokens')
+        if cached is not None:
+            return cached
+        return self.count(str(message.get('content', ''))) + MESSAGE_OVERHEAD
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+    @property
+    def prompt_limit(self) -> int:
+        """
+        Maximum number of prompt tokens, the context window minus the answer reserve.
+        """
+        return self.max_context - self.reserve_tokens
+
+    def available(self, messages: List[dict]) -> int:
+        """
+        Get the number of tokens left for the prompt after the messages.
+        """
+        return self.prompt_limit - self.count_messages(messages)
+
+    def fits(self, messages: List[dict]) -> bool:
+        return self.available(messages) >= 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Truncate a text to at most max_tokens tokens.
+        """
+        if max_tokens <= 0:
+            return ""
+        count = self.count(text)
+        while count > max_tokens:
+            # cut proportionally, with a margin as token density varies along the text
+            text = text[:max(0, int(len(text) * max_tokens / count * 0.95) - 1)]
+            count = self.count(text)
+        return text
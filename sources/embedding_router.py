@@ -0,0 +1,161 @@
+import os
+import time
+import argparse
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from sources.logger import Logger
+from sources.long_term_memory import Embedder
+from sources.router_snapshot import RouterSnapshots
+
+DEFAULT_ROUTER_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# one description per agent role, embedded as an extra example of the role
+ROLE_DESCRIPTIONS = {
+    "talk": "casual conversation, greetings, jokes, stories, opinions and general questions answered from knowledge",
+    "web": "search the internet, browse websites and find online information, news, prices or research papers",
+    "code": "write, run or debug a program or a script in a programming language",
+    "files": "find, read, create, move or organize files and folders on the computer",
+    "planification": "a complex project in several steps, like researching on the web then building an application",
+    "mcp": "use a tool of an MCP server or an external service integration",
+}
+LABEL_ALIASES = {"coding": "code"}
+
+class EmbeddingRouter:
+    """
+    Zero-shot routing with sentence embeddings: each agent role is represented by the normalized mean
+    embedding of its description and few-shot examples, computed once.
+    A query is then classified with one encoder pass and a dot product, whatever the number of roles,
+    where the NLI zero-shot pipeline needs one pass per role.
+    """
+    def __init__(self, few_shots: List[Tuple[str, str]],
+                 embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 model_name: str = DEFAULT_ROUTER_EMBEDDING_MODEL,
+                 snapshots: Optional[RouterSnapshots] = None,
+                 temperature: float = 0.05):
+        """
+        Args:
+            few_shots (list): (text, role) examples
+            embed_fn (Callable, optional): Function embedding texts into L2 normalized vectors, Embedder(model_name) by default
+            model_name (str): Embedding model
+            snapshots (RouterSnapshots, optional): Where to save the role prototypes, computed at each start if None
+            temperature (float): Softmax temperature turning the cosine similarities into confidences
+        """
+        self.logger = Logger("router.log")
+        self.embed_fn = embed_fn or Embedder(model_name)
+        self.temperature = temperature
+        examples = [(text, LABEL_ALIASES.get(label, label)) for text, label in few_shots]
+        examples += [(description, role) for role, description in ROLE_DESCRIPTIONS.items()]
+        if snapshots is None:
+            self.labels, self.prototypes = self.build(examples)
+        else:
+            (self.labels, self.prototypes), _ = snapshots.load_or_train("embedding", examples, load_fn=self.load,
+                                                                        train_fn=self.build, save_fn=self.save)
+
+    def build(self, examples: List[Tuple[str, str]]) -> Tuple[List[str], np.ndarray]:
+        """
+        Compute the prototype of each role from its examples.
+        """
+        vectors = np.asarray(self.embed_fn([text for text, _ in examples]), dtype=np.float32)
+        labels = sorted({label for _, label in examples})
+        prototypes = np.stack([vectors[[i for i, (_, label) in enumerate(examples) if label == role]].mean(axis=0)
+                               for role in labels])
+        prototypes /= np.maximum(np.linalg.norm(prototypes, axis=1, keepdims=True), 1e-9)
+        return labels, prototypes
+
+    @staticmethod
+    def save(built: Tuple[List[str], np.ndarray], path: str) -> None:
+        labels, prototypes = built
+        np.save(os.path.join(path, "prototypes.npy"), prototypes)
+        with open(os.path.join(path, "labels.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(labels))
+
+    @staticmethod
+    def load(path: str) -> Tuple[List[str], np.ndarray]:
+        with open(os.path.join(path, "labels.txt"), "r", encoding="utf-8") as f:
+            labels = f.read().split("\n")
+        return labels, np.load(os.path.join(path, "prototypes.npy"))
+
+    def classify(self, text: str, labels: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Classify a query among the roles.
+        Args:
+            text (str): The query, in English
+            labels (list, optional): Candidate roles, all the known roles if None
+        Returns:
+            list: (role, confidence) pairs, best first
+        """
+        rows = [i for i, label in enumerate(self.labels) if labels is None or label in labels]
+        query = np.asarray(self.embed_fn([text])[0], dtype=np.float32)
+        scores = self.prototypes[rows] @ query
+        confidences = np.exp((scores - scores.max()) / self.temperature)
+        confidences /= confidences.sum()
+        order = np.argsort(-confidences)
+        return [(self.labels[rows[i]], float(confidences[i])) for i in order]
+
+# queries held out of the few-shot examples, in English as the router classifies the translated text
+EVAL_SET = [
+    ("hey, how was your day?", "talk"),
+    ("tell me a joke about cats", "talk"),
+    ("what do you think about the meaning of life?", "talk"),
+    ("good morning!", "talk"),
+    ("can you tell me a short story about a dragon?", "talk"),
+    ("search online for the best hiking trails in Colorado", "web"),
+    ("what is the current price of bitcoin?", "web"),
+    ("find the latest news about the Mars rover", "web"),
+    ("look up reviews of the new iPhone", "web"),
+    ("browse the web for cheap flights to Tokyo", "web"),
+    ("write a python function that reverses a linked list", "code"),
+    ("fix this segmentation fault in my C program", "code"),
+    ("create a bash script that backs up my home folder", "code"),
+    ("implement quicksort in rust", "code"),
+    ("make a tetris game in javascript", "code"),
+    ("find the file invoice_march.pdf on my computer", "files"),
+    ("list all the images in my Pictures folder", "files"),
+    ("move my old screenshots into an archive folder", "files"),
+    ("where is my resume.docx?", "files"),
+    ("create a folder called projects_2026 in my home", "files"),
+]
+
+def run_comparison(repeat: int = 1) -> None:
+    """
+    Compare the accuracy and the latency of the embedding router and of the current router_vote on EVAL_SET.
+    """
+    from sources.router import AgentRouter
+
+    class EvalAgent:
+        def __init__(self, type, role):
+            self.type, self.role, self.agent_name = type, role, type
+
+    agents = [EvalAgent("casual_agent", "talk"), EvalAgent("browser_agent", "web"),
+              EvalAgent("code_agent", "code"), EvalAgent("file_agent", "files")]
+    router = AgentRouter(agents)
+    router.embedding_router = None # compare against the vote even when config.ini selects the embedding backend
+    labels = [agent.role for agent in agents]
+    start = time.perf_counter()
+    embedding_router = EmbeddingRouter(router.few_shots_tasks())
+    print(f"Embedding router prototypes computed in {time.perf_counter() - start:.2f}s")
+    backends = {
+        "router_vote": lambda text: router.router_vote(text, labels),
+        "embedding": lambda text: embedding_router.classify(text, labels)[0][0],
+    }
+    for name, classify in backends.items():
+        classify(EVAL_SET[0][0]) # warm up the models
+        correct, timings = 0, []
+        for _ in range(repeat):
+            for text, expected in EVAL_SET:
+                start = time.perf_counter()
+                predicted = classify(text)
+                timings.append(time.perf_counter() - start)
+                correct += predicted == expected
+        timings.sort()
+        print(f"{name:>12}: accuracy {correct / (len(EVAL_SET) * repeat):.1%}, "
+              f"mean {1000 * sum(timings) / len(timings):.1f}ms, p50 {1000 * timings[len(timings) // 2]:.1f}ms, "
+              f"max {1000 * timings[-1]:.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the embedding router with the BART / adaptive classifier vote.")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    run_comparison(args.repeat)
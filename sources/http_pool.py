@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import weakref
+from typing import AsyncIterator, Dict
+
+import httpx
+
+from sources.logger import Logger
+
+class AsyncClientPool:
+    """
+    AsyncClientPool keeps one long-lived httpx.AsyncClient per backend and per event loop.
+    Connections are kept alive between requests, so each LLM call skip the TCP/TLS handshake.
+    httpx clients can't be shared between event loops, hence the per-loop pools.
+    """
+    def __init__(self, max_connections: int = 20, keepalive_expiry: float = 120, timeout: float = 600):
+        self.logger = Logger("provider.log")
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout, connect=10)
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, backend: str, base_url: str = "", headers: dict = None) -> httpx.AsyncClient:
+        """
+        Get the pooled client of a backend for the running event loop, create it on first use.
+        Args:
+            backend (str): Name of the backend (eg: "openai", "ollama")
+            base_url (str): Base url of the backend API
+            headers (dict, optional): Headers sent with every request (eg: authorization)
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.setdefault(loop, {})
+            client = pool.get(backend)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(base_url=base_url,
+                                           headers=headers or {},
+                                           limits=self.limits,
+                                           timeout=self.timeout)
+                pool[backend] = client
+                self.logger.info(f"Created pooled async client for {backend} ({base_url})")
+            return client
+
+    async def aclose(self) -> None:
+        """
+        Close the clients of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.pop(loop, {})
+        for client in pool.values():
+            await client.aclose()
+
+async def aiter_sse_data(response: httpx.Response) -> AsyncIterator[str]:
+    """
+    Yield the data field of each server-sent event of a streamed response.
+    """
+    async for line in response.aiter_lines():
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        yield data
+
+async_client_pool = AsyncClientPool()
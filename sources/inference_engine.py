@@ -0,0 +1,363 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sources.logger import Logger
+
+class EngineOverloadedError(RuntimeError):
+    """
+    Raised when the admission queue of the inference engine stays full.
+    """
+    pass
+
+def to_legacy_cache(past_key_values: Any) -> List[Tuple[Any, Any]]:
+    """
+    Get the per layer (key, value) tensors of a transformers cache.
+    """
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return list(past_key_values.to_legacy_cache())
+    if hasattr(past_key_values, "layers"):
+        return [(layer.keys, layer.values) for layer in past_key_values.layers]
+    return list(past_key_values)
+
+def from_legacy_cache(layers: List[Tuple[Any, Any]]) -> Any:
+    """
+    Build a transformers DynamicCache from per layer (key, value) tensors.
+    """
+    from transformers import DynamicCache
+
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    cache = DynamicCache()
+    for idx, (key, value) in enumerate(layers):
+        cache.update(key, value, idx)
+    return cache
+
+class GenerationFuture(Future):
+    """
+    Future of a queued generation, resolved with the decoded answer.
+    Once resolved it also holds the number of generated tokens and the generation time (from the admission in the batch).
+    """
+    def __init__(self):
+        super().__init__()
+        self.new_tokens = 0
+        self.elapsed = 0.0
+
+class GenerationRequest:
+    """
+    A generation queued in the inference engine.
+    """
+    def __init__(self, input_ids: List[int], generation_kwargs: dict,
+                 session_key: Optional[str] = None, on_text: Optional[Callable[[str], None]] = None):
+        self.input_ids = input_ids
+        self.max_new_tokens = generation_kwargs.get("max_new_tokens", 512)
+        self.max_time = generation_kwargs.get("max_time", None)
+        self.do_sample = generation_kwargs.get("do_sample", False)
+        self.temperature = generation_kwargs.get("temperature", 1.0)
+        self.top_p = generation_kwargs.get("top_p", 1.0)
+        self.logits_processor = generation_kwargs.get("logits_processor")
+        self.stop_strings = generation_kwargs.get("stop_strings") or []
+        eos = generation_kwargs.get("eos_token_id", [])
+        self.eos_ids = set(eos if isinstance(eos, (list, tuple)) else [eos]) - {None}
+        self.session_key = session_key
+        self.on_text = on_text
+        self.future = GenerationFuture()
+        self.generated: List[int] = []
+        self.text = ""
+        self.prefix_offset = 0 # generated[prefix_offset:read_offset] is the context of the next incremental decode
+        self.read_offset = 0 # generated[:read_offset] is in text
+        self.pending = None # last sampled token, not yet in the KV cache
+        self.length = 0 # number of tokens in the KV cache
+        self.started = None
+
+class InferenceEngine:
+    """
+    InferenceEngine runs the local model generations of all the callers in a single decode loop (continuous batching).
+    Requests are prefilled one by one when admitted, then decoded together one token per step.
+    A request join the batch as soon as a slot is free and leave it when finished, without waiting for the others.
+    The KV caches of the batch are left-padded to the same length, the padding is masked and the positions are given explicitly.
+    """
+    def __init__(self, model: Any, tokenizer: Any, max_batch_size: int = 4, max_queue: int = 16,
+                 admission_timeout: float = 30, prefix_cache: Any = None):
+        self.logger = Logger("inference_engine.log")
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.admission_timeout = admission_timeout
+        self.prefix_cache = prefix_cache
+        self._queue: "queue.Queue[GenerationRequest]" = queue.Queue(maxsize=max_queue)
+        self._active: List[GenerationRequest] = []
+        self._kv = None # per layer (key, value) of shape [batch, heads, seq, dim]
+        self._mask = None # attention mask of shape [batch, seq]
+        self._thread = None
+        self._lock = threading.Lock()
+        self.generated_tokens = 0
+        self.decode_steps = 0
+        self.busy_time = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="inference-engine", daemon=True)
+            self._thread.start()
+
+    def submit(self, input_ids: List[int], generation_kwargs: dict, session_key: Optional[str] = None,
+               on_text: Optional[Callable[[str], None]] = None) -> GenerationFuture:
+        """
+        Queue a generation.
+        Args:
+            input_ids (List[int]): The prompt token ids
+            generation_kwargs (dict): max_new_tokens, max_time, do_sample, temperature, top_p, eos_token_id,
+                logits_processor, stop_strings
+            session_key (str, optional): Session key used to reuse and store the prompt prefix KV cache
+            on_text (Callable, optional): Called with each new piece of decoded text
+        Returns:
+            GenerationFuture: Resolved with the decoded answer
+        Raises:
+            EngineOverloadedError: If the admission queue is still full after admission_timeout
+        """
+        self.start()
+        request = GenerationRequest(input_ids, generation_kwargs, session_key, on_text)
+        try:
+            self._queue.put(request, timeout=self.admission_timeout)
+        except queue.Full:
+            raise EngineOverloadedError(f"Local inference engine overloaded: {self._queue.maxsize} requests already queued.")
+        return request.future
+
+    def generate(self, input_ids: List[int], generation_kwargs: dict, session_key: Optional[str] = None,
+                 on_text: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Queue a generation and wait for the answer.
+        """
+        return self.submit(input_ids, generation_kwargs, session_key, on_text).result()
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._active),
+            "queued": self._queue.qsize(),
+            "generated_tokens": self.generated_tokens,
+            "decode_steps": self.decode_steps,
+            "tokens_per_sec": self.generated_tokens / self.busy_time if self.busy_time else 0.0,
+            "avg_batch_size": self.generated_tokens / self.decode_steps if self.decode_steps else 0.0,
+        }
+
+    def _run(self) -> None:
+        while True:
+            if not self._active:
+                self._try_admit(self._queue.get())
+            while len(self._active) < self.max_batch_size:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._try_admit(request)
+            if not self._active:
+                continue
+            start = time.time()
+            try:
+                self._step()
+            except Exception as e:
+                self.logger.error(f"Decode step failed: {str(e)}")
+                for request in self._active:
+                    request.future.set_exception(e)
+                self._active, self._kv, self._mask = [], None, None
+            self.busy_time += time.time() - start
+
+    def _try_admit(self, request: GenerationRequest) -> None:
+        """
+        Admit a request, failing only this request if anything goes wrong: the decode loop keeps running.
+        """
+        try:
+            self._admit(request)
+        except Exception as e:
+            self.logger.error(f"Admission failed: {str(e)}")
+            self._fail(request, e)
+
+    def _fail(self, request: GenerationRequest, error: Exception) -> None:
+        """
+        Set the error of a request and remove it from the batch if it joined it.
+        """
+        if not request.future.done():
+            request.future.set_exception(error)
+        if request in self._active:
+            self._remove_rows([i for i, other in enumerate(self._active) if other is not request])
+
+    def _admit(self, request: GenerationRequest) -> None:
+        """
+        Prefill a request and add it to the running batch.
+        """
+        import torch
+
+        if not request.future.set_running_or_notify_cancel():
+            return
+        start = time.time()
+        request.started = start
+        try:
+            device = self.model.device
+            past_key_values, reused = None, 0
+            if self.prefix_cache is not None and request.session_key is not None:
+                past_key_values, reused = self.prefix_cache.lookup(request.session_key, request.input_ids)
+            ids = torch.tensor([request.input_ids[reused:]], device=device)
+            with torch.no_grad():
+                out = self.model(input_ids=ids,
+                                 attention_mask=torch.ones((1, len(request.input_ids)), dtype=torch.long, device=device),
+                                 past_key_values=past_key_values,
+                                 use_cache=True)
+            request.length = len(request.input_ids)
+            if self.prefix_cache is not None and request.session_key is not None:
+                self.prefix_cache.log_stats(len(request.input_ids) - reused, reused)
+            layers = to_legacy_cache(out.past_key_values)
+            token = self._sample(out.logits[0, -1], request)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        self.busy_time += time.time() - start
+        self._join_batch(request, layers)
+        if self._accept(request, token):
+            self._leave_batch([request])
+
+    def _join_batch(self, request: GenerationRequest, layers: List[Tuple[Any, Any]]) -> None:
+        """
+        Merge the KV cache of a prefilled request into the batch cache, left-padding the shorter side.
+        """
+        import torch
+        import torch.nn.functional as F
+
+        length = layers[0][0].shape[2]
+        mask = torch.ones((1, length), dtype=torch.long, device=layers[0][0].device)
+        if self._kv is None:
+            kv = layers
+        else:
+            batch_length = self._mask.shape[1]
+            pad_batch, pad_new = max(0, length - batch_length), max(0, batch_length - length)
+            kv = [
+                (torch.cat([F.pad(bk, (0, 0, pad_batch, 0)), F.pad(k, (0, 0, pad_new, 0))], dim=0),
+                 torch.cat([F.pad(bv, (0, 0, pad_batch, 0)), F.pad(v, (0, 0, pad_new, 0))], dim=0))
+                for (bk, bv), (k, v) in zip(self._kv, layers)
+            ]
+            mask = torch.cat([F.pad(self._mask, (pad_batch, 0)), F.pad(mask, (pad_new, 0))], dim=0)
+        # the batch is only updated once the merge succeeded
+        self._kv, self._mask = kv, mask
+        self._active.append(request)
+
+    def _leave_batch(self, finished: List[GenerationRequest]) -> None:
+        """
+        Remove finished requests from the batch and trim the padding no longer needed.
+        """
+        keep = [i for i, request in enumerate(self._active) if request not in finished]
+        for request in finished:
+            idx = self._active.index(request)
+            if self.prefix_cache is not None and request.session_key is not None:
+                try:
+                    valid = self._mask[idx].bool()
+                    layers = [(k[idx:idx + 1, :, valid], v[idx:idx + 1, :, valid]) for k, v in self._kv]
+                    tokens = request.input_ids + request.generated[:-1]
+                    self.prefix_cache.store(request.session_key, tokens, from_legacy_cache(layers))
+                except Exception as e:
+                    self.logger.warning(f"Could not store the prefix cache: {str(e)}")
+            elapsed = time.time() - request.started
+            if not request.future.done():
+                request.future.new_tokens = len(request.generated)
+                request.future.elapsed = elapsed
+                request.future.set_result(request.text)
+            self.logger.info(f"Generated {len(request.generated)} tokens in {elapsed:.1f}s "
+                             f"({len(request.generated) / max(elapsed, 1e-6):.1f} tokens/s), batch of {len(self._active)}.")
+        self._remove_rows(keep)
+
+    def _remove_rows(self, keep: List[int]) -> None:
+        """
+        Keep only the given rows of the batch and trim the padding no longer needed.
+        """
+        import torch
+
+        self._active = [self._active[i] for i in keep]
+        if not self._active:
+            self._kv, self._mask = None, None
+            return
+        index = torch.tensor(keep, device=self._mask.device)
+        mask = self._mask.index_select(0, index)
+        start = int((mask.sum(dim=0) > 0).long().argmax())
+        self._kv = [(k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:]) for k, v in self._kv]
+        self._mask = mask[:, start:]
+
+    def _step(self) -> None:
+        """
+        Decode one token for every request of the batch.
+        """
+        import torch
+
+        device = self._mask.device
+        input_ids = torch.tensor([[request.pending] for request in self._active], device=device)
+        positions = torch.tensor([[request.length] for request in self._active], device=device)
+        mask = torch.cat([self._mask, torch.ones((len(self._active), 1), dtype=torch.long, device=device)], dim=1)
+        with torch.no_grad():
+            out = self.model(input_ids=input_ids,
+                             attention_mask=mask,
+                             position_ids=positions,
+                             past_key_values=from_legacy_cache(self._kv),
+                             use_cache=True)
+        self._kv = to_legacy_cache(out.past_key_values)
+        self._mask = mask
+        self.decode_steps += 1
+        finished = []
+        failed = []
+        for i, request in enumerate(self._active):
+            request.length += 1
+            try:
+                token = self._sample(out.logits[i, -1], request)
+                if self._accept(request, token):
+                    finished.append(request)
+            except Exception as e:
+                self.logger.error(f"Request failed: {str(e)}")
+                failed.append((request, e))
+        for request, error in failed:
+            self._fail(request, error)
+        if finished:
+            self._leave_batch(finished)
+
+    def _accept(self, request: GenerationRequest, token: int) -> bool:
+        """
+        Record a sampled token, stream the new text and tell whether the request is finished.
+        """
+        request.pending = token
+        request.generated.append(token)
+        self.generated_tokens += 1
+        finished = (token in request.eos_ids
+                    or len(request.generated) >= request.max_new_tokens
+                    or (request.max_time is not None and time.time() - request.started > request.max_time))
+        # decode only the tokens since the last emitted text, with the previous piece as context
+        # (the decoding of a token can depend on the one before it, e.g. the leading space of sentencepiece)
+        prefix = self.tokenizer.decode(request.generated[request.prefix_offset:request.read_offset], skip_special_tokens=True)
+        window = self.tokenizer.decode(request.generated[request.prefix_offset:], skip_special_tokens=True)
+        delta = window[len(prefix):]
+        if any(stop in request.text[-len(stop):] + delta for stop in request.stop_strings):
+            finished = True
+        # hold back incomplete multi-byte characters until the end
+        if finished or not window.endswith("\ufffd"):
+            request.text += delta
+            request.prefix_offset, request.read_offset = request.read_offset, len(request.generated)
+            if delta and request.on_text is not None:
+                request.on_text(delta)
+        return finished
+
+    def _sample(self, logits: Any, request: GenerationRequest) -> int:
+        """
+        Pick the next token of a request with its own temperature and top-p.
+        """
+        import torch
+
+        if request.logits_processor is not None:
+            ids = torch.tensor([request.input_ids + request.generated], device=logits.device)
+            logits = request.logits_processor(ids, logits.unsqueeze(0).clone())[0]
+        if not request.do_sample or request.temperature <= 0:
+            return int(logits.argmax())
+        probs = torch.softmax(logits.float() / request.temperature, dim=-1)
+        if request.top_p < 1.0:
+            sorted_probs, sorted_ids = torch.sort(probs, descending=True)
+            cumulative = torch.cumsum(sorted_probs, dim=-1)
+            sorted_probs[cumulative - sorted_probs > request.top_p] = 0
+            return int(sorted_ids[torch.multinomial(sorted_probs, 1)])
+        return int(torch.multinomial(probs, 1))
@@ -86,6 +86,16 @@ class Interaction:
             blks.extend(agent.get_blocks_result())
         return blks
     
+    def set_token_callback(self, callback) -> None:
+        """
+        Stream the tokens of every agent (including the planner sub-agents) to callback(agent_name, token).
+        Use None to disable streaming.
+        """
+        for agent in self.agents:
+            agent.set_token_callback(callback)
+            for sub_agent in getattr(agent, 'agents', {}).values():
+                sub_agent.set_token_callback(callback)
+
     def load_last_session(self):
         """Recover the last session."""
         for agent in self.agents:
@@ -98,9 +108,15 @@ class Interaction:
         for agent in self.agents:
             agent.memory.save_memory(agent.type)
 
+    def close_session(self):
+        """Close the session journals of the agents, at shutdown."""
+        for agent in self.agents:
+            agent.memory.close_journal()
+
     def reset_session(self) -> None:
         """Reset the session memory for all agents."""
         for agent in self.agents:
+            agent.memory.new_session()
             agent.memory.clear()
         self.current_agent = None
         self.last_query = None
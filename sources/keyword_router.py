@@ -0,0 +1,128 @@
+import os
+import re
+import json
+from typing import Dict, Iterable, List, Optional
+
+from sources.logger import Logger
+
+KEYWORD_PACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keyword_packs")
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Build a regex matching any of the words, factored as a prefix tree:
+    at each position of the text the regex engine follows one branch instead of trying every word.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {} # end of a word
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        optional = "" in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        pattern = "(?:" + "|".join(branches) + ")"
+        return pattern + "?" if optional else pattern
+    return build(trie)
+
+class KeywordMatcher:
+    """
+    Keyword fast path of the router: the keywords of every role, from every language pack,
+    compiled into a single regex (one prefix tree per role), matched in one pass over the query.
+    A query matching the keywords of a single role is routed to that role without the ML models,
+    unless it contains a multi-step cue ("then", "and save"...): such a task may need the planner,
+    so it goes through the complexity estimation.
+    """
+    def __init__(self, packs: Dict[str, dict], roles: Optional[Iterable[str]] = None):
+        """
+        Args:
+            packs (dict): Language code -> pack {"word_boundaries": bool, "roles": {role: [keywords]}, "multi_step_cues": [cues]}
+            roles (list, optional): Only keep the keywords of these roles (the roles of the available agents)
+        """
+        self.logger = Logger("router.log")
+        roles = set(roles) if roles is not None else None
+        bounded: Dict[str, set] = {}
+        unbounded: Dict[str, set] = {}
+        cues = {True: set(), False: set()}
+        for pack in packs.values():
+            word_boundaries = pack.get("word_boundaries", True)
+            target = bounded if word_boundaries else unbounded
+            for role, keywords in pack.get("roles", {}).items():
+                if roles is None or role in roles:
+                    target.setdefault(role, set()).update(k.casefold() for k in keywords if k.strip())
+            cues[word_boundaries].update(c.casefold() for c in pack.get("multi_step_cues", []) if c.strip())
+        cue_alternatives = []
+        if cues[True]:
+            cue_alternatives.append(r"(?<!\w)" + trie_pattern(cues[True]) + r"(?!\w)")
+        if cues[False]:
+            cue_alternatives.append(trie_pattern(cues[False]))
+        self.cue_pattern = re.compile("|".join(cue_alternatives)) if cue_alternatives else None
+        self.roles = sorted(set(bounded) | set(unbounded))
+        self.keyword_count = sum(len(k) for k in bounded.values()) + sum(len(k) for k in unbounded.values())
+        groups = []
+        for i, role in enumerate(self.roles):
+            alternatives = []
+            if bounded.get(role):
+                # keywords match whole words: "link" does not match "linkedin"
+                alternatives.append(r"(?<!\w)" + trie_pattern(bounded[role]) + r"(?!\w)")
+            if unbounded.get(role):
+                # languages written without spaces (zh...) have no word boundaries
+                alternatives.append(trie_pattern(unbounded[role]))
+            groups.append(f"(?P<role{i}>" + "|".join(alternatives) + ")")
+        self.pattern = re.compile("|".join(groups)) if groups else None
+
+    @classmethod
+    def from_directory(cls, path: str = KEYWORD_PACKS_DIR, roles: Optional[Iterable[str]] = None) -> "KeywordMatcher":
+        """
+        Load the keyword packs of a folder, one <language code>.json file per language.
+        """
+        packs = {}
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if not name.endswith(".json"):
+                    continue
+                with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+                    packs[name[:-len(".json")]] = json.load(f)
+        return cls(packs, roles)
+
+    def matches(self, text: str) -> Dict[str, List[str]]:
+        """
+        Get the keywords found in a text, by role.
+        """
+        found: Dict[str, List[str]] = {}
+        if self.pattern is None:
+            return found
+        for match in self.pattern.finditer(text.casefold()):
+            role = self.roles[int(match.lastgroup[len("role"):])]
+            found.setdefault(role, []).append(match.group())
+        return found
+
+    def multi_step_cue(self, text: str) -> Optional[str]:
+        """
+        Get the first multi-step cue found in a text, None if there is none.
+        """
+        if self.cue_pattern is None:
+            return None
+        cue = self.cue_pattern.search(text.casefold())
+        return cue.group() if cue else None
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        Get the role whose keywords the text contains, None if there are none or several such roles,
+        or if the text describes several steps.
+        """
+        cue = self.multi_step_cue(text)
+        if cue is not None:
+            self.logger.info(f"Multi-step cue '{cue}', routing with the classifiers.")
+            return None
+        found = self.matches(text)
+        if len(found) != 1:
+            if found:
+                self.logger.info(f"Ambiguous keywords {found}, routing with the classifiers.")
+            return None
+        return next(iter(found))
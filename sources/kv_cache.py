@@ -0,0 +1,98 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, List, Tuple
+
+from sources.logger import Logger
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    """
+    Get the length of the longest common prefix of two token id lists.
+    """
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+class PrefixCache:
+    """
+    PrefixCache keeps the KV cache (past_key_values) of the last generation of each session.
+    On the next turn the longest shared token prefix is reused, so generate() only prefill the new suffix.
+    A session is identified by its system prompt, which is specific to each agent.
+    """
+    def __init__(self, max_sessions: int = 4):
+        self.logger = Logger("provider.log")
+        self.max_sessions = max_sessions
+        self._entries: "OrderedDict[str, Tuple[List[int], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.prompt_tokens = 0
+        self.reused_tokens = 0
+
+    @staticmethod
+    def session_key(history: list) -> str:
+        """
+        Get the session key of a chat history: the hash of its first (system) message.
+        """
+        first = history[0].get('content', '') if history else ''
+        return hashlib.sha1(first.encode('utf-8', errors='replace')).hexdigest()
+
+    def lookup(self, key: str, input_ids: List[int]) -> Tuple[Any, int]:
+        """
+        Take the cached KV of a session, cropped to the prefix shared with input_ids.
+        The entry is removed from the cache: the caller owns the returned KV and must store() the new one.
+        Args:
+            key (str): The session key
+            input_ids (List[int]): The token ids of the new prompt
+        Returns:
+            Tuple[Any, int]: The past_key_values (or None on miss) and the number of reused tokens
+        """
+        with self._lock:
+            self.lookups += 1
+            self.prompt_tokens += len(input_ids)
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return None, 0
+        cached_ids, past_key_values = entry
+        # at least one token must be prefilled to get the next token logits
+        reusable = min(common_prefix_length(cached_ids, input_ids),
+                       past_key_values.get_seq_length(),
+                       len(input_ids) - 1)
+        if reusable <= 0:
+            return None, 0
+        past_key_values.crop(reusable)
+        with self._lock:
+            self.hits += 1
+            self.reused_tokens += reusable
+        return past_key_values, reusable
+
+    def store(self, key: str, token_ids: List[int], past_key_values: Any) -> None:
+        """
+        Store the KV cache of a generation (prompt + answer token ids) for the session.
+        """
+        if past_key_values is None or not hasattr(past_key_values, "crop"):
+            return
+        with self._lock:
+            self._entries[key] = (token_ids, past_key_values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def log_stats(self, prefill_tokens: int, reused_tokens: int) -> None:
+        """
+        Log the prefill savings of the last generation and the overall hit ratio.
+        """
+        saved = self.reused_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        self.logger.info(f"Prefix cache: reused {reused_tokens} tokens, prefilled {prefill_tokens}. "
+                         f"Hit ratio {self.hit_ratio:.0%} ({self.hits}/{self.lookups}), "
+                         f"prefill tokens saved {self.reused_tokens}/{self.prompt_tokens} ({saved:.0%}).")
@@ -5,6 +5,7 @@ from transformers import MarianMTModel, MarianTokenizer
 
 from sources.utility import pretty_print, animate_thinking
 from sources.logger import Logger
+from sources.model_registry import model_registry
 
 class LanguageUtility:
     """LanguageUtility for language, or emotion identification"""
@@ -14,16 +15,28 @@ class LanguageUtility:
         args:
             supported_language: list of languages for translation, determine which Helsinki-NLP model to load
         """
-        self.translators_tokenizer = None 
-        self.translators_model = None
         self.logger = Logger("language.log")
         self.supported_language = supported_language
         self.load_model()
     
     def load_model(self) -> None:
+        """Load the translation models, they are shared through the model registry."""
         animate_thinking("Loading language utility...", color="status")
-        self.translators_tokenizer = {lang: MarianTokenizer.from_pretrained(f"Helsinki-NLP/opus-mt-{lang}-en") for lang in self.supported_language if lang != "en"}
-        self.translators_model = {lang: MarianMTModel.from_pretrained(f"Helsinki-NLP/opus-mt-{lang}-en") for lang in self.supported_language if lang != "en"}
+        for lang in self.supported_language:
+            if lang != "en":
+                self.get_translator(lang)
+
+    def get_translator(self, lang: str) -> Tuple[MarianTokenizer, MarianMTModel]:
+        """
+        Get the shared Helsinki-NLP translator from lang to english.
+        Args:
+            lang: ISO language code
+        Returns: (tokenizer, model) tuple
+        """
+        name = f"Helsinki-NLP/opus-mt-{lang}-en"
+        def load():
+            return MarianTokenizer.from_pretrained(name), MarianMTModel.from_pretrained(name)
+        return model_registry.get(f"translator:{name}", load)
     
     def detect_language(self, text: str) -> str:
         """
@@ -48,12 +61,11 @@ class LanguageUtility:
         """
         if origin_lang == "en":
             return text
-        if origin_lang not in self.translators_tokenizer:
+        if origin_lang not in self.supported_language:
             pretty_print(f"Language {origin_lang} not supported for translation", color="error")
             return text
-        tokenizer = self.translators_tokenizer[origin_lang]
+        tokenizer, model = self.get_translator(origin_lang)
         inputs = tokenizer(text, return_tensors="pt", padding=True)
-        model = self.translators_model[origin_lang]
         translation = model.generate(**inputs)
         return tokenizer.decode(translation[0], skip_special_tokens=True)
 
@@ -1,8 +1,11 @@
 import os
+import json
+import asyncio
 import platform
 import socket
 import subprocess
 import time
+from typing import List, Optional, Tuple
 from urllib.parse import urlparse
 
 import httpx
@@ -13,9 +16,41 @@ from openai import OpenAI
 
 from sources.logger import Logger
 from sources.utility import pretty_print, animate_thinking
+from sources.http_pool import async_client_pool, aiter_sse_data
+from sources.kv_cache import PrefixCache
+from sources.inference_engine import InferenceEngine
+from sources.constrained_decoding import JsonSchemaLogitsProcessor
+from sources.speculative import DecodingStats, ForwardCounter
+from sources.precision import resolve_precision, torch_dtype, quantize_int8
+from sources.context_budget import ContextBudget
+from sources.model_registry import model_registry
+
+OPENAI_COMPATIBLE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "google": "https://generativelanguage.googleapis.com/v1beta/openai/",
+    "deepseek": "https://api.deepseek.com",
+    "openrouter": "https://openrouter.ai/api/v1",
+    "together": "https://api.together.xyz/v1",
+}
+
+# keywords the OpenAI strict structured outputs reject, the answer is checked by the caller instead
+STRICT_UNSUPPORTED_KEYWORDS = ("minItems", "maxItems")
+
+def strict_schema(schema):
+    """
+    Copy a JSON schema without the keywords unsupported by the OpenAI strict structured outputs.
+    """
+    if isinstance(schema, dict):
+        return {key: strict_schema(value) for key, value in schema.items() if key not in STRICT_UNSUPPORTED_KEYWORDS}
+    if isinstance(schema, list):
+        return [strict_schema(value) for value in schema]
+    return schema
 
 class Provider:
-    def __init__(self, provider_name, model, server_address="127.0.0.1:5000", is_local=False):
+    def __init__(self, provider_name, model, server_address="127.0.0.1:5000", is_local=False,
+                 response_cache=None, cache_sampled=False, greedy_decoding=False,
+                 draft_model=None, speculative_agent_types=None, num_assistant_tokens=5,
+                 precision="auto", gguf_model=None):
         self.provider_name = provider_name.lower()
         self.model = model
         self.is_local = is_local
@@ -36,8 +71,59 @@ class Provider:
             "openrouter": self.openrouter_fn,
             "test": self.test_fn
         }
+        self.available_stream_providers = {
+            "ollama": self.ollama_stream,
+            "server": self.server_stream,
+            "openai": self.openai_stream,
+            "lm-studio": self.lm_studio_stream,
+            "huggingface": self.huggingface_stream,
+            "huggingface-local": self.huggingface_local_stream,
+            "qwen": self.huggingface_local_stream,
+            "google": self.google_stream,
+            "deepseek": self.deepseek_stream,
+            "together": self.together_stream,
+            "dsk_deepseek": self.dsk_deepseek_stream,
+            "openrouter": self.openrouter_stream,
+            "test": self.test_stream
+        }
+        self.available_async_providers = {
+            "ollama": self.ollama_astream,
+            "server": self.server_astream,
+            "openai": self.openai_astream,
+            "lm-studio": self.lm_studio_astream,
+            "google": self.google_astream,
+            "deepseek": self.deepseek_astream,
+            "together": self.together_astream,
+            "openrouter": self.openrouter_astream
+        }
+        self.stream_postprocess = {
+            "huggingface-local": self._extract_json_from_response,
+            "qwen": self._extract_json_from_response
+        }
         self._hf_local_model = None
         self._hf_local_tokenizer = None
+        self._hf_draft_model = None
+        self._gguf_model = None
+        self._context_budget = None
+        self.precision = precision
+        self.precision_mode = None
+        self.gguf_model = gguf_model
+        self.draft_model = draft_model
+        self.speculative_agent_types = speculative_agent_types or []
+        self.num_assistant_tokens = num_assistant_tokens
+        self.decoding_stats = DecodingStats()
+        self._clients = {}
+        self._inference_engine = None
+        self.response_cache = response_cache
+        self.structured_output_providers = ["huggingface-local", "qwen", "ollama", "openai", "google",
+                                            "together", "deepseek", "lm-studio", "openrouter"]
+        self.cache_sampled = cache_sampled
+        self.greedy_decoding = greedy_decoding
+        # providers whose requests carry the temperature of get_sampling_params
+        self.temperature_providers = ["ollama", "openai", "google", "together", "deepseek", "lm-studio", "openrouter"]
+        self.prefix_cache = None
+        if os.getenv("LLM_PREFIX_CACHE", "1") != "0":
+            self.prefix_cache = PrefixCache(max_sessions=int(os.getenv("LLM_PREFIX_CACHE_SESSIONS", "4")))
         self.logger = Logger("provider.log")
         self.api_key = None
         self.internal_url, self.in_docker = self.get_internal_url()
@@ -53,6 +139,71 @@ class Provider:
     def get_model_name(self) -> str:
         return self.model
 
+    def get_context_budget(self) -> ContextBudget:
+        """
+        Get the context budget of the model, shared by the memories of all the agents.
+        The local HuggingFace models count tokens with their tokenizer, other backends with the fast approximation.
+        """
+        if self._context_budget is None:
+            count_fn = None
+            if self.provider_name in ("huggingface-local", "qwen") and self.precision != "gguf":
+                count_fn = lambda text: len(self.get_hf_local_tokenizer().encode(text, add_special_tokens=False))
+            self._context_budget = ContextBudget(self.model, max_context=self.get_max_context(), count_fn=count_fn)
+            self.logger.info(f"Context budget of {self.model}: {self._context_budget.max_context} tokens "
+                             f"({'exact' if count_fn else 'approximate'} count)")
+        return self._context_budget
+
+    def get_max_context(self) -> Optional[int]:
+        """
+        Get the context window the backend actually serves, None if unknown (guessed from the model name then).
+        LLM_CONTEXT_SIZE overrides it.
+        """
+        if os.getenv("LLM_CONTEXT_SIZE"):
+            return int(os.getenv("LLM_CONTEXT_SIZE"))
+        if self.provider_name in ("huggingface-local", "qwen"):
+            if self.precision == "gguf":
+                return 8192 # n_ctx of load_gguf_model
+            try:
+                if self._hf_local_model is not None:
+                    config = self._hf_local_model.config
+                else:
+                    from transformers import AutoConfig
+                    token = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_TOKEN")
+                    config = AutoConfig.from_pretrained(self.model, token=token)
+                return getattr(config, "max_position_embeddings", None)
+            except Exception as e:
+                self.logger.warning(f"Could not read the context size of {self.model}: {e}")
+                return None
+        if self.provider_name == "ollama":
+            return self.ollama_context_size()
+        return None
+
+    def ollama_context_size(self) -> int:
+        """
+        Get the context window of the Ollama model: its num_ctx parameter, else the server default.
+        Ollama silently truncates prompts longer than num_ctx, whatever the model was trained for.
+        """
+        host = f"{self.internal_url}:11434" if self.is_local else f"http://{self.server_address}"
+        try:
+            client = self.get_client("ollama", lambda: OllamaClient(host=host))
+            parameters = client.show(self.model).get("parameters") or ""
+            for line in parameters.splitlines():
+                fields = line.split()
+                if len(fields) == 2 and fields[0] == "num_ctx":
+                    return int(fields[1])
+        except Exception as e:
+            self.logger.warning(f"Could not read the context size of {self.model} from Ollama: {e}")
+        return int(os.getenv("OLLAMA_CONTEXT_LENGTH", "4096"))
+
+    def get_client(self, name: str, factory):
+        """
+        Get a long-lived client for a backend, created with factory() on first use.
+        Reusing the clients keep the HTTP connections alive between requests.
+        """
+        if name not in self._clients:
+            self._clients[name] = factory()
+        return self._clients[name]
+
     def get_api_key(self, provider):
         load_dotenv()
         api_key_var = f"{provider.upper()}_API_KEY"
@@ -69,31 +220,287 @@ class Provider:
             return "http://localhost", False
         return url, True
 
-    def respond(self, history, verbose=True):
+    def respond(self, history, verbose=True, on_token=None, use_cache=True, **options):
         """
         Use the choosen provider to generate text.
+        Args:
+            history (list): The messages to send to the LLM
+            verbose (bool): Print the answer as it is generated
+            on_token (Callable, optional): If set, the answer is streamed and on_token(str) is called for each new chunk
+            use_cache (bool): Look up and store the answer in the response cache, if the call is cacheable
+            **options: Per request generation options:
+                json_schema (dict): Constrain the answer to a JSON document of this schema, returned within ```json
+                stop (List[str]): End the generation once one of these strings is generated, the string is kept
+                agent_type (str): Type of the requesting agent, selects per agent settings (eg: speculative decoding)
         """
         llm = self.available_providers[self.provider_name]
+        cache_key = self.response_cache_key(history, options) if use_cache else None
+        cached = self.get_cached_response(cache_key, verbose, on_token)
+        if cached is not None:
+            return cached
         self.logger.info(f"Using provider: {self.provider_name} at {self.server_ip}")
         try:
-            thought = llm(history, verbose)
+            if on_token is not None or (options.get("stop") and not self.supports_native_stop()):
+                thought = self.stream_respond(history, verbose, on_token, **options)
+            else:
+                thought = llm(history, verbose, **options)
         except KeyboardInterrupt:
             self.logger.warning("User interrupted the operation with Ctrl+C")
             return "Operation interrupted by user. REQUEST_EXIT"
-        except ConnectionError as e:
+        except Exception as e:
+            return self.handle_provider_error(e)
+        if options.get("stop"):
+            thought = self.cut_at_stop(thought, options["stop"])
+        if options.get("json_schema") is not None:
+            thought = self.format_json_answer(thought)
+        if cache_key is not None and thought:
+            self.response_cache.set(cache_key, thought)
+        return thought
+
+    async def arespond(self, history, verbose=True, on_token=None, use_cache=True, **options):
+        """
+        Asynchronous version of respond.
+        HTTP providers are awaited on pooled keep-alive httpx clients, others run in a worker thread.
+        Args:
+            history (list): The messages to send to the LLM
+            verbose (bool): Print the answer as it is generated
+            on_token (Callable, optional): Called with each new chunk of the answer
+            use_cache (bool): Look up and store the answer in the response cache, if the call is cacheable
+            **options: Per request generation options, see respond
+        """
+        allm = self.available_async_providers.get(self.provider_name)
+        if allm is None:
+            return await asyncio.to_thread(self.respond, history, verbose, on_token, use_cache, **options)
+        cache_key = self.response_cache_key(history, options) if use_cache else None
+        cached = self.get_cached_response(cache_key, verbose, on_token)
+        if cached is not None:
+            return cached
+        self.logger.info(f"Using provider: {self.provider_name} at {self.server_ip} (async)")
+        thought = ""
+        chunks = allm(history, verbose, **options)
+        if options.get("stop"):
+            chunks = self.aiter_until_stop(chunks, options["stop"])
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                thought += chunk
+                if on_token is not None:
+                    on_token(chunk)
+        except KeyboardInterrupt:
+            self.logger.warning("User interrupted the operation with Ctrl+C")
+            return "Operation interrupted by user. REQUEST_EXIT"
+        except Exception as e:
+            return self.handle_provider_error(e)
+        if options.get("stop"):
+            thought = self.cut_at_stop(thought, options["stop"])
+        if options.get("json_schema") is not None:
+            thought = self.format_json_answer(thought)
+        if cache_key is not None and thought:
+            self.response_cache.set(cache_key, thought)
+        return thought
+
+    def supports_option(self, name: str) -> bool:
+        """
+        Tell whether the provider honors a request option (see respond).
+        """
+        if name == "json_schema":
+            return self.provider_name in self.structured_output_providers
+        return name in ("stop", "agent_type")
+
+    def supports_native_stop(self) -> bool:
+        """
+        Tell whether the provider backend stops on the stop strings itself, others are stopped by closing their stream.
+        """
+        return self.provider_name in ("huggingface-local", "qwen")
+
+    @staticmethod
+    def find_stop(text: str, stop: List[str]) -> int:
+        """
+        Get the end index of the first stop string found in a text, -1 if there is none.
+        """
+        ends = [text.find(s) + len(s) for s in stop if s and s in text]
+        return min(ends) if ends else -1
+
+    def cut_at_stop(self, text: str, stop: List[str]) -> str:
+        """
+        Drop what was generated after the first stop string.
+        """
+        end = self.find_stop(text, stop)
+        return text if end < 0 else text[:end]
+
+    def iter_until_stop(self, chunks, stop: List[str]):
+        """
+        Yield the chunks up to the first stop string included, then close the stream so the backend stop generating.
+        """
+        text = ""
+        try:
+            for chunk in chunks:
+                sent = len(text)
+                text += chunk
+                end = self.find_stop(text, stop)
+                if end >= 0:
+                    yield text[sent:end]
+                    self.logger.info(f"Stop sequence reached after {end} chars.")
+                    return
+                yield chunk
+        finally:
+            chunks.close()
+
+    async def aiter_until_stop(self, chunks, stop: List[str]):
+        """
+        Asynchronous version of iter_until_stop.
+        """
+        text = ""
+        try:
+            async for chunk in chunks:
+                sent = len(text)
+                text += chunk
+                end = self.find_stop(text, stop)
+                if end >= 0:
+                    yield text[sent:end]
+                    self.logger.info(f"Stop sequence reached after {end} chars.")
+                    return
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    def format_json_answer(self, thought: str) -> str:
+        """
+        Put the JSON document of a schema constrained answer within a ```json block, as the agents expect.
+        """
+        if not thought or "```json" in thought:
+            return thought
+        return f"```json\n{self._extract_json_from_response(thought)}\n```"
+
+    def openai_request_params(self, options: dict) -> dict:
+        """
+        Translate the request options to OpenAI compatible chat completion parameters.
+        """
+        params = {}
+        temperature = self.get_sampling_params().get("temperature")
+        if temperature is not None:
+            params["temperature"] = temperature
+        schema = options.get("json_schema")
+        if schema is not None:
+            if self.provider_name == "deepseek":
+                # deepseek only supports JSON mode, the schema is described in the prompt
+                params["response_format"] = {"type": "json_object"}
+            else:
+                params["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {"name": schema.get("title", "response"), "schema": strict_schema(schema), "strict": True}
+                }
+        return params
+
+    def get_sampling_params(self) -> dict:
+        """
+        Get the sampling parameters used by the provider, a None temperature means the backend default.
+        With greedy_decoding (off by default), the local models decode greedily and the providers accepting
+        a temperature are sent temperature=0: their answers are deterministic, hence cacheable.
+        """
+        if self.provider_name in ("huggingface-local", "qwen"):
+            if self.greedy_decoding:
+                return {"do_sample": False, "max_new_tokens": int(os.getenv("LLM_MAX_NEW_TOKENS", "512"))}
+            return {"do_sample": True, "temperature": 0.7, "top_p": 0.9,
+                    "max_new_tokens": int(os.getenv("LLM_MAX_NEW_TOKENS", "512"))}
+        if self.provider_name == "test":
+            return {"do_sample": False}
+        if self.greedy_decoding and self.provider_name in self.temperature_providers:
+            return {"temperature": 0}
+        if self.provider_name == "lm-studio":
+            return {"temperature": 0.7}
+        return {"temperature": None}
+
+    @staticmethod
+    def normalize_history(history) -> list:
+        """
+        Reduce a history to the fields that shape the answer, with normalized whitespace.
+        Memory metadata such as the time or the model used are dropped.
+        """
+        normalized = []
+        for msg in history:
+            content = str(msg.get('content', '')).replace('\r\n', '\n')
+            content = "\n".join(line.rstrip() for line in content.strip().split("\n"))
+            normalized.append({'role': str(msg.get('role', '')).lower(), 'content': content})
+        return normalized
+
+    def response_cache_key(self, history, options: dict = None) -> Optional[str]:
+        """
+        Get the response cache key of a call, None if the cache is disabled or the call is not cacheable.
+        Sampled calls are non-deterministic and bypass the cache, unless cache_sampled is set.
+        Calls sent with temperature=0 are cacheable, see greedy_decoding in get_sampling_params.
+        """
+        if self.response_cache is None:
+            return None
+        params = self.get_sampling_params()
+        deterministic = params.get("do_sample") is False or params.get("temperature") == 0
+        if not deterministic and not self.cache_sampled:
+            return None
+        model = self.gguf_model if self.precision == "gguf" else self.model
+        return self.response_cache.make_key(self.provider_name, model, self.normalize_history(history), params,
+                                            options or {})
+
+    def get_cached_response(self, cache_key, verbose, on_token) -> Optional[str]:
+        """
+        Get an answer from the response cache, replayed to on_token as a single chunk.
+        """
+        if cache_key is None:
+            return None
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        self.logger.info(f"Response cache hit for {self.provider_name} ({self.model}).")
+        if verbose:
+            print(cached)
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    def handle_provider_error(self, e: Exception) -> str:
+        """
+        Turn a provider failure into an answer for recoverable errors, raise a descriptive error otherwise.
+        """
+        if isinstance(e, (ConnectionError, httpx.ConnectError)):
             raise ConnectionError(f"{str(e)}\nConnection to {self.server_ip} failed.")
-        except AttributeError as e:
+        if isinstance(e, AttributeError):
             raise NotImplementedError(f"{str(e)}\nIs {self.provider_name} implemented ?")
-        except ModuleNotFoundError as e:
+        if isinstance(e, ModuleNotFoundError):
             raise ModuleNotFoundError(
                 f"{str(e)}\nA import related to provider {self.provider_name} was not found. Is it installed ?")
-        except Exception as e:
-            if "try again later" in str(e).lower():
-                return f"{self.provider_name} server is overloaded. Please try again later."
-            if "refused" in str(e):
-                return f"Server {self.server_ip} seem offline. Unable to answer."
-            raise Exception(f"Provider {self.provider_name} failed: {str(e)}") from e
-        return thought
+        if "try again later" in str(e).lower():
+            return f"{self.provider_name} server is overloaded. Please try again later."
+        if "refused" in str(e):
+            return f"Server {self.server_ip} seem offline. Unable to answer."
+        raise Exception(f"Provider {self.provider_name} failed: {str(e)}") from e
+
+    def stream(self, history, verbose=False, **options):
+        """
+        Use the choosen provider to generate text, yield the text chunks as they are generated.
+        Providers without streaming support yield the whole answer at once.
+        """
+        llm = self.available_stream_providers.get(self.provider_name)
+        if llm is None:
+            yield self.available_providers[self.provider_name](history, verbose, **options)
+            return
+        yield from llm(history, verbose, **options)
+
+    def stream_respond(self, history, verbose, on_token, **options) -> str:
+        """
+        Stream the answer to on_token (if set) and return the complete answer.
+        """
+        thought = ""
+        chunks = self.stream(history, verbose, **options)
+        if options.get("stop") and not self.supports_native_stop():
+            chunks = self.iter_until_stop(chunks, options["stop"])
+        for chunk in chunks:
+            if not chunk:
+                continue
+            thought += chunk
+            if on_token is not None:
+                on_token(chunk)
+        postprocess = self.stream_postprocess.get(self.provider_name)
+        return postprocess(thought) if postprocess else thought
 
     def is_ip_online(self, address: str, timeout: int = 10) -> bool:
         """
@@ -119,11 +526,40 @@ class Provider:
         except (subprocess.TimeoutExpired, subprocess.SubprocessError) as e:
             return False
 
-    def server_fn(self, history, verbose=False):
+    def server_fn(self, history, verbose=False, **options):
         """
         Use a remote server with LLM to generate text.
         """
-        thought = ""
+        return "".join(self.server_stream(history, verbose, **options))
+
+    def parse_server_update(self, result: dict, sentence: str) -> Tuple[str, str, bool]:
+        """
+        Parse an update of the self-hosted server, incremental or full sentence.
+        Args:
+            result (dict): The JSON sent by the server
+            sentence (str): The sentence received so far
+        Returns:
+            Tuple[str, str, bool]: The new text, the updated sentence and whenever generation is complete
+        """
+        if "error" in result:
+            raise ValueError(result["error"])
+        if "delta" in result:
+            delta = result["delta"] or ""
+        else: # legacy server, send the whole sentence at each update
+            updated = result.get("sentence") or ""
+            delta = updated[len(sentence):] if updated.startswith(sentence) else ""
+        return delta, sentence + delta, bool(result.get("is_complete", False))
+
+    def server_stream(self, history, verbose=False, **options):
+        """
+        Use a remote server with LLM to generate text, yield the new text as soon as the server send it.
+        The server protocol, from the fastest to the legacy one:
+            - GET /stream: server-sent events of {"delta": str, "is_complete": bool}
+            - GET /get_updated_sentence?offset=n&wait=s: long-poll, answer as soon as the sentence grows past offset
+              with {"delta": str, "offset": int, "is_complete": bool}
+            - GET /get_updated_sentence: legacy polling of the whole {"sentence": str, "is_complete": bool}
+        """
+        sentence = ""
         route_setup = f"{self.server_ip}/setup"
         route_gen = f"{self.server_ip}/generate"
 
@@ -131,70 +567,165 @@ class Provider:
             pretty_print(f"Server is offline at {self.server_ip}", color="failure")
 
         try:
-            requests.post(route_setup, json={"model": self.model})
-            requests.post(route_gen, json={"messages": history})
+            session = self.get_client("server", requests.Session)
+            session.post(route_setup, json={"model": self.model})
+            session.post(route_gen, json={"messages": history})
             is_complete = False
+            with session.get(f"{self.server_ip}/stream", stream=True, timeout=(10, 600)) as response:
+                if response.status_code == 200:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        delta, sentence, is_complete = self.parse_server_update(json.loads(line[len("data:"):]), sentence)
+                        if delta:
+                            if verbose:
+                                print(delta, end="", flush=True)
+                            yield delta
+                        if is_complete:
+                            return
+            poll_delay = 0.05
             while not is_complete:
-                try:
-                    response = requests.get(f"{self.server_ip}/get_updated_sentence")
-                    if "error" in response.json():
-                        pretty_print(response.json()["error"], color="failure")
-                        break
-                    thought = response.json()["sentence"]
-                    is_complete = bool(response.json()["is_complete"])
-                    time.sleep(2)
-                except requests.exceptions.RequestException as e:
-                    pretty_print(f"HTTP request failed: {str(e)}", color="failure")
-                    break
-                except ValueError as e:
-                    pretty_print(f"Failed to parse JSON response: {str(e)}", color="failure")
-                    break
-                except Exception as e:
-                    pretty_print(f"An error occurred: {str(e)}", color="failure")
-                    break
+                response = session.get(f"{self.server_ip}/get_updated_sentence",
+                                       params={"offset": len(sentence), "wait": 10}, timeout=(10, 30))
+                result = response.json()
+                delta, sentence, is_complete = self.parse_server_update(result, sentence)
+                if delta:
+                    if verbose:
+                        print(delta, end="", flush=True)
+                    yield delta
+                if "offset" not in result and not is_complete: # legacy server can't long-poll, back off
+                    time.sleep(poll_delay)
+                    poll_delay = 0.05 if delta else min(poll_delay * 2, 2)
+        except requests.exceptions.RequestException as e:
+            pretty_print(f"HTTP request failed: {str(e)}", color="failure")
+        except ValueError as e:
+            pretty_print(f"Server error or invalid JSON response: {str(e)}", color="failure")
+        except KeyError as e:
+            raise Exception(
+                f"{str(e)}\nError occured with server route. Are you using the correct address for the config.ini provider?") from e
+
+    async def server_astream(self, history, verbose=False, **options):
+        """
+        Asynchronous version of server_stream using the pooled httpx client.
+        """
+        sentence = ""
+        client = async_client_pool.get(f"server:{self.server_ip}", self.server_ip)
+        try:
+            await client.post("/setup", json={"model": self.model})
+            await client.post("/generate", json={"messages": history})
+            is_complete = False
+            async with client.stream("GET", "/stream") as response:
+                if response.status_code == 200:
+                    async for data in aiter_sse_data(response):
+                        delta, sentence, is_complete = self.parse_server_update(json.loads(data), sentence)
+                        if delta:
+                            if verbose:
+                                print(delta, end="", flush=True)
+                            yield delta
+                        if is_complete:
+                            return
+            poll_delay = 0.05
+            while not is_complete:
+                response = await client.get("/get_updated_sentence", params={"offset": len(sentence), "wait": 10})
+                result = response.json()
+                delta, sentence, is_complete = self.parse_server_update(result, sentence)
+                if delta:
+                    if verbose:
+                        print(delta, end="", flush=True)
+                    yield delta
+                if "offset" not in result and not is_complete:
+                    await asyncio.sleep(poll_delay)
+                    poll_delay = 0.05 if delta else min(poll_delay * 2, 2)
+        except httpx.HTTPError as e:
+            pretty_print(f"HTTP request failed: {str(e)}", color="failure")
+        except ValueError as e:
+            pretty_print(f"Server error or invalid JSON response: {str(e)}", color="failure")
         except KeyError as e:
             raise Exception(
                 f"{str(e)}\nError occured with server route. Are you using the correct address for the config.ini provider?") from e
-        except Exception as e:
-            raise e
-        return thought
 
-    def ollama_fn(self, history, verbose=False):
+    def ollama_fn(self, history, verbose=False, **options):
         """
         Use local or remote Ollama server to generate text.
         """
-        thought = ""
+        return "".join(self.ollama_stream(history, verbose, **options))
+
+    def ollama_stream(self, history, verbose=False, **options):
+        """
+        Use local or remote Ollama server to generate text, yield the chunks as they are generated.
+        """
         host = f"{self.internal_url}:11434" if self.is_local else f"http://{self.server_address}"
-        client = OllamaClient(host=host)
+        client = self.get_client("ollama", lambda: OllamaClient(host=host))
 
-        try:
-            stream = client.chat(
-                model=self.model,
-                messages=history,
-                stream=True,
-            )
-            for chunk in stream:
-                if verbose:
-                    print(chunk["message"]["content"], end="", flush=True)
-                thought += chunk["message"]["content"]
-        except httpx.ConnectError as e:
-            raise Exception(
-                f"\nOllama connection failed at {host}. Check if the server is running."
-            ) from e
-        except Exception as e:
-            if hasattr(e, 'status_code') and e.status_code == 404:
-                animate_thinking(f"Downloading {self.model}...")
-                client.pull(self.model)
-                self.ollama_fn(history, verbose)
-            if "refused" in str(e).lower():
+        temperature = self.get_sampling_params().get("temperature")
+        for attempt in range(2): # the model is pulled once if missing, then the request is retried
+            try:
+                stream = client.chat(
+                    model=self.model,
+                    messages=history,
+                    stream=True,
+                    format=options.get("json_schema"),
+                    options={"temperature": temperature} if temperature is not None else None,
+                )
+                for chunk in stream:
+                    if verbose:
+                        print(chunk["message"]["content"], end="", flush=True)
+                    yield chunk["message"]["content"]
+                return
+            except httpx.ConnectError as e:
                 raise Exception(
-                    f"Ollama connection refused at {host}. Is the server running?"
+                    f"\nOllama connection failed at {host}. Check if the server is running."
                 ) from e
-            raise e
+            except Exception as e:
+                if hasattr(e, 'status_code') and e.status_code == 404 and attempt == 0:
+                    animate_thinking(f"Downloading {self.model}...")
+                    client.pull(self.model)
+                    continue
+                if "refused" in str(e).lower():
+                    raise Exception(
+                        f"Ollama connection refused at {host}. Is the server running?"
+                    ) from e
+                raise e
 
-        return thought
+    async def ollama_astream(self, history, verbose=False, **options):
+        """
+        Asynchronous version of ollama_stream, read the /api/chat NDJSON stream on the pooled httpx client.
+        """
+        host = f"{self.internal_url}:11434" if self.is_local else f"http://{self.server_address}"
+        client = async_client_pool.get(f"ollama:{host}", host)
+        payload = {"model": self.model, "messages": history, "stream": True}
+        if options.get("json_schema") is not None:
+            payload["format"] = options["json_schema"]
+        temperature = self.get_sampling_params().get("temperature")
+        if temperature is not None:
+            payload["options"] = {"temperature": temperature}
+        for attempt in range(2): # the model is pulled once if missing, then the request is retried
+            try:
+                async with client.stream("POST", "/api/chat", json=payload) as response:
+                    if response.status_code == 404 and attempt == 0:
+                        animate_thinking(f"Downloading {self.model}...")
+                        await client.post("/api/pull", json={"model": self.model, "stream": False}, timeout=None)
+                        continue
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        raise Exception(f"Ollama returned status {response.status_code}: {body.decode(errors='replace')}")
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            raise Exception(f"Ollama error: {chunk['error']}")
+                        content = chunk.get("message", {}).get("content", "")
+                        if verbose:
+                            print(content, end="", flush=True)
+                        yield content
+                    return
+            except httpx.ConnectError as e:
+                raise Exception(
+                    f"\nOllama connection failed at {host}. Check if the server is running."
+                ) from e
 
-    def huggingface_fn(self, history, verbose=False):
+    def huggingface_fn(self, history, verbose=False, **options):
         """
         Use huggingface to generate text.
         """
@@ -210,55 +741,184 @@ class Provider:
         thought = completion.choices[0].message
         return thought.content
 
-    def huggingface_local_fn(self, history, verbose=False):
+    def huggingface_stream(self, history, verbose=False, **options):
         """
-        Use local HuggingFace Transformers model (Qwen3).
-        Runs entirely on local hardware (MPS/CUDA/CPU).
+        Use huggingface to generate text, yield the chunks as they are generated.
+        """
+        from huggingface_hub import InferenceClient
+        client = InferenceClient(
+            api_key=self.get_api_key("huggingface")
+        )
+        stream = client.chat.completions.create(
+            model=self.model,
+            messages=history,
+            max_tokens=1024,
+            stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if verbose:
+                    print(delta, end="", flush=True)
+                yield delta
+
+    def load_hf_causal_lm(self, name: str, device: str, dtype):
+        """
+        Load a HuggingFace causal language model in eval mode on a device.
+        """
+        from transformers import AutoModelForCausalLM
+
+        token = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_TOKEN")
+        try:
+            model = AutoModelForCausalLM.from_pretrained(
+                name,
+                torch_dtype=dtype,
+                token=token,
+                low_cpu_mem_usage=True,
+            )
+        except Exception as e:
+            if "gated" in str(e).lower() or "401" in str(e):
+                raise RuntimeError(
+                    f"Authentication required for {name}. "
+                    "Set HF_TOKEN environment variable."
+                ) from e
+            raise
+        model.to(device)
+        model.eval()
+        return model
+
+    def get_hf_local_tokenizer(self):
+        """
+        Get the tokenizer of the local model, without loading the model if it is not loaded yet.
+        """
+        if self._hf_local_tokenizer is not None:
+            return self._hf_local_tokenizer
+        def load():
+            from transformers import AutoTokenizer
+            token = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_TOKEN")
+            return AutoTokenizer.from_pretrained(self.model, token=token)
+        return model_registry.get(f"tokenizer:{self.model}", load)
+
+    def load_hf_local_model(self) -> None:
+        """
+        Lazy load the local HuggingFace Transformers model on the best available device.
         """
         import torch
-        import re
 
-        # Lazy load model on first call
-        if self._hf_local_model is None:
-            from transformers import AutoModelForCausalLM, AutoTokenizer
+        if self._hf_local_model is not None or self._gguf_model is not None:
+            return
+        if self.precision == "gguf":
+            self.load_gguf_model()
+            return
 
-            # Detect best device
-            if torch.cuda.is_available():
-                device = "cuda"
-            elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
-                device = "mps"
-            else:
-                device = "cpu"
+        # Detect best device
+        if torch.cuda.is_available():
+            device = "cuda"
+        elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+            device = "mps"
+        else:
+            device = "cpu"
 
-            # Use float16 for GPU (CUDA/MPS) to save memory, float32 for CPU
-            dtype = torch.float16 if device in ("cuda", "mps") else torch.float32
+        # float16 on GPU, bf16 or int8 on CPU unless the config ask for another precision
+        self.precision_mode = resolve_precision(self.precision, device)
 
-            pretty_print(f"Loading {self.model} on {device}...", color="status")
+        pretty_print(f"Loading {self.model} on {device} ({self.precision_mode})...", color="status")
 
-            token = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_TOKEN")
+        self._hf_local_tokenizer = self.get_hf_local_tokenizer()
+        model = self.load_hf_causal_lm(self.model, device, torch_dtype(self.precision_mode))
+        if self.precision_mode == "int8":
+            model = quantize_int8(model)
+        self._hf_local_model = model
+        pretty_print(f"Model {self.model} loaded successfully on {device}", color="success")
+
+    def load_gguf_model(self):
+        """
+        Lazy load the GGUF model of the llama.cpp backend (llama-cpp-python), used with precision = gguf.
+        """
+        if self._gguf_model is None:
             try:
-                self._hf_local_tokenizer = AutoTokenizer.from_pretrained(self.model, token=token)
-                self._hf_local_model = AutoModelForCausalLM.from_pretrained(
-                    self.model,
-                    torch_dtype=dtype,
-                    token=token,
-                    low_cpu_mem_usage=True,
-                )
-                self._hf_local_model.to(device)
-                self._hf_local_model.eval()
-                pretty_print(f"Model {self.model} loaded successfully on {device}", color="success")
-            except Exception as e:
-                if "gated" in str(e).lower() or "401" in str(e):
-                    raise RuntimeError(
-                        f"Authentication required for {self.model}. "
-                        "Set HF_TOKEN environment variable."
-                    ) from e
-                raise
+                from llama_cpp import Llama
+            except ImportError as e:
+                raise ImportError("precision = gguf requires llama-cpp-python: pip install llama-cpp-python") from e
+            if not self.gguf_model or not os.path.exists(self.gguf_model):
+                raise FileNotFoundError(f"GGUF model not found: {self.gguf_model}. Set gguf_model in config.ini [LOCAL_MODEL].")
+            pretty_print(f"Loading {self.gguf_model} with llama.cpp...", color="status")
+            self._gguf_model = Llama(model_path=self.gguf_model,
+                                     n_ctx=int(os.getenv("LLM_CONTEXT_SIZE", "8192")),
+                                     n_threads=os.cpu_count(),
+                                     verbose=False)
+            self.precision_mode = "gguf"
+            pretty_print(f"Model {self.gguf_model} loaded successfully", color="success")
+        return self._gguf_model
 
-        tok = self._hf_local_tokenizer
-        mdl = self._hf_local_model
+    def gguf_generate(self, history, streamer=None, **options) -> str:
+        """
+        Generate an answer with the llama.cpp backend, stopping as soon as a stop string is generated.
+        """
+        llm = self.load_gguf_model()
+        params = self.get_sampling_params()
+        kwargs = {
+            "messages": [{"role": msg["role"], "content": msg["content"]} for msg in history],
+            "max_tokens": params["max_new_tokens"],
+            "temperature": params.get("temperature", 0.0) if params["do_sample"] else 0.0,
+            "top_p": params.get("top_p", 1.0),
+            "stream": True,
+        }
+        if options.get("json_schema") is not None:
+            kwargs["response_format"] = {"type": "json_object", "schema": options["json_schema"]}
+        stop = options.get("stop")
+        response = ""
+        new_tokens = 0
+        start = time.time()
+        for chunk in llm.create_chat_completion(**kwargs):
+            delta = chunk["choices"][0]["delta"].get("content")
+            if not delta:
+                continue
+            new_tokens += 1 # llama.cpp stream one token per chunk
+            response += delta
+            if streamer is not None:
+                streamer.on_finalized_text(delta)
+            if stop and self.find_stop(response, stop) >= 0:
+                break
+        if streamer is not None:
+            streamer.end()
+        self.decoding_stats.record(options.get("agent_type"), new_tokens, time.time() - start)
+        return response
 
-        # Build prompt using chat template
+    def load_hf_draft_model(self):
+        """
+        Lazy load the draft model used for speculative decoding, on the device and dtype of the main model.
+        The draft model must share the main model tokenizer (eg: Qwen2.5-0.5B-Instruct for Qwen2.5-3B-Instruct).
+        """
+        if self._hf_draft_model is None:
+            self.load_hf_local_model()
+            device = self._hf_local_model.device
+            pretty_print(f"Loading draft model {self.draft_model} on {device}...", color="status")
+            draft = self.load_hf_causal_lm(self.draft_model, device, torch_dtype(self.precision_mode))
+            if self.precision_mode == "int8":
+                draft = quantize_int8(draft)
+            self._hf_draft_model = draft
+            self._hf_draft_model.generation_config.num_assistant_tokens = self.num_assistant_tokens
+        return self._hf_draft_model
+
+    def use_speculative_decoding(self, agent_type: Optional[str]) -> bool:
+        """
+        Check if the generation for an agent type use speculative decoding with the draft model.
+        An empty speculative_agent_types list enable it for every generation.
+        """
+        if not self.draft_model:
+            return False
+        if not self.speculative_agent_types:
+            return True
+        return agent_type in self.speculative_agent_types
+
+    def build_hf_local_prompt(self, history) -> str:
+        """
+        Build the prompt for the local model using its chat template.
+        """
+        tok = self._hf_local_tokenizer
         try:
             try:
                 prompt = tok.apply_chat_template(
@@ -270,49 +930,164 @@ class Provider:
             # Fallback: manual prompt construction
             prompt = "\n\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in history])
             prompt += "\n\nASSISTANT:"
+        return prompt
+
+    def hf_local_generation_kwargs(self) -> dict:
+        """
+        Get the generation parameters for the local model.
+        """
+        tok = self._hf_local_tokenizer
+        eos_ids = [tok.eos_token_id]
+        if tok.pad_token_id is not None:
+            eos_ids.append(tok.pad_token_id)
+        return {
+            **self.get_sampling_params(),
+            "max_time": float(os.getenv("LLM_MAX_TIME", "45")),
+            "eos_token_id": eos_ids,
+            "pad_token_id": tok.pad_token_id,
+        }
+
+    def get_inference_engine(self) -> Optional[InferenceEngine]:
+        """
+        Get the continuous batching engine of the local model, None if batching is disabled.
+        Batching is disabled on MPS, where the CPU fallback moves the model between devices.
+        """
+        if os.getenv("LLM_BATCHING", "1") == "0" or str(self._hf_local_model.device).startswith("mps"):
+            return None
+        if self._inference_engine is None:
+            self._inference_engine = InferenceEngine(self._hf_local_model,
+                                                     self._hf_local_tokenizer,
+                                                     max_batch_size=int(os.getenv("LLM_MAX_BATCH_SIZE", "4")),
+                                                     max_queue=int(os.getenv("LLM_MAX_QUEUE", "16")),
+                                                     prefix_cache=self.prefix_cache)
+        return self._inference_engine
+
+    def hf_local_generate(self, history, streamer=None, **options) -> str:
+        """
+        Generate an answer with the local model.
+        The KV cache of the prefix shared with the session previous turn is reused, only the new suffix is prefilled.
+        Unless LLM_BATCHING=0, the generation is queued in the continuous batching engine shared by all the callers.
+        Agent types configured for speculative decoding are generated apart, assisted by the draft model.
+        With precision = gguf the generation runs on the llama.cpp backend instead.
+        Args:
+            history (list): The messages to send to the LLM
+            streamer (TextIteratorStreamer, optional): Streamer receiving the tokens as they are generated
+            **options: Request options (see respond): json_schema, stop, agent_type
+        Returns:
+            str: The decoded answer
+        """
+        import torch
+
+        if self.precision == "gguf":
+            return self.gguf_generate(history, streamer, **options)
+        self.load_hf_local_model()
+        tok = self._hf_local_tokenizer
+        mdl = self._hf_local_model
+
+        # Build prompt using chat template
+        prompt = self.build_hf_local_prompt(history)
 
         # Tokenize
         inputs = tok(prompt, return_tensors="pt").to(mdl.device)
         input_len = inputs.input_ids.shape[1]
 
-        def generate_once():
-            max_new_tokens = int(os.getenv("LLM_MAX_NEW_TOKENS", "512"))
-            max_time = float(os.getenv("LLM_MAX_TIME", "45"))
-            eos_ids = [tok.eos_token_id]
-            if tok.pad_token_id is not None:
-                eos_ids.append(tok.pad_token_id)
-            with torch.no_grad():
-                return mdl.generate(
-                    **inputs,
-                    max_new_tokens=max_new_tokens,
-                    max_time=max_time,
-                    do_sample=True,
-                    temperature=0.7,
-                    top_p=0.9,
-                    eos_token_id=eos_ids,
-                    pad_token_id=tok.pad_token_id,
-                )
+        gen_kwargs = self.hf_local_generation_kwargs()
+        if options.get("json_schema") is not None:
+            from transformers import LogitsProcessorList
+            gen_kwargs["logits_processor"] = LogitsProcessorList([
+                JsonSchemaLogitsProcessor(options["json_schema"], tok, gen_kwargs["eos_token_id"])
+            ])
+        if options.get("stop"):
+            # StopStringCriteria, it needs the tokenizer to match strings across token boundaries
+            gen_kwargs["stop_strings"] = options["stop"]
+            gen_kwargs["tokenizer"] = tok
+        agent_type = options.get("agent_type")
+        # the schema processor would also run on the draft model tokens, constrained answers are generated plainly
+        if self.use_speculative_decoding(agent_type) and options.get("json_schema") is None:
+            return self.hf_local_speculative_generate(inputs, gen_kwargs, agent_type, streamer)
+        session_key = PrefixCache.session_key(history)
+        engine = self.get_inference_engine()
+        if engine is not None:
+            on_text = streamer.on_finalized_text if streamer is not None else None
+            future = engine.submit(inputs.input_ids[0].tolist(), gen_kwargs, session_key, on_text)
 
-        out = generate_once()
+            def record_stats(done):
+                if not done.cancelled() and done.exception() is None:
+                    self.decoding_stats.record(agent_type, done.new_tokens, done.elapsed)
+            future.add_done_callback(record_stats)
+            response = future.result()
+            if streamer is not None:
+                streamer.end()
+            return response
+        reused = 0
+        if self.prefix_cache is not None:
+            past_key_values, reused = self.prefix_cache.lookup(session_key, inputs.input_ids[0].tolist())
+            if past_key_values is not None:
+                gen_kwargs["past_key_values"] = past_key_values
+        if streamer is not None:
+            gen_kwargs["streamer"] = streamer
 
-        response = tok.decode(out[0][input_len:], skip_special_tokens=True)
+        start = time.time()
+        with torch.no_grad():
+            out = mdl.generate(
+                **inputs,
+                **gen_kwargs,
+                return_dict_in_generate=True,
+            )
+        self.decoding_stats.record(agent_type, len(out.sequences[0]) - input_len, time.time() - start)
+        if self.prefix_cache is not None:
+            self.prefix_cache.store(session_key, out.sequences[0].tolist(), out.past_key_values)
+            self.prefix_cache.log_stats(input_len - reused, reused)
+        return tok.decode(out.sequences[0][input_len:], skip_special_tokens=True)
+
+    def hf_local_speculative_generate(self, inputs, gen_kwargs: dict, agent_type: Optional[str], streamer=None) -> str:
+        """
+        Generate with assisted (speculative) decoding: the draft model propose tokens, the main model verify them in one pass.
+        The forward passes of both models are counted to report the draft acceptance rate.
+        """
+        import torch
 
-        if len(response.strip()) < 8 and str(mdl.device).startswith("mps"):
+        mdl = self._hf_local_model
+        draft = self.load_hf_draft_model()
+        input_len = inputs.input_ids.shape[1]
+        if streamer is not None:
+            gen_kwargs["streamer"] = streamer
+        start = time.time()
+        with ForwardCounter(mdl) as target_calls, ForwardCounter(draft) as draft_calls, torch.no_grad():
+            out = mdl.generate(
+                **inputs,
+                **gen_kwargs,
+                assistant_model=draft,
+            )
+        self.decoding_stats.record(agent_type, len(out[0]) - input_len, time.time() - start,
+                                   target_calls=target_calls.count, draft_calls=draft_calls.count)
+        return self._hf_local_tokenizer.decode(out[0][input_len:], skip_special_tokens=True)
+
+    def huggingface_local_fn(self, history, verbose=False, **options):
+        """
+        Use local HuggingFace Transformers model (Qwen3).
+        Runs entirely on local hardware (MPS/CUDA/CPU).
+        """
+        import torch
+
+        response = self.hf_local_generate(history, **options)
+        tok = self._hf_local_tokenizer
+        mdl = self._hf_local_model
+
+        if len(response.strip()) < 8 and mdl is not None and str(mdl.device).startswith("mps"):
             pretty_print("Short generation on MPS; falling back to CPU.", color="warning")
             mdl_cpu = mdl.to("cpu")
+            if self.prefix_cache is not None:
+                self.prefix_cache.clear() # cached KV tensors live on the previous device
+            prompt = self.build_hf_local_prompt(history)
             inputs_cpu = tok(prompt, return_tensors="pt").to(mdl_cpu.device)
             input_len_cpu = inputs_cpu.input_ids.shape[1]
+            gen_kwargs = self.hf_local_generation_kwargs()
+            gen_kwargs.pop("max_time")
             with torch.no_grad():
                 out_cpu = mdl_cpu.generate(
                     **inputs_cpu,
-                    max_new_tokens=int(os.getenv("LLM_MAX_NEW_TOKENS", "512")),
-                    do_sample=True,
-                    temperature=0.7,
-                    top_p=0.9,
-                    eos_token_id=[tok.eos_token_id, tok.pad_token_id]
-                    if tok.pad_token_id is not None
-                    else tok.eos_token_id,
-                    pad_token_id=tok.pad_token_id,
+                    **gen_kwargs,
                 )
             response = tok.decode(out_cpu[0][input_len_cpu:], skip_special_tokens=True)
 
@@ -324,6 +1099,36 @@ class Provider:
 
         return response
 
+    def huggingface_local_stream(self, history, verbose=False, **options):
+        """
+        Use local HuggingFace Transformers model, yield the decoded text as it is generated.
+        Generation runs in a background thread feeding a TextIteratorStreamer.
+        """
+        import threading
+        from transformers import TextIteratorStreamer
+
+        self.load_hf_local_model()
+        streamer = TextIteratorStreamer(self._hf_local_tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def generate():
+            try:
+                self.hf_local_generate(history, streamer=streamer, **options)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        for text in streamer:
+            if text:
+                if verbose:
+                    print(text, end="", flush=True)
+                yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+
     def _extract_json_from_response(self, text):
         """Extract JSON from model response if present."""
         import re
@@ -368,9 +1173,58 @@ class Provider:
 
         return text.strip()
 
-    def openai_fn(self, history, verbose=False):
+    def openai_compatible_stream(self, client, model, history, verbose=False, name="OpenAI", **params):
         """
-        Use openai to generate text.
+        Stream a chat completion from an OpenAI compatible client, yield the content deltas.
+        """
+        try:
+            stream = client.chat.completions.create(
+                model=model,
+                messages=history,
+                stream=True,
+                **params
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if verbose:
+                        print(delta, end="", flush=True)
+                    yield delta
+        except Exception as e:
+            raise Exception(f"{name} API error: {str(e)}") from e
+
+    async def openai_compatible_astream(self, backend, base_url, model, history, verbose=False, name="OpenAI",
+                                        route="chat/completions", **params):
+        """
+        Stream a chat completion from an OpenAI compatible API on a pooled httpx client, yield the content deltas.
+        """
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        client = async_client_pool.get(f"{backend}:{base_url}", base_url, headers)
+        payload = {"model": model, "messages": history, "stream": True, **params}
+        try:
+            async with client.stream("POST", route, json=payload) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise Exception(f"status {response.status_code}: {body.decode(errors='replace')[:500]}")
+                async for data in aiter_sse_data(response):
+                    choices = json.loads(data).get("choices", [])
+                    if not choices:
+                        continue
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        if verbose:
+                            print(delta, end="", flush=True)
+                        yield delta
+        except httpx.ConnectError:
+            raise
+        except Exception as e:
+            raise Exception(f"{name} API error: {str(e)}") from e
+
+    def get_openai_base_url(self) -> str:
+        """
+        Get the base url of the official OpenAI API or of a local OpenAI compatible server.
         """
         base_url = self.server_ip
         if self.is_local and self.in_docker:
@@ -378,16 +1232,28 @@ class Provider:
                 host, port = base_url.split(':')
             except Exception as e:
                 port = "8000"
-            client = OpenAI(api_key=self.api_key, base_url=f"{self.internal_url}:{port}")
+            return f"{self.internal_url}:{port}"
         elif self.is_local:
-            client = OpenAI(api_key=self.api_key, base_url=f"http://{base_url}")
-        else:
-            client = OpenAI(api_key=self.api_key)
+            return f"http://{base_url}"
+        return OPENAI_COMPATIBLE_URLS["openai"]
+
+    def get_openai_client(self) -> OpenAI:
+        """
+        Get the shared OpenAI client for the official API or a local OpenAI compatible server.
+        """
+        return self.get_client("openai", lambda: OpenAI(api_key=self.api_key, base_url=self.get_openai_base_url()))
+
+    def openai_fn(self, history, verbose=False, **options):
+        """
+        Use openai to generate text.
+        """
+        client = self.get_openai_client()
 
         try:
             response = client.chat.completions.create(
                 model=self.model,
                 messages=history,
+                **self.openai_request_params(options)
             )
             if response is None:
                 raise Exception("OpenAI response is empty.")
@@ -398,7 +1264,23 @@ class Provider:
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}") from e
 
-    def anthropic_fn(self, history, verbose=False):
+    def openai_stream(self, history, verbose=False, **options):
+        """
+        Use openai to generate text, yield the chunks as they are generated.
+        """
+        yield from self.openai_compatible_stream(self.get_openai_client(), self.model, history, verbose, "OpenAI",
+                                                 **self.openai_request_params(options))
+
+    async def openai_astream(self, history, verbose=False, **options):
+        """
+        Use openai to generate text asynchronously.
+        """
+        async for delta in self.openai_compatible_astream("openai", self.get_openai_base_url(), self.model,
+                                                          history, verbose, "OpenAI",
+                                                          **self.openai_request_params(options)):
+            yield delta
+
+    def anthropic_fn(self, history, verbose=False, **options):
         """
         Use Anthropic to generate text.
         """
@@ -430,7 +1312,7 @@ class Provider:
         except Exception as e:
             raise Exception(f"Anthropic API error: {str(e)}") from e
 
-    def google_fn(self, history, verbose=False):
+    def google_fn(self, history, verbose=False, **options):
         """
         Use google gemini to generate text.
         """
@@ -438,11 +1320,12 @@ class Provider:
         if self.is_local:
             raise Exception("Google Gemini is not available for local use. Change config.ini")
 
-        client = OpenAI(api_key=self.api_key, base_url="https://generativelanguage.googleapis.com/v1beta/openai/")
+        client = self.get_client("google", lambda: OpenAI(api_key=self.api_key, base_url=OPENAI_COMPATIBLE_URLS["google"]))
         try:
             response = client.chat.completions.create(
                 model=self.model,
                 messages=history,
+                **self.openai_request_params(options)
             )
             if response is None:
                 raise Exception("Google response is empty.")
@@ -453,12 +1336,33 @@ class Provider:
         except Exception as e:
             raise Exception(f"GOOGLE API error: {str(e)}") from e
 
-    def together_fn(self, history, verbose=False):
+    def google_stream(self, history, verbose=False, **options):
+        """
+        Use google gemini to generate text, yield the chunks as they are generated.
+        """
+        if self.is_local:
+            raise Exception("Google Gemini is not available for local use. Change config.ini")
+        client = self.get_client("google", lambda: OpenAI(api_key=self.api_key, base_url=OPENAI_COMPATIBLE_URLS["google"]))
+        yield from self.openai_compatible_stream(client, self.model, history, verbose, "GOOGLE",
+                                                 **self.openai_request_params(options))
+
+    async def google_astream(self, history, verbose=False, **options):
+        """
+        Use google gemini to generate text asynchronously.
+        """
+        if self.is_local:
+            raise Exception("Google Gemini is not available for local use. Change config.ini")
+        async for delta in self.openai_compatible_astream("google", OPENAI_COMPATIBLE_URLS["google"], self.model,
+                                                          history, verbose, "GOOGLE",
+                                                          **self.openai_request_params(options)):
+            yield delta
+
+    def together_fn(self, history, verbose=False, **options):
         """
         Use together AI for completion
         """
         from together import Together
-        client = Together(api_key=self.api_key)
+        client = self.get_client("together", lambda: Together(api_key=self.api_key))
         if self.is_local:
             raise Exception("Together AI is not available for local use. Change config.ini")
 
@@ -466,6 +1370,7 @@ class Provider:
             response = client.chat.completions.create(
                 model=self.model,
                 messages=history,
+                **self.openai_request_params(options)
             )
             if response is None:
                 raise Exception("Together AI response is empty.")
@@ -476,18 +1381,41 @@ class Provider:
         except Exception as e:
             raise Exception(f"Together AI API error: {str(e)}") from e
 
-    def deepseek_fn(self, history, verbose=False):
+    def together_stream(self, history, verbose=False, **options):
+        """
+        Use together AI for completion, yield the chunks as they are generated.
+        """
+        from together import Together
+        if self.is_local:
+            raise Exception("Together AI is not available for local use. Change config.ini")
+        client = self.get_client("together", lambda: Together(api_key=self.api_key))
+        yield from self.openai_compatible_stream(client, self.model, history, verbose, "Together AI",
+                                                 **self.openai_request_params(options))
+
+    async def together_astream(self, history, verbose=False, **options):
+        """
+        Use together AI to generate text asynchronously.
+        """
+        if self.is_local:
+            raise Exception("Together AI is not available for local use. Change config.ini")
+        async for delta in self.openai_compatible_astream("together", OPENAI_COMPATIBLE_URLS["together"], self.model,
+                                                          history, verbose, "Together AI",
+                                                          **self.openai_request_params(options)):
+            yield delta
+
+    def deepseek_fn(self, history, verbose=False, **options):
         """
         Use deepseek api to generate text.
         """
-        client = OpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
+        client = self.get_client("deepseek", lambda: OpenAI(api_key=self.api_key, base_url=OPENAI_COMPATIBLE_URLS["deepseek"]))
         if self.is_local:
             raise Exception("Deepseek (API) is not available for local use. Change config.ini")
         try:
             response = client.chat.completions.create(
                 model="deepseek-chat",
                 messages=history,
-                stream=False
+                stream=False,
+                **self.openai_request_params(options)
             )
             thought = response.choices[0].message.content
             if verbose:
@@ -496,28 +1424,53 @@ class Provider:
         except Exception as e:
             raise Exception(f"Deepseek API error: {str(e)}") from e
 
-    def lm_studio_fn(self, history, verbose=False):
+    def deepseek_stream(self, history, verbose=False, **options):
         """
-        Use local lm-studio server to generate text.
+        Use deepseek api to generate text, yield the chunks as they are generated.
+        """
+        if self.is_local:
+            raise Exception("Deepseek (API) is not available for local use. Change config.ini")
+        client = self.get_client("deepseek", lambda: OpenAI(api_key=self.api_key, base_url=OPENAI_COMPATIBLE_URLS["deepseek"]))
+        yield from self.openai_compatible_stream(client, "deepseek-chat", history, verbose, "Deepseek",
+                                                 **self.openai_request_params(options))
+
+    async def deepseek_astream(self, history, verbose=False, **options):
+        """
+        Use deepseek api to generate text asynchronously.
+        """
+        if self.is_local:
+            raise Exception("Deepseek (API) is not available for local use. Change config.ini")
+        async for delta in self.openai_compatible_astream("deepseek", OPENAI_COMPATIBLE_URLS["deepseek"], "deepseek-chat",
+                                                          history, verbose, "Deepseek",
+                                                          **self.openai_request_params(options)):
+            yield delta
+
+    def get_lm_studio_url(self) -> str:
+        """
+        Get the lm-studio server base url, from inside or outside docker.
         """
         if self.in_docker:
             # Extract port from server_address if present
             port = "1234"  # default
             if ":" in self.server_address:
                 port = self.server_address.split(":")[1]
-            url = f"{self.internal_url}:{port}"
-        else:
-            url = f"http://{self.server_ip}"
-        route_start = f"{url}/v1/chat/completions"
+            return f"{self.internal_url}:{port}"
+        return f"http://{self.server_ip}"
+
+    def lm_studio_fn(self, history, verbose=False, **options):
+        """
+        Use local lm-studio server to generate text.
+        """
+        route_start = f"{self.get_lm_studio_url()}/v1/chat/completions"
         payload = {
             "messages": history,
-            "temperature": 0.7,
             "max_tokens": 4096,
-            "model": self.model
+            "model": self.model,
+            **self.openai_request_params(options)
         }
 
         try:
-            response = requests.post(route_start, json=payload, timeout=30)
+            response = self.get_client("lm-studio", requests.Session).post(route_start, json=payload, timeout=30)
             if response.status_code != 200:
                 raise Exception(f"LM Studio returned status {response.status_code}: {response.text}")
             if not response.text.strip():
@@ -551,11 +1504,60 @@ class Provider:
             raise Exception(f"Unexpected error: {str(e)}") from e
         return thought
 
-    def openrouter_fn(self, history, verbose=False):
+    def lm_studio_stream(self, history, verbose=False, **options):
+        """
+        Use local lm-studio server to generate text, yield the chunks of the server-sent events stream.
+        """
+        route_start = f"{self.get_lm_studio_url()}/v1/chat/completions"
+        payload = {
+            "messages": history,
+            "max_tokens": 4096,
+            "model": self.model,
+            "stream": True,
+            **self.openai_request_params(options)
+        }
+        try:
+            session = self.get_client("lm-studio", requests.Session)
+            with session.post(route_start, json=payload, timeout=30, stream=True) as response:
+                if response.status_code != 200:
+                    raise Exception(f"LM Studio returned status {response.status_code}: {response.text}")
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices", [])
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        if verbose:
+                            print(delta, end="", flush=True)
+                        yield delta
+        except requests.exceptions.Timeout:
+            raise Exception("LM Studio request timed out - check if server is responsive")
+        except requests.exceptions.ConnectionError:
+            raise Exception(f"Cannot connect to LM Studio at {route_start} - check if server is running")
+        except ValueError as e:
+            raise Exception(f"Invalid JSON from LM Studio stream: {str(e)}") from e
+
+    async def lm_studio_astream(self, history, verbose=False, **options):
+        """
+        Use local lm-studio server to generate text asynchronously.
+        """
+        async for delta in self.openai_compatible_astream("lm-studio", self.get_lm_studio_url(), self.model,
+                                                          history, verbose, "LM Studio",
+                                                          route="v1/chat/completions",
+                                                          max_tokens=4096,
+                                                          **self.openai_request_params(options)):
+            yield delta
+
+    def openrouter_fn(self, history, verbose=False, **options):
         """
         Use OpenRouter API to generate text.
         """
-        client = OpenAI(api_key=self.api_key, base_url="https://openrouter.ai/api/v1")
+        client = self.get_client("openrouter", lambda: OpenAI(api_key=self.api_key, base_url=OPENAI_COMPATIBLE_URLS["openrouter"]))
         if self.is_local:
             # This case should ideally not be reached if unsafe_providers is set correctly
             # and is_local is False in config for openrouter
@@ -564,6 +1566,7 @@ class Provider:
             response = client.chat.completions.create(
                 model=self.model,
                 messages=history,
+                **self.openai_request_params(options)
             )
             if response is None:
                 raise Exception("OpenRouter response is empty.")
@@ -574,7 +1577,28 @@ class Provider:
         except Exception as e:
             raise Exception(f"OpenRouter API error: {str(e)}") from e
 
-    def dsk_deepseek(self, history, verbose=False):
+    def openrouter_stream(self, history, verbose=False, **options):
+        """
+        Use OpenRouter API to generate text, yield the chunks as they are generated.
+        """
+        if self.is_local:
+            raise Exception("OpenRouter is not available for local use. Change config.ini")
+        client = self.get_client("openrouter", lambda: OpenAI(api_key=self.api_key, base_url=OPENAI_COMPATIBLE_URLS["openrouter"]))
+        yield from self.openai_compatible_stream(client, self.model, history, verbose, "OpenRouter",
+                                                 **self.openai_request_params(options))
+
+    async def openrouter_astream(self, history, verbose=False, **options):
+        """
+        Use OpenRouter API to generate text asynchronously.
+        """
+        if self.is_local:
+            raise Exception("OpenRouter is not available for local use. Change config.ini")
+        async for delta in self.openai_compatible_astream("openrouter", OPENAI_COMPATIBLE_URLS["openrouter"], self.model,
+                                                          history, verbose, "OpenRouter",
+                                                          **self.openai_request_params(options)):
+            yield delta
+
+    def dsk_deepseek(self, history, verbose=False, **options):
         """
         Use: xtekky/deepseek4free
         For free api. Api key should be set to DSK_DEEPSEEK_API_KEY
@@ -610,7 +1634,19 @@ class Provider:
             raise APIError(f"API error occurred: {str(e)}") from e
         return None
 
-    def test_fn(self, history, verbose=True):
+    def dsk_deepseek_stream(self, history, verbose=False, **options):
+        """
+        Use: xtekky/deepseek4free, yield the text chunks as they are received.
+        """
+        from dsk.api import DeepSeekAPI
+        message = '\n---\n'.join([f"{msg['role']}: {msg['content']}" for msg in history])
+        api = DeepSeekAPI(self.api_key)
+        chat_id = api.create_chat_session()
+        for chunk in api.chat_completion(chat_id, message):
+            if chunk['type'] == 'text':
+                yield chunk['content']
+
+    def test_fn(self, history, verbose=True, **options):
         """
         This function is used to conduct tests.
         """
@@ -619,6 +1655,13 @@ class Provider:
         """
         return thought
 
+    def test_stream(self, history, verbose=True, **options):
+        """
+        Streaming variant of test_fn, yield the test answer line by line.
+        """
+        for line in self.test_fn(history, verbose).splitlines(keepends=True):
+            yield line
+
 
 if __name__ == "__main__":
     provider = Provider("server", "deepseek-r1:32b", " x.x.x.x:8080")
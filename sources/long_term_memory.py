@@ -0,0 +1,284 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from sources.logger import Logger
+from sources.model_registry import model_registry
+from sources.session_store import SessionStore
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SNIPPET_CHARS = 600
+MIN_SNIPPET_CHARS = 24
+
+class Embedder:
+    """
+    Sentence embeddings with a HuggingFace encoder: mean pooling of the last hidden states, L2 normalized.
+    The encoder is shared through the model registry.
+    """
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = 32):
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def get_model(self):
+        def load():
+            from transformers import AutoTokenizer, AutoModel
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModel.from_pretrained(self.model_name).eval()
+            return tokenizer, model
+        return model_registry.get(f"embedder:{self.model_name}", load)
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        tokenizer, model = self.get_model()
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = tokenizer(texts[start:start + self.batch_size], padding=True, truncation=True,
+                               max_length=256, return_tensors="pt")
+            with torch.no_grad():
+                hidden = model(**inputs).last_hidden_state
+            mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            vectors.append(torch.nn.functional.normalize(pooled, dim=-1).cpu().numpy())
+        return np.concatenate(vectors).astype(np.float32)
+
+class LongTermMemory:
+    """
+    LongTermMemory indexes the messages of the saved sessions and retrieves the ones relevant to a query.
+    Embeddings are appended as rows of a float16 matrix file, read through a memory map,
+    their metadata (session, agent, role, text) as lines of a JSONL file.
+    Messages are deduplicated by content hash, so sessions can be re-scanned incrementally.
+    """
+    def __init__(self, path: str = ".cache/long_term_memory",
+                 embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 dim: Optional[int] = None):
+        """
+        Args:
+            path (str): Folder of the index files
+            embed_fn (Callable, optional): Function embedding texts into L2 normalized vectors, Embedder() by default
+            dim (int, optional): Embedding size, read from the index or the first embeddings if None
+        """
+        self.logger = Logger("memory.log")
+        self.path = path
+        self.embed_fn = embed_fn or Embedder()
+        self.vectors_path = os.path.join(path, "vectors.f16")
+        self.entries_path = os.path.join(path, "entries.jsonl")
+        self.state_path = os.path.join(path, "indexed_files.json")
+        os.makedirs(path, exist_ok=True)
+        self.entries: List[dict] = []
+        self.hashes = set()
+        self.dim = dim
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="long-term-memory")
+        self.load()
+
+    def load(self) -> None:
+        if os.path.exists(self.entries_path):
+            with open(self.entries_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break # truncated by a crash, the vectors after it are dropped too
+                    self.entries.append(entry)
+                    self.hashes.add(entry['hash'])
+        if not self.entries:
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path) # vectors written before a crash, without their entries
+            return
+        if self.dim is None:
+            self.dim = self.entries[0]['dim']
+        rows = os.path.getsize(self.vectors_path) // (2 * self.dim) if os.path.exists(self.vectors_path) else 0
+        if rows != len(self.entries):
+            self.logger.warning(f"Long term memory index out of sync ({rows} vectors, {len(self.entries)} entries), truncating.")
+            n = min(rows, len(self.entries))
+            self.entries = self.entries[:n]
+            self.hashes = {entry['hash'] for entry in self.entries}
+            self.rewrite_entries()
+            if self.dim:
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(n * 2 * self.dim)
+
+    def rewrite_entries(self) -> None:
+        tmp_path = self.entries_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.entries_path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def snippet(message: dict) -> Optional[str]:
+        """
+        Get the text indexed for a message, None for system prompts and messages too short to be worth recalling.
+        """
+        if message.get('role') not in ('user', 'assistant'):
+            return None
+        text = " ".join(str(message.get('content', '')).split())
+        if len(text) < MIN_SNIPPET_CHARS:
+            return None
+        return text[:MAX_SNIPPET_CHARS]
+
+    def matrix(self) -> Optional[np.ndarray]:
+        """
+        Get the memory map of the embeddings, reopened when rows were appended.
+        """
+        if not self.entries:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != len(self.entries):
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(len(self.entries), self.dim))
+        return self._matrix
+
+    def add(self, messages: List[dict], session_id: Optional[str] = None, agent_type: Optional[str] = None) -> int:
+        """
+        Embed and index messages not indexed yet.
+        Returns:
+            int: Number of messages added
+        """
+        new = {}
+        for message in messages:
+            text = self.snippet(message)
+            if text is None:
+                continue
+            key = self.content_hash(text)
+            if key not in self.hashes and key not in new:
+                new[key] = {'hash': key, 'session': session_id, 'agent': agent_type,
+                            'role': message['role'], 'time': message.get('time'), 'text': text}
+        if not new:
+            return 0
+        pending = list(new.values())
+        vectors = np.asarray(self.embed_fn([entry['text'] for entry in pending]), dtype=np.float16)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            # another thread may have indexed some of them while they were embedded
+            keep = [i for i, entry in enumerate(pending) if entry['hash'] not in self.hashes]
+            if not keep:
+                return 0
+            entries = [pending[i] for i in keep]
+            vectors = vectors[keep]
+            # vectors first: a crash between the two writes leaves extra vectors, truncated on load
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.entries_path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    entry['dim'] = self.dim
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.entries.extend(entries)
+            self.hashes.update(entry['hash'] for entry in entries)
+        return len(entries)
+
+    def add_async(self, messages: List[dict], session_id: Optional[str] = None, agent_type: Optional[str] = None):
+        """
+        Index messages in the background worker, off the critical path of the conversation.
+        """
+        def run():
+            try:
+                self.add(messages, session_id, agent_type)
+            except Exception as e:
+                self.logger.warning(f"Long term memory indexing failed: {e}")
+        return self._executor.submit(run)
+
+    def index_sessions_async(self, root: str = "conversations/"):
+        """
+        Index the saved sessions in the background worker.
+        """
+        def run():
+            try:
+                self.index_sessions(root)
+            except Exception as e:
+                self.logger.warning(f"Long term memory indexing failed: {e}")
+        return self._executor.submit(run)
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0,
+               exclude_session: Optional[str] = None, agent_type: Optional[str] = None,
+               chunk_rows: int = 65536) -> List[dict]:
+        """
+        Get the k indexed messages the most similar to a query (cosine similarity).
+        Args:
+            query (str): The query text
+            k (int): Number of results
+            min_score (float): Minimum similarity of a result
+            exclude_session (str, optional): Session to leave out, usually the current one
+            agent_type (str, optional): Only search the messages of an agent
+            chunk_rows (int): Rows scored at once, bounds the float32 working memory
+        Returns:
+            list: The entries with their 'score', best first
+        """
+        with self._lock:
+            matrix = self.matrix()
+            entries = self.entries[:matrix.shape[0]] if matrix is not None else []
+        if not entries:
+            return []
+        q = np.asarray(self.embed_fn([query])[0], dtype=np.float32)
+        scores = np.empty(len(entries), dtype=np.float32)
+        for start in range(0, len(entries), chunk_rows):
+            scores[start:start + chunk_rows] = matrix[start:start + chunk_rows].astype(np.float32) @ q
+        if exclude_session is not None or agent_type is not None:
+            for i, entry in enumerate(entries):
+                if (exclude_session is not None and entry['session'] == exclude_session) or \
+                   (agent_type is not None and entry['agent'] != agent_type):
+                    scores[i] = -np.inf
+        k = min(k, len(entries))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**entries[i], 'score': float(scores[i])} for i in top if scores[i] >= min_score]
+
+    def index_sessions(self, root: str = "conversations/") -> int:
+        """
+        Index the saved sessions not indexed yet (journals, binary snapshots and older .txt saves), skipping the unchanged files.
+        Returns:
+            int: Number of messages added
+        """
+        if not os.path.isdir(root):
+            return 0
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        added = 0
+        for agent_type in sorted(os.listdir(root)):
+            folder = os.path.join(root, agent_type)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                path = os.path.join(folder, name)
+                if not name.startswith("memory_") or name.endswith(".tmp"):
+                    continue
+                stamp = [os.path.getsize(path), os.path.getmtime(path)]
+                if state.get(path) == stamp:
+                    continue
+                try:
+                    messages = SessionStore.read_session(path)
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"Could not index {path}: {e}")
+                    continue
+                added += self.add(messages, session_id=name, agent_type=agent_type)
+                state[path] = stamp
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        self.logger.info(f"Long term memory: {added} messages indexed, {len(self)} in total.")
+        return added
+
+    @staticmethod
+    def format_recall(results: List[dict]) -> str:
+        """
+        Format recalled messages as a block prepended to the user message.
+        """
+        lines = [f"- ({r['role']}{', ' + r['time'] if r.get('time') else ''}) {r['text']}" for r in results]
+        return "Relevant snippets from past conversations:\n" + "\n".join(lines)
@@ -4,17 +4,66 @@ import uuid
 import os
 import sys
 import json
-from typing import List, Tuple, Type, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import List, Tuple, Type, Dict, Optional
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import configparser
 
 from sources.utility import timer_decorator, pretty_print, animate_thinking
 from sources.logger import Logger
+from sources.model_registry import model_registry
+from sources.context_budget import ContextBudget
+from sources.context_assembler import ContextAssembler
+from sources.cache import PersistentCache, cache_from_config
+from sources.session_store import get_session_store
+from sources.blob_store import get_blob_store, BLOB_THRESHOLD
 
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+# Summarization runs off the critical path, in a single worker shared by all the memories (and their shared model)
+summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compression")
+summarizer_lock = threading.Lock()
+_summary_cache = None
+_summary_cache_lock = threading.Lock()
+SUMMARY_ITEM_BYTES = 256 * 1024 * 1024
+MAX_SUMMARY_BATCH = 16
+
+_long_term_memory = None
+_long_term_memory_lock = threading.Lock()
+
+def get_long_term_memory():
+    """
+    Get the long term memory shared by all the memories, None if disabled in config.ini.
+    The saved sessions not indexed yet are indexed in the background on first use.
+    """
+    global _long_term_memory
+    if not config.getboolean('LONG_TERM_MEMORY', 'enabled', fallback=False):
+        return None
+    with _long_term_memory_lock:
+        if _long_term_memory is None:
+            from sources.long_term_memory import LongTermMemory, Embedder, DEFAULT_EMBEDDING_MODEL
+            embedder = Embedder(config.get('LONG_TERM_MEMORY', 'embedding_model', fallback=DEFAULT_EMBEDDING_MODEL))
+            _long_term_memory = LongTermMemory(config.get('LONG_TERM_MEMORY', 'path', fallback=".cache/long_term_memory"),
+                                               embed_fn=embedder)
+            _long_term_memory.index_sessions_async("conversations/")
+        return _long_term_memory
+
+def get_summary_cache() -> Optional[PersistentCache]:
+    """
+    Get the persistent summary cache shared by all the memories, None if disabled in config.ini.
+    Summaries never expire, they only depend on the text and the summarization model.
+    """
+    global _summary_cache
+    if not config.getboolean('CACHE', 'summaries', fallback=True):
+        return None
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = cache_from_config(config, "summaries", ttl=0)
+        return _summary_cache
+
 class Memory():
     """
     Memory is a class for managing the conversation memory
@@ -23,92 +72,114 @@ class Memory():
     def __init__(self, system_prompt: str,
                  recover_last_session: bool = False,
                  memory_compression: bool = True,
-                 model_provider: str = "deepseek-r1:14b"):
+                 model_provider: str = "deepseek-r1:14b",
+                 context_budget: ContextBudget = None):
         self.memory = [{'role': 'system', 'content': system_prompt}]
-        
+        self.context_budget = context_budget or ContextBudget(model_provider)
+
         self.logger = Logger("memory.log")
         self.session_time = datetime.datetime.now()
         self.session_id = str(uuid.uuid4())
         self.conversation_folder = f"conversations/"
         self.session_recovered = False
+        self.journal = None
+        self.blob_store = get_blob_store(os.path.join(self.conversation_folder, "blobs"))
+        self.long_term_memory = get_long_term_memory()
+        self._recall = (None, None)
         # memory compression system
-        self.model = None
-        self.tokenizer = None
+        self.summarizer_name = "pszemraj/led-base-book-summary"
         self.device = self.get_cuda_device()
         self.memory_compression = memory_compression
         self.model_provider = model_provider
+        self._pending_summaries: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._memory_lock = threading.Lock() # guards the replacement of messages by the summary worker
+        self.assembler = ContextAssembler(self.context_budget,
+                                          summary_fn=self.dropped_summary if memory_compression else None,
+                                          content_fn=self.message_content)
         if self.memory_compression:
             self.download_model()
         if recover_last_session:
             self.load_memory()
             self.session_recovered = True
 
-    def get_ideal_ctx(self, model_name: str) -> int | None:
+    def download_model(self):
+        """Download the model if not already downloaded. The model is shared by all Memory instances."""
+        if not model_registry.is_loaded(f"summarizer:{self.summarizer_name}"):
+            animate_thinking("Loading memory compression model...", color="status")
+        self.get_summarizer()
+        self.logger.info("Memory compression system initialized.")
+
+    def get_summarizer(self) -> Tuple[AutoTokenizer, AutoModelForSeq2SeqLM]:
         """
-        Estimate context size based on the model name.
-        EXPERIMENTAL for memory compression
+        Get the shared summarization tokenizer and model from the model registry.
+        Returns (None, None) if memory compression is disabled.
         """
-        import re
-        import math
+        if not self.memory_compression:
+            return None, None
+        def load():
+            tokenizer = AutoTokenizer.from_pretrained(self.summarizer_name)
+            model = AutoModelForSeq2SeqLM.from_pretrained(self.summarizer_name)
+            return tokenizer, model
+        return model_registry.get(f"summarizer:{self.summarizer_name}", load)
 
-        def extract_number_before_b(sentence: str) -> int:
-            match = re.search(r'(\d+)b', sentence, re.IGNORECASE)
-            return int(match.group(1)) if match else None
+    @property
+    def tokenizer(self) -> AutoTokenizer:
+        return self.get_summarizer()[0]
 
-        model_size = extract_number_before_b(model_name)
-        if not model_size:
-            return None
-        base_size = 7  # Base model size in billions
-        base_context = 4096  # Base context size in tokens
-        scaling_factor = 1.5  # Approximate scaling factor for context size growth
-        context_size = int(base_context * (model_size / base_size) ** scaling_factor)
-        context_size = 2 ** round(math.log2(context_size))
-        self.logger.info(f"Estimated context size for {model_name}: {context_size} tokens.")
-        return context_size
-    
-    def download_model(self):
-        """Download the model if not already downloaded."""
-        animate_thinking("Loading memory compression model...", color="status")
-        self.tokenizer = AutoTokenizer.from_pretrained("pszemraj/led-base-book-summary")
-        self.model = AutoModelForSeq2SeqLM.from_pretrained("pszemraj/led-base-book-summary")
-        self.logger.info("Memory compression system initialized.")
+    @property
+    def model(self) -> AutoModelForSeq2SeqLM:
+        return self.get_summarizer()[1]
     
     def get_filename(self) -> str:
-        """Get the filename for the save file."""
-        return f"memory_{self.session_time.strftime('%Y-%m-%d_%H-%M-%S')}.txt"
+        """Get the filename for the session journal."""
+        return f"memory_{self.session_time.strftime('%Y-%m-%d_%H-%M-%S')}_{self.session_id[:8]}.jsonl"
     
     def save_memory(self, agent_type: str = "casual_agent") -> None:
-        """Save the session memory to a file."""
-        if not os.path.exists(self.conversation_folder):
-            self.logger.info(f"Created folder {self.conversation_folder}.")
-            os.makedirs(self.conversation_folder)
-        save_path = os.path.join(self.conversation_folder, agent_type)
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
-        filename = self.get_filename()
-        path = os.path.join(save_path, filename)
-        json_memory = json.dumps(self.memory)
-        with open(path, 'w') as f:
-            self.logger.info(f"Saved memory json at {path}")
-            f.write(json_memory)
+        """
+        Save the session memory to its journal.
+        The first save writes the whole memory, the following pushes are appended to the journal as they happen.
+        """
+        if self.journal is None or self.journal.agent_type != agent_type:
+            store = get_session_store(self.conversation_folder)
+            self.journal = store.open_journal(self.session_id, agent_type, self.get_filename())
+            self.journal.snapshot(self.memory)
+            self.logger.info(f"Saving memory journal at {self.journal.path}")
+        self.journal.flush()
+
+    def close_journal(self) -> None:
+        """Close the session journal, so the session store can compact it."""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def new_session(self) -> None:
+        """Close the journal of the current session and start a new one, journaled at the next save."""
+        self.close_journal()
+        self.session_time = datetime.datetime.now()
+        self.session_id = str(uuid.uuid4())
+
+    def journal_snapshot(self) -> None:
+        """Record the whole memory in the journal, after an edit that is not a push."""
+        if self.journal is not None:
+            self.journal.snapshot(self.memory)
     
     def clear(self) -> None:
         """Clear the memory and reset to system prompt."""
         system_prompt = self.memory[0] if self.memory else {'role': 'system', 'content': ''}
-        self.memory = [system_prompt]
+        with self._memory_lock:
+            self.memory = [system_prompt]
+        self.journal_snapshot()
         self.logger.info("Memory cleared.")
 
     def find_last_session_path(self, path) -> str:
-        """Find the last session path."""
-        saved_sessions = []
-        for filename in os.listdir(path):
-            if filename.startswith('memory_'):
-                date = filename.split('_')[1]
-                saved_sessions.append((filename, date))
-        saved_sessions.sort(key=lambda x: x[1], reverse=True)
+        """Find the last whole-memory save of older versions (memory_<date>_<time>.txt)."""
+        # the timestamped names sort chronologically
+        saved_sessions = sorted((filename for filename in os.listdir(path)
+                                 if filename.startswith('memory_') and filename.endswith('.txt')), reverse=True)
         if len(saved_sessions) > 0:
-            self.logger.info(f"Last session found at {saved_sessions[0][0]}")
-            return saved_sessions[0][0]
+            self.logger.info(f"Last session found at {saved_sessions[0]}")
+            return saved_sessions[0]
         return None
     
     def save_json_file(self, path: str, json_memory: dict) -> None:
@@ -142,46 +213,77 @@ class Memory():
         if self.session_recovered == True:
             return
         pretty_print(f"Loading {agent_type} past memories... ", color="status")
-        save_path = os.path.join(self.conversation_folder, agent_type)
-        if not os.path.exists(save_path):
-            pretty_print("No memory to load.", color="success")
-            return
-        filename = self.find_last_session_path(save_path)
-        if filename is None:
-            pretty_print("Last session memory not found.", color="warning")
+        entry = get_session_store(self.conversation_folder).last_session(agent_type)
+        last_n = config.getint('MAIN', 'session_load_last', fallback=0) or None
+        if entry is not None:
+            memory = get_session_store(self.conversation_folder).read_session(entry['path'], last_n)
+        else:
+            save_path = os.path.join(self.conversation_folder, agent_type)
+            if not os.path.exists(save_path):
+                pretty_print("No memory to load.", color="success")
+                return
+            filename = self.find_last_session_path(save_path)
+            if filename is None:
+                pretty_print("Last session memory not found.", color="warning")
+                return
+            memory = self.load_json_file(os.path.join(save_path, filename))
+        if not memory:
+            pretty_print("Last session memory is empty.", color="warning")
             return
-        path = os.path.join(save_path, filename)
-        self.memory = self.load_json_file(path) 
+        self.memory = memory
         if self.memory[-1]['role'] == 'user':
             self.memory.pop()
+        for message in self.memory:
+            message.pop('tokens', None) # counted with the tokenizer of the model used then
+            if 'blob' in message:
+                message['tokens'] = self.context_budget.count_message(self.materialize_message(message))
         self.compress()
         pretty_print("Session recovered successfully", color="success")
     
     def reset(self, memory: list = []) -> None:
         self.logger.info("Memory reset performed.")
+        self.new_session()
         self.memory = memory
     
     def push(self, role: str, content: str) -> int:
         """Push a message to the memory."""
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        if ideal_ctx is not None:
-            if self.memory_compression and len(content) > ideal_ctx * 1.5:
-                self.logger.info(f"Compressing memory: Content {len(content)} > {ideal_ctx} model context.")
-                self.compress()
+        tokens = self.context_budget.count_message({'role': role, 'content': content})
+        if self.memory_compression and self.token_count() + tokens > self.context_budget.prompt_limit:
+            self.logger.info(f"Compressing memory: {self.token_count()} + {tokens} tokens > {self.context_budget.prompt_limit} tokens budget.")
+            self.compress()
         curr_idx = len(self.memory)
-        if self.memory[curr_idx-1]['content'] == content:
+        if self.message_content(self.memory[curr_idx-1]) == content:
             pretty_print("Warning: same message have been pushed twice to memory", color="error")
         time_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         if config["MAIN"]["provider_name"] == "openrouter":
-            self.memory.append({'role': role, 'content': content})
+            message = {'role': role, 'content': content}
         else:
-            self.memory.append({'role': role, 'content': content, 'time': time_str, 'model_used': self.model_provider})
+            message = {'role': role, 'content': content, 'time': time_str, 'model_used': self.model_provider,
+                       'tokens': tokens}
+        if len(content) > BLOB_THRESHOLD:
+            # large tool outputs are stored once, the memory and the journal only keep a reference and a preview
+            message['blob'] = self.blob_store.put(content)
+            message['content'] = self.blob_store.preview(content)
+            message['tokens'] = tokens
+        with self._memory_lock:
+            self.memory.append(message)
+        if self.journal is not None:
+            self.journal.append(message)
+        if self.long_term_memory is not None:
+            self.long_term_memory.add_async([{**message, 'content': content}], session_id=self.get_filename(),
+                                            agent_type=self.journal.agent_type if self.journal else None)
         return curr_idx-1
+
+    def token_count(self) -> int:
+        """Get the number of tokens of the memory."""
+        return self.context_budget.count_messages(self.memory)
     
     def clear(self) -> None:
         """Clear all memory except system prompt"""
         self.logger.info("Memory clear performed.")
-        self.memory = self.memory[:1]
+        with self._memory_lock:
+            self.memory = self.memory[:1]
+        self.journal_snapshot()
     
     def clear_section(self, start: int, end: int) -> None:
         """
@@ -193,11 +295,69 @@ class Memory():
         self.logger.info(f"Clearing memory section {start} to {end}.")
         start = max(0, start) + 1
         end = min(end, len(self.memory)-1) + 2
-        self.memory = self.memory[:start] + self.memory[end:]
+        with self._memory_lock:
+            self.memory = self.memory[:start] + self.memory[end:]
+        if self.journal is not None:
+            self.journal.clear_section(start, end, len(self.memory))
     
     def get(self) -> list:
         return self.memory
 
+    def message_content(self, message: dict) -> str:
+        """
+        Get the full content of a message, read from the blob store for the large ones.
+        """
+        if 'blob' in message:
+            content = self.blob_store.get(message['blob'])
+            if content is not None:
+                return content
+        return message['content']
+
+    def materialize_message(self, message: dict) -> dict:
+        """
+        Get a message with its full content in place of a blob reference.
+        """
+        if 'blob' not in message:
+            return message
+        materialized = {key: value for key, value in message.items() if key != 'blob'}
+        materialized['content'] = self.message_content(message)
+        return materialized
+
+    def get_context(self) -> list:
+        """
+        Get the messages to send to the LLM: the system prompt, a summary of the old turns
+        and the most recent turns fitting the model context.
+        """
+        context = [self.materialize_message(message) for message in self.assembler.assemble(self.memory)]
+        if self.long_term_memory is None or context[-1]['role'] != 'user':
+            return context
+        recall = self.recall_block(context[-1]['content'])
+        if recall is None or self.context_budget.count(recall) > self.context_budget.available(context):
+            return context
+        # the recalled snippets go in a copy of the last message, the memory and the context prefix are unchanged
+        last = {'role': 'user', 'content': f"{recall}\n\n{context[-1]['content']}"}
+        return context[:-1] + [last]
+
+    def recall(self, query: str) -> List[dict]:
+        """
+        Get the messages of past sessions relevant to a query from the long term memory.
+        """
+        if self.long_term_memory is None:
+            return []
+        return self.long_term_memory.search(query,
+                                            k=config.getint('LONG_TERM_MEMORY', 'top_k', fallback=3),
+                                            min_score=config.getfloat('LONG_TERM_MEMORY', 'min_score', fallback=0.45),
+                                            exclude_session=self.get_filename())
+
+    def recall_block(self, query: str) -> Optional[str]:
+        """
+        Get the recalled snippets block for a query, searched once per query.
+        """
+        if self._recall[0] != query:
+            results = self.recall(query)
+            self._recall = (query, self.long_term_memory.format_recall(results) if results else None)
+        return self._recall[1]
+
     def get_cuda_device(self) -> str:
         if torch.backends.mps.is_available():
             return "mps"
@@ -215,64 +375,206 @@ class Memory():
         Returns:
             str: The summarized text
         """
-        if self.tokenizer is None or self.model is None:
+        return self.summarize_batch([text], min_length)[0]
+
+    def summary_batch_size(self) -> int:
+        """
+        Get the number of texts summarized per batch, from the memory available on the summarizer device.
+        A 512 tokens input with 4 beams takes about SUMMARY_ITEM_BYTES during generation, a quarter of the free memory is used.
+        """
+        available = None
+        try:
+            if self.device == "cuda":
+                available = torch.cuda.mem_get_info()[0]
+            else:
+                with open("/proc/meminfo", "r") as f:
+                    for line in f:
+                        if line.startswith("MemAvailable:"):
+                            available = int(line.split()[1]) * 1024
+                            break
+        except Exception:
+            pass
+        if available is None:
+            return 4
+        return max(1, min(MAX_SUMMARY_BATCH, int(available * 0.25 // SUMMARY_ITEM_BYTES)))
+
+    def summarize_batch(self, texts: List[str], min_length: int = 64) -> List[str]:
+        """
+        Summarize texts as padded batches, texts of similar length batched together.
+        Args:
+            texts (List[str]): The texts to summarize
+            min_length (int, optional): The minimum length of the summaries. Defaults to 64.
+        Returns:
+            List[str]: The summaries, in the order of the texts
+        """
+        tokenizer, model = self.get_summarizer()
+        if tokenizer is None or model is None:
             self.logger.warning("No tokenizer or model to perform summarization.")
-            return text
-        if len(text) < min_length*1.5:
-            return text
-        max_length = len(text) // 2 if len(text) > min_length*2 else min_length*2
-        input_text = "summarize: " + text
-        inputs = self.tokenizer(input_text, return_tensors="pt", max_length=512, truncation=True)
-        summary_ids = self.model.generate(
-            inputs['input_ids'],
-            max_length=max_length,
-            min_length=min_length,
-            length_penalty=1.0,
-            num_beams=4,
-            early_stopping=True
-        )
-        summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-        summary.replace('summary:', '')
-        self.logger.info(f"Memory summarized from len {len(text)} to {len(summary)}.")
-        self.logger.info(f"Summarized text:\n{summary}")
-        return summary
+            return list(texts)
+        summaries = list(texts)
+        todo = sorted([i for i, text in enumerate(texts) if len(text) >= min_length*1.5], key=lambda i: len(texts[i]))
+        batch_size = self.summary_batch_size()
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            max_length = max(len(texts[i]) // 2 if len(texts[i]) > min_length*2 else min_length*2 for i in batch)
+            inputs = tokenizer(["summarize: " + texts[i] for i in batch], return_tensors="pt",
+                               max_length=512, truncation=True, padding=True)
+            with summarizer_lock, torch.no_grad():
+                summary_ids = model.generate(
+                    inputs['input_ids'],
+                    attention_mask=inputs['attention_mask'],
+                    max_length=max_length,
+                    min_length=min_length,
+                    length_penalty=1.0,
+                    num_beams=4,
+                    early_stopping=True
+                )
+            for i, summary in zip(batch, tokenizer.batch_decode(summary_ids, skip_special_tokens=True)):
+                summaries[i] = summary
+                self.logger.info(f"Memory summarized from len {len(texts[i])} to {len(summary)}.")
+                self.logger.info(f"Summarized text:\n{summary}")
+        return summaries
     
+    def summary_key(self, text: str) -> str:
+        return PersistentCache.make_key(self.summarizer_name, text)
+
+    def summarize_cached(self, text: str) -> str:
+        """
+        Summarize a text, unless it was already summarized in this or a previous session.
+        """
+        cache = get_summary_cache()
+        if cache is not None:
+            summary = cache.get(self.summary_key(text))
+            if summary is not None:
+                return summary
+        summary = self.summarize(text)
+        if cache is not None:
+            cache.set(self.summary_key(text), summary)
+        return summary
+
+    def dropped_summary(self, message: dict) -> Optional[str]:
+        """
+        Get the summary of a message dropped from the context window without blocking the request:
+        the swapped in or cached summary, None while it is computed by the background worker.
+        """
+        if message.get('summarized'):
+            return message['content']
+        original = self.message_content(message)
+        if self.context_budget.count(original) <= self.assembler.digest_tokens:
+            return None # short enough to be kept as is
+        cache = get_summary_cache()
+        summary = cache.get(self.summary_key(original)) if cache is not None else None
+        if summary is None:
+            self.schedule_summaries([(-1, message)])
+        return summary
+
+    def swap_summary(self, message: dict, original: str, summary: str) -> None:
+        """
+        Replace a message of the memory by a copy holding its summary, unless the message changed in the meantime.
+        The message dict itself is never modified: readers holding it (context assembly, journal) keep a consistent message.
+        """
+        if self.message_content(message) != original:
+            return
+        summarized = {key: value for key, value in message.items() if key not in ('blob', 'tokens')}
+        summarized['content'] = summary
+        summarized['summarized'] = True
+        with self._memory_lock:
+            for idx, current in enumerate(self.memory):
+                if current is message:
+                    self.memory[idx] = summarized
+                    self.assembler.replace_message(message, summarized)
+                    return
+
+    def schedule_summaries(self, messages: List[Tuple[int, dict]]) -> None:
+        """
+        Swap in the cached summaries of messages, and queue the others to be summarized together in the background worker.
+        Args:
+            messages (list): (memory index, message) pairs
+        """
+        cache = get_summary_cache()
+        jobs = []
+        with self._pending_lock:
+            for idx, message in messages:
+                original = self.message_content(message)
+                cached = cache.get(self.summary_key(original)) if cache is not None else None
+                if cached is not None:
+                    self.swap_summary(message, original, cached)
+                elif id(message) not in self._pending_summaries:
+                    jobs.append((idx, message, original))
+            if not jobs:
+                return
+            future = summary_executor.submit(self.compress_messages, jobs)
+            for _, message, _ in jobs:
+                self._pending_summaries[id(message)] = future
+
+    def compress_messages(self, jobs: List[Tuple[int, dict, str]]) -> None:
+        """
+        Summarize messages in batches and swap the summaries in, run by the background worker.
+        Args:
+            jobs (list): (memory index, message, content to summarize) tuples
+        """
+        try:
+            texts = list(dict.fromkeys(original for _, _, original in jobs))
+            summaries = dict(zip(texts, self.summarize_batch(texts)))
+            cache = get_summary_cache()
+            for text, summary in summaries.items():
+                if cache is not None:
+                    cache.set(self.summary_key(text), summary)
+            for idx, message, original in jobs:
+                self.swap_summary(message, original, summaries[original])
+            self.logger.info(f"Memory compressed: messages {[idx for idx, _, _ in jobs]} summarized.")
+        except Exception as e:
+            self.logger.warning(f"Memory compression failed: {e}")
+        finally:
+            with self._pending_lock:
+                for _, message, _ in jobs:
+                    self._pending_summaries.pop(id(message), None)
+
+    def wait_compression(self, timeout: float = None) -> None:
+        """Wait for the background summaries to be swapped in."""
+        with self._pending_lock:
+            futures = list(self._pending_summaries.values())
+        wait(futures, timeout=timeout)
+
     #@timer_decorator
-    def compress(self) -> str:
+    def compress(self, blocking: bool = False) -> None:
         """
         Compress (summarize) the memory using the model.
+        Summaries are computed in a background worker, in batches, and swapped in the messages when ready.
+        Args:
+            blocking (bool): Wait for the summaries instead of returning immediately
         """
         if self.tokenizer is None or self.model is None:
             self.logger.warning("No tokenizer or model to perform memory compression.")
             return
-        for i in range(len(self.memory)):
-            if self.memory[i]['role'] == 'system':
-                continue
-            if len(self.memory[i]['content']) > 1024:
-                self.memory[i]['content'] = self.summarize(self.memory[i]['content'])
+        self.schedule_summaries([(i, message) for i, message in enumerate(self.memory)
+                                 if message['role'] != 'system' and not message.get('summarized')
+                                 and ('blob' in message or len(message['content']) > 1024)])
+        if blocking:
+            self.wait_compression()
     
     def trim_text_to_max_ctx(self, text: str) -> str:
         """
-        Truncate a text to fit within the maximum context size of the model.
+        Truncate a text to fit within the tokens left in the model context after the memory.
         """
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        return text[:ideal_ctx] if ideal_ctx is not None else text
+        return self.context_budget.truncate(text, self.context_budget.available(self.memory))
     
     #@timer_decorator
     def compress_text_to_max_ctx(self, text) -> str:
         """
-        Compress a text to fit within the maximum context size of the model.
+        Compress a text to fit within the tokens left in the model context after the memory.
         """
         if self.tokenizer is None or self.model is None:
             self.logger.warning("No tokenizer or model to perform memory compression.")
             return text
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        if ideal_ctx is None:
-            self.logger.warning("No ideal context size found.")
-            return text
-        while len(text) > ideal_ctx:
-            self.logger.info(f"Compressing text: {len(text)} > {ideal_ctx} model context.")
-            text = self.summarize(text)
+        available = self.context_budget.available(self.memory)
+        tokens = self.context_budget.count(text)
+        while tokens > available:
+            self.logger.info(f"Compressing text: {tokens} > {available} tokens left in model context.")
+            summary = self.summarize_cached(text)
+            if len(summary) >= len(text):
+                return self.context_budget.truncate(text, available)
+            text, tokens = summary, self.context_budget.count(summary)
         return text
 
 if __name__ == "__main__":
@@ -303,7 +605,7 @@ Ensure the file exists in the specified location.
     memory.push('assistant', sample_text)
     
     print("\n---\nmemory before:", memory.get())
-    memory.compress()
+    memory.compress(blocking=True)
     print("\n---\nmemory after:", memory.get())
     #memory.save_memory()
     
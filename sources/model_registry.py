@@ -0,0 +1,195 @@
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from sources.logger import Logger
+
+def get_process_rss() -> Optional[int]:
+    """
+    Get the current resident set size of the process in bytes, from /proc on Linux.
+    Return None elsewhere: resource only gives the peak RSS, which does not measure a model load.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def get_parameters_size(obj: Any) -> int:
+    """
+    Get the size in bytes of the torch parameters and buffers held by a model (or tuple of models).
+    Return 0 for objects that are not torch modules (tokenizers, pipelines wrappers...).
+    """
+    if isinstance(obj, (tuple, list)):
+        return sum(get_parameters_size(o) for o in obj)
+    if hasattr(obj, "model") and not hasattr(obj, "parameters"): # transformers pipeline
+        obj = obj.model
+    if not hasattr(obj, "parameters"):
+        return 0
+    size = 0
+    try:
+        for tensor in list(obj.parameters()) + list(obj.buffers()):
+            size += tensor.numel() * tensor.element_size()
+    except Exception:
+        return 0
+    return size
+
+class ModelRegistry:
+    """
+    Process-wide registry of the heavy models (summarizer, translators, zero-shot pipeline...).
+    Each model is loaded once and the same reference is handed to every caller.
+    Models unused for longer than the idle TTL can be unloaded, they are reloaded on next use.
+    """
+    def __init__(self, idle_ttl: float = 0):
+        self.logger = Logger("model_registry.log")
+        self.idle_ttl = idle_ttl
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._reaper = None
+        self._reaper_stop = threading.Event()
+
+    def _get_load_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            if name not in self._load_locks:
+                self._load_locks[name] = threading.Lock()
+            return self._load_locks[name]
+
+    def get(self, name: str, loader: Callable[[], Any]) -> Any:
+        """
+        Get a shared model, loading it with loader() if not already loaded.
+        Args:
+            name (str): Unique name of the model (eg: "summarizer:pszemraj/led-base-book-summary")
+            loader (Callable): Function returning the loaded model
+        Returns:
+            Any: The shared model object
+        """
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                entry["last_used"] = time.time()
+                entry["hits"] += 1
+                return entry["model"]
+        with self._get_load_lock(name):
+            with self._lock: # another thread might have loaded it while we waited
+                entry = self._models.get(name)
+                if entry is not None:
+                    entry["last_used"] = time.time()
+                    entry["hits"] += 1
+                    return entry["model"]
+            rss_before = get_process_rss()
+            start = time.time()
+            model = loader()
+            load_time = time.time() - start
+            rss_after = get_process_rss()
+            rss_delta = None if rss_before is None or rss_after is None else max(0, rss_after - rss_before)
+            entry = {
+                "model": model,
+                "loaded_at": time.time(),
+                "last_used": time.time(),
+                "load_time": load_time,
+                "rss": rss_delta,
+                "params_size": get_parameters_size(model),
+                "hits": 0
+            }
+            with self._lock:
+                self._models[name] = entry
+            rss = "unknown" if rss_delta is None else f"+{rss_delta / 1e6:.1f} MB"
+            self.logger.info(f"Loaded {name} in {load_time:.2f}s (rss {rss}).")
+            return model
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            return name in self._models
+
+    def unload(self, name: str) -> bool:
+        """
+        Drop the registry reference to a model. Memory is freed once no caller holds it anymore.
+        Returns:
+            bool: True if the model was loaded
+        """
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if entry is None:
+            return False
+        del entry
+        self._free_memory()
+        self.logger.info(f"Unloaded {name}.")
+        return True
+
+    def unload_idle(self, ttl: float = None) -> List[str]:
+        """
+        Unload all models not used for more than ttl seconds.
+        Args:
+            ttl (float, optional): Idle time in seconds. Defaults to the registry idle TTL.
+        Returns:
+            List[str]: The names of the unloaded models
+        """
+        ttl = self.idle_ttl if ttl is None else ttl
+        if not ttl or ttl <= 0:
+            return []
+        now = time.time()
+        with self._lock:
+            idle = [name for name, entry in self._models.items() if now - entry["last_used"] > ttl]
+        return [name for name in idle if self.unload(name)]
+
+    def _free_memory(self) -> None:
+        import gc
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get memory and usage stats of every loaded model.
+        Returns:
+            Dict[str, Dict[str, Any]]: Stats per model name (RSS in MB or "unknown", params size in MB...)
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                name: {
+                    "rss_mb": "unknown" if entry["rss"] is None else round(entry["rss"] / 1e6, 1),
+                    "params_mb": round(entry["params_size"] / 1e6, 1),
+                    "load_time": round(entry["load_time"], 2),
+                    "idle_for": round(now - entry["last_used"], 1),
+                    "hits": entry["hits"]
+                } for name, entry in self._models.items()
+            }
+
+    def start_idle_reaper(self, ttl: float = None, interval: float = 60) -> None:
+        """
+        Start a daemon thread unloading idle models every interval seconds.
+        """
+        if ttl is not None:
+            self.idle_ttl = ttl
+        if not self.idle_ttl or self.idle_ttl <= 0 or self._reaper is not None:
+            return
+        self._reaper_stop = threading.Event() # a new event, a previous stop_idle_reaper set the last one
+        stop = self._reaper_stop
+        def _reap():
+            while not stop.wait(interval):
+                unloaded = self.unload_idle()
+                if unloaded:
+                    self.logger.info(f"Idle models unloaded: {unloaded}")
+        self._reaper = threading.Thread(target=_reap, daemon=True)
+        self._reaper.start()
+
+    def stop_idle_reaper(self) -> None:
+        self._reaper_stop.set()
+        self._reaper = None
+
+model_registry = ModelRegistry()
+
+if __name__ == "__main__":
+    registry = ModelRegistry(idle_ttl=1)
+    registry.get("test:list", lambda: [0] * 10_000_000)
+    registry.get("test:list", lambda: [1])
+    print(registry.report())
+    time.sleep(1.5)
+    print("Unloaded:", registry.unload_idle())
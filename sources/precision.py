@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from typing import List, Optional
+
+PRECISIONS = ["auto", "fp32", "fp16", "bf16", "int8", "gguf"]
+
+def cpu_supports_bf16() -> bool:
+    """
+    Check if the CPU has native bfloat16 instructions (AVX512-BF16/AMX on x86, BF16 on arm).
+    Without them bf16 matmuls are emulated and slower than float32.
+    """
+    if platform.system() == "Darwin":
+        return platform.machine() == "arm64"
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return any(flag in flags for flag in ("avx512_bf16", "amx_bf16", " bf16"))
+
+def resolve_precision(precision: str, device: str) -> str:
+    """
+    Get the precision to load the local model with.
+    auto picks fp16 on GPU, bf16 on CPUs supporting it and fp32 otherwise.
+    int8 dynamic quantization only runs on CPU, it falls back to fp16 on GPU.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision}, expected one of {', '.join(PRECISIONS)}")
+    if precision == "auto":
+        if device in ("cuda", "mps"):
+            return "fp16"
+        return "bf16" if cpu_supports_bf16() else "fp32"
+    if precision == "int8" and device != "cpu":
+        return "fp16"
+    return precision
+
+def torch_dtype(precision: str):
+    """
+    Get the torch dtype the weights are loaded in for a precision, int8 quantize float32 weights.
+    """
+    import torch
+
+    return {"fp16": torch.float16, "bf16": torch.bfloat16}.get(precision, torch.float32)
+
+def quantize_int8(model):
+    """
+    Quantize the Linear layers of a model to int8 with torch dynamic quantization (weights int8, activations quantized on the fly).
+    """
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def peak_rss_mb() -> float:
+    """
+    Get the peak resident memory of the process in MB.
+    """
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+def benchmark_worker(model: str, precision: str, gguf_model: Optional[str], max_new_tokens: int) -> dict:
+    """
+    Load the local model in one precision and time a generation. Run in a dedicated process for a clean peak RSS.
+    """
+    os.environ["LLM_BATCHING"] = "0"
+    os.environ["LLM_PREFIX_CACHE"] = "0"
+    os.environ["LLM_MAX_NEW_TOKENS"] = str(max_new_tokens)
+    from sources.llm_provider import Provider
+
+    provider = Provider("huggingface-local", model, precision=precision, gguf_model=gguf_model)
+    start = time.time()
+    provider.load_hf_local_model()
+    load_time = time.time() - start
+    history = [{"role": "system", "content": "You are a helpful assistant."},
+               {"role": "user", "content": "Explain in a few paragraphs how a hash map works."}]
+    provider.hf_local_generate(history) # warmup
+    provider.decoding_stats = type(provider.decoding_stats)()
+    provider.hf_local_generate(history)
+    stats = next(iter(provider.decoding_stats.report().values()))
+    return {"precision": provider.precision_mode,
+            "load_time": round(load_time, 1),
+            "tokens_per_sec": stats["tokens_per_sec"],
+            "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+def run_benchmark(model: str, precisions: List[str], gguf_model: Optional[str] = None, max_new_tokens: int = 128) -> List[dict]:
+    """
+    Compare tokens/sec and peak RSS of the local model across precisions, one process per precision.
+    """
+    results = []
+    for precision in precisions:
+        cmd = [sys.executable, "-m", "sources.precision", "--worker", "--model", model,
+               "--precision", precision, "--max-new-tokens", str(max_new_tokens)]
+        if gguf_model:
+            cmd += ["--gguf-model", gguf_model]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            error = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+            results.append({"precision": precision, "error": error})
+            continue
+        results.append(json.loads(lines[-1]))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local model precisions (tokens/sec and peak RSS).")
+    parser.add_argument("--model", default="Qwen/Qwen2.5-3B-Instruct")
+    parser.add_argument("--precision", nargs="+", default=["fp32", "bf16", "int8"], choices=PRECISIONS)
+    parser.add_argument("--gguf-model", default=None, help="Path of a GGUF file, benchmarked with --precision gguf")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(benchmark_worker(args.model, args.precision[0], args.gguf_model, args.max_new_tokens)))
+        sys.exit(0)
+    print(f"{'precision':<10}{'load (s)':>10}{'tokens/s':>10}{'peak RSS (MB)':>15}")
+    for result in run_benchmark(args.model, args.precision, args.gguf_model, args.max_new_tokens):
+        if "error" in result:
+            print(f"{result['precision']:<10} failed: {result['error']}")
+            continue
+        print(f"{result['precision']:<10}{result['load_time']:>10}{result['tokens_per_sec']:>10}{result['peak_rss_mb']:>15}")
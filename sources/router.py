@@ -1,10 +1,13 @@
 import os
 import sys
 import torch
-import random
-from typing import List, Tuple, Type, Dict
+import threading
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Type, Dict, Optional
 
 from transformers import pipeline
+import adaptive_classifier
 from adaptive_classifier import AdaptiveClassifier
 
 from sources.agents.agent import Agent
@@ -15,20 +18,43 @@ from sources.agents.browser_agent import BrowserAgent
 from sources.language import LanguageUtility
 from sources.utility import pretty_print, animate_thinking, timer_decorator
 from sources.logger import Logger
+from sources.model_registry import model_registry
+from sources.router_snapshot import RouterSnapshots
+from sources.routing_cache import RoutingCache, routing_version
+from sources.routing_stats import RoutingStats
+from sources.keyword_router import KeywordMatcher, KEYWORD_PACKS_DIR
+from sources.cache import cache_from_config
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# the complexity and task classifiers are independent given the translated query, and torch releases the GIL
+routing_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="routing")
 
 class AgentRouter:
     """
     AgentRouter is a class that selects the appropriate agent based on the user query.
     """
-    def __init__(self, agents: list, supported_language: List[str] = ["en", "fr", "zh"]):
+    def __init__(self, agents: list, supported_language: List[str] = ["en", "fr", "zh"],
+                 snapshot_dir: str = ".cache/router"):
         self.agents = agents
         self.logger = Logger("router.log")
         self.lang_analysis = LanguageUtility(supported_language=supported_language)
-        self.pipelines = self.load_pipelines()
-        self.talk_classifier = self.load_llm_router()
-        self.complexity_classifier = self.load_llm_router()
-        self.learn_few_shots_tasks()
-        self.learn_few_shots_complexity()
+        self.load_pipelines()
+        self.snapshots = RouterSnapshots(snapshot_dir, base_path=self.llm_router_path(),
+                                         base_version=getattr(adaptive_classifier, "__version__", ""))
+        self.talk_classifier, tasks_key = self.load_trained_classifier("tasks", self.few_shots_tasks())
+        self.complexity_classifier, complexity_key = self.load_trained_classifier("complexity", self.few_shots_complexity())
+        self.backend = config.get('ROUTER', 'backend', fallback='vote')
+        self.embedding_router = self.load_embedding_router(snapshot_dir) if self.backend == "embedding" else None
+        self.classifier_version = f"{tasks_key}-{complexity_key}-{self.backend}"
+        self.routing_cache = self.load_routing_cache()
+        self.stats = RoutingStats()
+        self.keyword_matcher = KeywordMatcher.from_directory(
+            config.get('ROUTER', 'keyword_packs', fallback='') or KEYWORD_PACKS_DIR,
+            roles=[agent.role for agent in self.agents])
+        self.cascade = config.getboolean('ROUTER', 'cascade', fallback=False)
+        self.cascade_margin = config.getfloat('ROUTER', 'cascade_margin', fallback=0.3)
         self.asked_clarify = False
     
     def load_pipelines(self) -> Dict[str, Type[pipeline]]:
@@ -39,8 +65,18 @@ class AgentRouter:
         """
         animate_thinking("Loading zero-shot pipeline...", color="status")
         return {
-            "bart": pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+            "bart": self.get_pipeline("bart")
+        }
+
+    def get_pipeline(self, name: str) -> Type[pipeline]:
+        """
+        Get a shared pipeline from the model registry, reload it if it was unloaded while idle.
+        """
+        models = {
+            "bart": "facebook/bart-large-mnli"
         }
+        return model_registry.get(f"zero-shot:{models[name]}",
+                                  lambda: pipeline("zero-shot-classification", model=models[name]))
 
     def load_llm_router(self) -> AdaptiveClassifier:
         """
@@ -50,7 +86,7 @@ class AgentRouter:
         exceptions:
             Exception: If the safetensors fails to load
         """
-        path = "../llm_router" if __name__ == "__main__" else "./llm_router"
+        path = self.llm_router_path()
         try:
             animate_thinking("Loading LLM router model...", color="status")
             talk_classifier = AdaptiveClassifier.from_pretrained(path)
@@ -58,6 +94,51 @@ class AgentRouter:
             raise Exception("Failed to load the routing model. Please run the dl_safetensors.sh script inside llm_router/ directory to download the model.")
         return talk_classifier
 
+    def load_routing_cache(self) -> Optional[RoutingCache]:
+        """
+        Get the cache of the routing decisions, None if disabled in config.ini.
+        """
+        if not config.getboolean('ROUTER', 'decision_cache', fallback=True):
+            return None
+        return RoutingCache(cache_from_config(config, "routing", ttl=0),
+                            routing_version(self.agents, self.classifier_version))
+
+    def load_embedding_router(self, snapshot_dir: str):
+        """
+        Load the embedding router backend, its role prototypes are computed once and saved with the router snapshots.
+        """
+        from sources.embedding_router import EmbeddingRouter, DEFAULT_ROUTER_EMBEDDING_MODEL
+
+        animate_thinking("Loading embedding router...", color="status")
+        model_name = config.get('ROUTER', 'embedding_model', fallback='') or DEFAULT_ROUTER_EMBEDDING_MODEL
+        snapshots = RouterSnapshots(snapshot_dir, base_path=self.llm_router_path(), base_version=model_name)
+        return EmbeddingRouter(self.few_shots_tasks(), model_name=model_name, snapshots=snapshots)
+
+    def llm_router_path(self) -> str:
+        return "../llm_router" if __name__ == "__main__" else "./llm_router"
+
+    def load_trained_classifier(self, name: str, few_shots: List[Tuple[str, str]]) -> Tuple[AdaptiveClassifier, str]:
+        """
+        Load a few-shot trained classifier from its snapshot, train it from the LLM router model if the
+        examples or the model changed since the snapshot was saved.
+        returns:
+            tuple: The classifier and the key of its snapshot
+        """
+        def train(examples: List[Tuple[str, str]]) -> AdaptiveClassifier:
+            animate_thinking(f"Training {name} router classifier...", color="status")
+            classifier = self.load_llm_router()
+            classifier.add_examples([text for text, _ in examples], [label for _, label in examples])
+            return classifier
+
+        def save(classifier: AdaptiveClassifier, path: str) -> None:
+            try:
+                classifier.save(path, include_onnx=False)
+            except TypeError: # older adaptive-classifier versions
+                classifier.save(path)
+
+        return self.snapshots.load_or_train(name, few_shots, load_fn=AdaptiveClassifier.from_pretrained,
+                                            train_fn=train, save_fn=save)
+
     def get_device(self) -> str:
         if torch.backends.mps.is_available():
             return "mps"
@@ -66,10 +147,9 @@ class AgentRouter:
         else:
             return "cpu"
     
-    def learn_few_shots_complexity(self) -> None:
+    def few_shots_complexity(self) -> List[Tuple[str, str]]:
         """
-        Few shot learning for complexity estimation.
-        Use the build in add_examples method of the Adaptive_classifier.
+        Few shot examples for complexity estimation, learned with the add_examples method of the Adaptive_classifier.
         """
         few_shots = [
             ("hi", "LOW"),
@@ -195,15 +275,11 @@ class AgentRouter:
             ("Create a Node.js app to query a public API for event listings and display them", "HIGH"),
             ("Find a file named ‘budget.xlsx’, analyze its data, and generate a chart", "HIGH"),
         ]
-        random.shuffle(few_shots)
-        texts = [text for text, _ in few_shots]
-        labels = [label for _, label in few_shots]
-        self.complexity_classifier.add_examples(texts, labels)
+        return few_shots
 
-    def learn_few_shots_tasks(self) -> None:
+    def few_shots_tasks(self) -> List[Tuple[str, str]]:
         """
-        Few shot learning for tasks classification.
-        Use the build in add_examples method of the Adaptive_classifier.
+        Few shot examples for tasks classification, learned with the add_examples method of the Adaptive_classifier.
         """
         few_shots = [
             ("Write a python script to check if the device on my network is connected to the internet", "coding"),
@@ -351,10 +427,7 @@ class AgentRouter:
             ("hi", "talk"),
             ("hello", "talk"),
         ]
-        random.shuffle(few_shots)
-        texts = [text for text, _ in few_shots]
-        labels = [label for _, label in few_shots]
-        self.talk_classifier.add_examples(texts, labels)
+        return few_shots
 
     def llm_router(self, text: str) -> tuple:
         """
@@ -362,10 +435,15 @@ class AgentRouter:
         Args:
             text: The input text
         """
+        return self.llm_router_predictions(text)[0]
+
+    def llm_router_predictions(self, text: str) -> List[tuple]:
+        """
+        Inference of the LLM router model, all the task labels sorted by confidence.
+        """
         predictions = self.talk_classifier.predict(text)
         predictions = [pred for pred in predictions if pred[0] not in ["HIGH", "LOW"]]
-        predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
-        return predictions[0]
+        return sorted(predictions, key=lambda x: x[1], reverse=True)
     
     def router_vote(self, text: str, labels: list, log_confidence:bool = False) -> str:
         """
@@ -376,18 +454,61 @@ class AgentRouter:
         Returns:
             str: The selected label
         """
+        return self.router_vote_scored(text, labels, log_confidence)[0]
+
+    def router_vote_scored(self, text: str, labels: list, log_confidence:bool = False,
+                           timings: Optional[Dict[str, float]] = None,
+                           cancelled: Optional[threading.Event] = None) -> Tuple[str, float]:
+        """
+        Vote between the LLM router and BART model.
+        Args:
+            timings (dict, optional): Timings of the current query, see RoutingStats.stage
+            cancelled (threading.Event, optional): Set when the vote is no longer needed, BART is then skipped
+        Returns:
+            tuple: The selected label and its normalized score
+        """
+        timings = {} if timings is None else timings
         if len(text) <= 8:
-            return "talk"
-        result_bart = self.pipelines['bart'](text, labels)
-        result_llm_router = self.llm_router(text)
+            return "talk", 1.0
+        if self.embedding_router is not None:
+            with self.stats.stage("embedding", timings):
+                predictions = self.embedding_router.classify(text, labels)
+            self.logger.info(f"Embedding routing for text {text}: {predictions[:2]} "
+                             f"in {timings['embedding'] * 1000:.1f}ms")
+            if log_confidence:
+                pretty_print(f"Agent choice -> Embedding router: {predictions[0][0]} ({predictions[0][1]})")
+            return predictions[0]
+        self.stats.count("votes")
+        with self.stats.stage("adaptive", timings):
+            predictions = self.llm_router_predictions(text)
+        llm_router, confidence_llm_router = predictions[0][0], predictions[0][1]
+        if cancelled is not None and cancelled.is_set():
+            self.logger.info(f"Vote for text {text} cancelled, BART skipped.")
+            return llm_router, confidence_llm_router
+        if self.cascade:
+            # BART runs one NLI pass per label: only ask it when the adaptive classifier hesitates
+            margin = confidence_llm_router - (predictions[1][1] if len(predictions) > 1 else 0.0)
+            if margin >= self.cascade_margin and llm_router in labels:
+                self.logger.info(f"Cascade for text {text}: LLM-router {llm_router} ({confidence_llm_router}) "
+                                 f"margin {margin:.3f}, BART skipped. "
+                                 f"Escalation rate {self.stats.rate('escalations', 'votes'):.1%}")
+                return llm_router, confidence_llm_router
+            self.stats.count("escalations")
+            self.logger.info(f"Cascade for text {text}: margin {margin:.3f} < {self.cascade_margin}, escalating to BART. "
+                             f"Escalation rate {self.stats.rate('escalations', 'votes'):.1%}")
+        with self.stats.stage("bart", timings):
+            result_bart = self.get_pipeline('bart')(text, labels)
         bart, confidence_bart = result_bart['labels'][0], result_bart['scores'][0]
-        llm_router, confidence_llm_router = result_llm_router[0], result_llm_router[1]
+        self.logger.info(f"Routing latency: adaptive {timings['adaptive'] * 1000:.1f}ms, "
+                         f"BART {timings['bart'] * 1000:.1f}ms")
         final_score_bart = confidence_bart / (confidence_bart + confidence_llm_router)
         final_score_llm = confidence_llm_router / (confidence_bart + confidence_llm_router)
         self.logger.info(f"Routing Vote for text {text}: BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
         if log_confidence:
             pretty_print(f"Agent choice -> BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
-        return bart if final_score_bart > final_score_llm else llm_router
+        if final_score_bart > final_score_llm:
+            return bart, final_score_bart
+        return llm_router, final_score_llm
     
     def find_first_sentence(self, text: str) -> str:
         first_sentence = None
@@ -406,24 +527,32 @@ class AgentRouter:
         Returns:
         str: The estimated complexity
         """
+        return self.estimate_complexity_scored(text)[0]
+
+    def estimate_complexity_scored(self, text: str) -> Tuple[str, float]:
+        """
+        Estimate the complexity of the text.
+        Returns:
+            tuple: The estimated complexity and the classifier confidence
+        """
         try:
             predictions = self.complexity_classifier.predict(text)
         except Exception as e:
             pretty_print(f"Error in estimate_complexity: {str(e)}", color="failure")
-            return "LOW"
+            return "LOW", 0.0
         predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
         if len(predictions) == 0:
-            return "LOW"
+            return "LOW", 0.0
         complexity, confidence = predictions[0][0], predictions[0][1]
         if confidence < 0.5:
             self.logger.info(f"Low confidence in complexity estimation: {confidence}")
-            return "HIGH"
+            return "HIGH", confidence
         if complexity == "HIGH":
-            return "HIGH"
+            return "HIGH", confidence
         elif complexity == "LOW":
-            return "LOW"
+            return "LOW", confidence
         pretty_print(f"Failed to estimate the complexity of the text.", color="failure")
-        return "LOW"
+        return "LOW", confidence
     
     def find_planner_agent(self) -> Agent:
         """
@@ -449,46 +578,75 @@ class AgentRouter:
         assert len(self.agents) > 0, "No agents available."
         if len(self.agents) == 1:
             return self.agents[0]
-        lowered = text.lower()
-        # Italian and English keywords for web search detection
-        web_keywords = [
-            # Italian explicit web search
-            "cerca sul web", "cercami sul web", "su internet", "cerca su internet",
-            "cercami su internet", "cerca online", "cercami online",
-            # Italian general search (often means web search)
-            "cercami", "cerca la pagina", "cerca il sito", "cerca informazioni",
-            "trovami", "trova la pagina", "trova il sito", "trova informazioni",
-            # Italian page/site references
-            "pagina di", "pagina del", "pagina della", "sito di", "sito del", "sito della",
-            "sito web", "sito ufficiale", "pagina ufficiale", "pagina web",
-            # English keywords
-            "search for", "search the web", "find the page", "find the site",
-            "look up", "google", "website", "webpage",
-            # Common terms
-            "browser", "link", "documentazione", "documento", "ufficiale",
-            "docs", "documentation", "url", "http", "www"
-        ]
-        if any(k in lowered for k in web_keywords):
+        timings = {} # per call: select_agent may run concurrently
+        with self.stats.stage("total", timings):
+            agent = self.route(text, timings)
+        self.logger.info("Routing timings: " + ", ".join(f"{name} {seconds * 1000:.1f}ms"
+                                                         for name, seconds in timings.items()))
+        return agent
+
+    def run_stage(self, name: str, fn, *args, timings: Optional[Dict[str, float]] = None):
+        """
+        Run a routing stage and record its duration, in timings too if given.
+        """
+        with self.stats.stage(name, timings):
+            return fn(*args)
+
+    def route(self, text: str, timings: Optional[Dict[str, float]] = None) -> Agent:
+        """
+        Route a query: keyword fast path for single-step queries (see keyword_router.py), language detection, decision cache,
+        translation (skipped for English), then the complexity estimation and the task vote, run concurrently.
+        The vote is cancelled when the task is complex, the planner is selected without it.
+        Args:
+            text (str): The user query
+            timings (dict, optional): Filled with the duration of each stage
+        Returns:
+            Agent: The selected agent
+        """
+        role = self.run_stage("keywords", self.keyword_matcher.match, text, timings=timings)
+        if role is not None:
+            for agent in self.agents:
+                if agent.role == role:
+                    self.logger.info(f"Keyword fast path for {text}: {role}")
+                    pretty_print(f"Selected agent: {agent.agent_name} (roles: {agent.role})", color="warning")
+                    return agent
+        lang = self.run_stage("detect", self.lang_analysis.detect_language, text, timings=timings)
+        query = self.find_first_sentence(text)
+        cached = self.routing_cache.get(query, lang) if self.routing_cache is not None else None
+        if cached is not None:
             for agent in self.agents:
-                if agent.role == "web":
+                if agent.type == cached[0]:
+                    self.logger.info(f"Routing cache hit for {query}: {agent.type} ({cached[1]})")
                     pretty_print(f"Selected agent: {agent.agent_name} (roles: {agent.role})", color="warning")
                     return agent
-        lang = self.lang_analysis.detect_language(text)
-        text = self.find_first_sentence(text)
-        text = self.lang_analysis.translate(text, lang)
+        text = query if lang == "en" else self.run_stage("translate", self.lang_analysis.translate, query, lang,
+                                                         timings=timings)
         labels = [agent.role for agent in self.agents]
-        complexity = self.estimate_complexity(text)
+        cancel_vote = threading.Event()
+        complexity_future = routing_executor.submit(self.run_stage, "complexity", self.estimate_complexity_scored, text,
+                                                    timings=timings)
+        vote_future = routing_executor.submit(self.run_stage, "vote", self.router_vote_scored, text, labels, False,
+                                              timings, cancel_vote, timings=timings)
+        complexity, complexity_confidence = complexity_future.result()
         if complexity == "HIGH":
+            # the planner is selected whatever the vote: drop it if not started, skip BART otherwise
+            cancel_vote.set()
+            vote_future.cancel()
             pretty_print(f"Complex task detected, routing to planner agent.", color="info")
-            return self.find_planner_agent()
+            planner = self.find_planner_agent()
+            if planner is not None and self.routing_cache is not None:
+                self.routing_cache.set(query, lang, planner.type, complexity_confidence)
+            return planner
         try:
-            best_agent = self.router_vote(text, labels, log_confidence=False)
+            best_agent, confidence = vote_future.result()
         except Exception as e:
             raise e
         for agent in self.agents:
             if best_agent == agent.role:
                 role_name = agent.role
                 pretty_print(f"Selected agent: {agent.agent_name} (roles: {role_name})", color="warning")
+                if self.routing_cache is not None:
+                    self.routing_cache.set(query, lang, agent.type, confidence)
                 return agent
         pretty_print(f"Error choosing agent.", color="failure")
         self.logger.error("No agent selected.")
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+from typing import Any, Callable, List, Tuple
+
+from sources.logger import Logger
+
+ROUTER_SNAPSHOT_VERSION = 1
+MANIFEST_FILENAME = "snapshot.json"
+
+def base_model_fingerprint(base_path: str) -> str:
+    """
+    Fingerprint of the base router model folder: content of the small files, size of the weights.
+    """
+    digest = hashlib.sha256()
+    if not os.path.isdir(base_path):
+        return "missing"
+    for name in sorted(os.listdir(base_path)):
+        path = os.path.join(base_path, name)
+        if not os.path.isfile(path):
+            continue
+        digest.update(name.encode("utf-8"))
+        if name.endswith(".json"):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update(str(os.path.getsize(path)).encode("utf-8"))
+    return digest.hexdigest()
+
+class RouterSnapshots:
+    """
+    Versioned snapshots of the few-shot trained router classifiers, saved under <root>/<name>-<key>/.
+    The key hashes the snapshot format version, the base model and the examples:
+    a classifier is trained once per example set and loaded from disk on the next starts.
+    """
+    def __init__(self, root: str = ".cache/router", base_path: str = "./llm_router", base_version: str = ""):
+        """
+        Args:
+            root (str): Folder of the snapshots
+            base_path (str): Folder of the base router model the classifiers are trained from
+            base_version (str): Version of the classifier library, a new version retrains the classifiers
+        """
+        self.logger = Logger("router.log")
+        self.root = root
+        self.base_path = base_path
+        self.base_version = base_version
+
+    def snapshot_key(self, name: str, few_shots: List[Tuple[str, str]]) -> str:
+        payload = json.dumps({"version": ROUTER_SNAPSHOT_VERSION, "name": name, "library": self.base_version,
+                              "base": base_model_fingerprint(self.base_path), "examples": sorted(few_shots)},
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def snapshot_path(self, name: str, key: str) -> str:
+        return os.path.join(self.root, f"{name}-{key}")
+
+    def load_or_train(self, name: str, few_shots: List[Tuple[str, str]],
+                      load_fn: Callable[[str], Any],
+                      train_fn: Callable[[List[Tuple[str, str]]], Any],
+                      save_fn: Callable[[Any, str], None]) -> Tuple[Any, str]:
+        """
+        Load the snapshot of a classifier trained on an example set, train and save it if there is none.
+        Args:
+            name (str): Name of the classifier
+            few_shots (list): (text, label) examples
+            load_fn (Callable): Loads a classifier from a snapshot folder
+            train_fn (Callable): Trains a classifier on the examples, in the given order
+            save_fn (Callable): Saves a classifier to a folder
+        Returns:
+            tuple: The classifier and the key of its snapshot
+        """
+        key = self.snapshot_key(name, few_shots)
+        path = self.snapshot_path(name, key)
+        if os.path.exists(os.path.join(path, MANIFEST_FILENAME)):
+            try:
+                classifier = load_fn(path)
+                self.logger.info(f"Router classifier {name} loaded from snapshot {path}.")
+                return classifier, key
+            except Exception as e:
+                self.logger.warning(f"Router snapshot {path} unreadable, retraining: {e}")
+                shutil.rmtree(path, ignore_errors=True)
+        examples = list(few_shots)
+        random.Random(key).shuffle(examples) # same order, same classifier across retrains
+        start = time.time()
+        classifier = train_fn(examples)
+        self.logger.info(f"Router classifier {name} trained on {len(examples)} examples in {time.time() - start:.1f}s.")
+        try:
+            self.save(name, key, classifier, save_fn, len(examples))
+        except Exception as e:
+            self.logger.warning(f"Could not save router snapshot {path}: {e}")
+        return classifier, key
+
+    def save(self, name: str, key: str, classifier: Any, save_fn: Callable[[Any, str], None], examples: int) -> None:
+        """
+        Save a snapshot atomically and remove the older snapshots of the classifier.
+        """
+        path = self.snapshot_path(name, key)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        save_fn(classifier, tmp_path)
+        with open(os.path.join(tmp_path, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({"version": ROUTER_SNAPSHOT_VERSION, "name": name, "key": key,
+                       "examples": examples, "created": time.time()}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        for other in os.listdir(self.root):
+            if other.startswith(f"{name}-") and ".tmp" not in other and other != os.path.basename(path):
+                shutil.rmtree(os.path.join(self.root, other), ignore_errors=True)
@@ -0,0 +1,57 @@
+import json
+import hashlib
+import unicodedata
+from typing import Iterable, Optional, Tuple
+
+from sources.cache import PersistentCache
+
+MAX_QUERY_CHARS = 256
+
+def normalize_query(text: str) -> str:
+    """
+    Fold the variations of a query that do not change its routing: case, unicode forms, punctuation and whitespace.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(c).startswith("P") else c for c in text)
+    return " ".join(text.split())
+
+def routing_version(agents: Iterable, classifier_version: str = "") -> str:
+    """
+    Version of the routing decisions: changes with the set of agents and the router classifiers.
+    """
+    payload = json.dumps({"agents": sorted([agent.type, agent.role] for agent in agents),
+                          "classifiers": classifier_version})
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class RoutingCache:
+    """
+    Cache of the routing decisions (agent type and confidence) keyed by the normalized query and its language.
+    The keys include the routing version: decisions made with another agent set or other classifiers
+    are never returned, and age out of the cache.
+    """
+    def __init__(self, cache: PersistentCache, version: str, max_query_chars: int = MAX_QUERY_CHARS):
+        self.cache = cache
+        self.version = version
+        self.max_query_chars = max_query_chars
+
+    def make_key(self, text: str, lang: str) -> Optional[str]:
+        normalized = normalize_query(text)
+        if not normalized or len(normalized) > self.max_query_chars:
+            return None # long queries rarely repeat, not worth a cache entry
+        return self.cache.make_key("routing", self.version, lang, normalized)
+
+    def get(self, text: str, lang: str) -> Optional[Tuple[str, float]]:
+        """
+        Get the cached (agent type, confidence) decision for a query, None on a miss.
+        """
+        key = self.make_key(text, lang)
+        value = self.cache.get(key) if key is not None else None
+        if value is None:
+            return None
+        decision = json.loads(value)
+        return decision['agent'], decision['confidence']
+
+    def set(self, text: str, lang: str, agent_type: str, confidence: float) -> None:
+        key = self.make_key(text, lang)
+        if key is not None:
+            self.cache.set(key, json.dumps({'agent': agent_type, 'confidence': confidence}))
@@ -0,0 +1,73 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+class RoutingStats:
+    """
+    Latency of the routing stages (last `window` runs of each) and event counters, to tune the router.
+    """
+    def __init__(self, window: int = 256):
+        self.window = window
+        self._timings: Dict[str, deque] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, timings: Optional[Dict[str, float]] = None):
+        """
+        Time a routing stage: with stats.stage("bart"): ...
+        Args:
+            name (str): Name of the stage
+            timings (dict, optional): Timings of the current query, the duration of the stage is also stored there
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(name, seconds)
+            if timings is not None:
+                timings[name] = seconds
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._timings.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def last(self, name: str) -> float:
+        """
+        Duration of the last run of a stage in seconds, 0 if it never ran.
+        """
+        with self._lock:
+            timings = self._timings.get(name)
+            return timings[-1] if timings else 0.0
+
+    def rate(self, name: str, total: str) -> float:
+        """
+        Ratio of two counters, e.g. rate("escalations", "votes").
+        """
+        with self._lock:
+            return self._counters.get(name, 0) / max(1, self._counters.get(total, 0))
+
+    def report(self) -> dict:
+        """
+        Get the counters and, per stage, the number of timed runs and their mean, median and max latency in ms.
+        """
+        with self._lock:
+            stages = {}
+            for name, timings in self._timings.items():
+                ordered = sorted(timings)
+                stages[name] = {"runs": len(ordered),
+                                "mean_ms": round(1000 * sum(ordered) / len(ordered), 2),
+                                "p50_ms": round(1000 * ordered[len(ordered) // 2], 2),
+                                "max_ms": round(1000 * ordered[-1], 2)}
+            return {"stages": stages, "counters": dict(self._counters)}
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import zlib
+import struct
+import argparse
+import tempfile
+from typing import Iterator, List, Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SNAPSHOT_EXT = ".snap"
+MAGIC = b"AGSNAP1\0"
+HEADER = struct.Struct("<8sBB") # magic, serializer, compressor
+TRAILER = struct.Struct("<QQ8s") # offset table position, message count, magic
+
+SERIALIZER_JSON, SERIALIZER_MSGPACK = 0, 1
+COMPRESSOR_ZLIB, COMPRESSOR_ZSTD = 0, 1
+
+def default_codecs() -> tuple:
+    """
+    Get the best (serializer, compressor) installed: msgpack and zstd when available, json and zlib otherwise.
+    """
+    return (SERIALIZER_MSGPACK if msgpack is not None else SERIALIZER_JSON,
+            COMPRESSOR_ZSTD if zstandard is not None else COMPRESSOR_ZLIB)
+
+def encode_message(message: dict, serializer: int, compressor: int) -> bytes:
+    if serializer == SERIALIZER_MSGPACK:
+        data = msgpack.packb(message, use_bin_type=True)
+    else:
+        data = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if compressor == COMPRESSOR_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+def decode_message(record: bytes, serializer: int, compressor: int) -> dict:
+    if compressor == COMPRESSOR_ZSTD:
+        if zstandard is None:
+            raise ValueError("Session snapshot compressed with zstd, please install the zstandard package.")
+        data = zstandard.ZstdDecompressor().decompress(record)
+    else:
+        data = zlib.decompress(record)
+    if serializer == SERIALIZER_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Session snapshot serialized with msgpack, please install the msgpack package.")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+def write_snapshot(path: str, messages: List[dict], serializer: Optional[int] = None,
+                   compressor: Optional[int] = None) -> None:
+    """
+    Write a session memory as a binary snapshot: a header, one compressed record per message,
+    then the table of the records offsets, so any message can be read without decoding the others.
+    The file is replaced atomically.
+    """
+    best = default_codecs()
+    serializer = best[0] if serializer is None else serializer
+    compressor = best[1] if compressor is None else compressor
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, serializer, compressor))
+        offsets = []
+        for message in messages:
+            offsets.append(f.tell())
+            f.write(encode_message(message, serializer, compressor))
+        table_offset = f.tell()
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(TRAILER.pack(table_offset, len(offsets), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class SnapshotReader:
+    """
+    Random access to the messages of a snapshot: only the header, the offset table
+    and the records asked for are read and decoded.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        magic, self.serializer, self.compressor = HEADER.unpack(self._file.read(HEADER.size))
+        self._file.seek(-TRAILER.size, os.SEEK_END)
+        self.table_offset, count, end_magic = TRAILER.unpack(self._file.read(TRAILER.size))
+        if magic != MAGIC or end_magic != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a session snapshot.")
+        self._file.seek(self.table_offset)
+        self.offsets = list(struct.unpack(f"<{count}Q", self._file.read(8 * count)))
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def record_end(self, i: int) -> int:
+        return self.offsets[i + 1] if i + 1 < len(self.offsets) else self.table_offset
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        self._file.seek(self.offsets[i])
+        return decode_message(self._file.read(self.record_end(i) - self.offsets[i]), self.serializer, self.compressor)
+
+    def iter_messages(self, start: int = 0) -> Iterator[dict]:
+        """
+        Stream the messages from index start, in one sequential read.
+        """
+        if start >= len(self):
+            return
+        self._file.seek(self.offsets[start])
+        data = self._file.read(self.table_offset - self.offsets[start])
+        base = self.offsets[start]
+        for i in range(start, len(self)):
+            yield decode_message(data[self.offsets[i] - base:self.record_end(i) - base], self.serializer, self.compressor)
+
+def read_snapshot(path: str, last_n: Optional[int] = None) -> List[dict]:
+    """
+    Read a snapshot, or only its system prompt and last_n messages.
+    """
+    with SnapshotReader(path) as reader:
+        if last_n is None or last_n + 1 >= len(reader):
+            return list(reader.iter_messages())
+        head = [reader[0]] if reader[0].get('role') == 'system' else []
+        return head + list(reader.iter_messages(len(reader) - last_n))
+
+def synthetic_session(messages_count: int) -> List[dict]:
+    session = [{'role': 'system', 'content': "You are a helpful assistant. " * 40}]
+    for i in range(messages_count):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        content = f"Message {i}: " + ("the search returned several pages of results about the topic. " * (5 + i % 30))
+        session.append({'role': role, 'content': content, 'time': "2026-01-12 14:38:47",
+                        'model_used': "deepseek-r1:14b", 'tokens': len(content) // 4})
+    return session
+
+def run_benchmark(messages_count: int = 5000, last_n: int = 50, repeat: int = 3) -> None:
+    """
+    Compare the save and load times and the file size of a large session, JSON journal snapshot vs binary snapshot.
+    """
+    session = synthetic_session(messages_count)
+    folder = tempfile.mkdtemp()
+    json_path = os.path.join(folder, "memory.jsonl")
+    snap_path = os.path.join(folder, "memory" + SNAPSHOT_EXT)
+
+    def best_of(fn) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def save_json():
+        with open(json_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"snapshot": session}, ensure_ascii=False) + "\n")
+
+    def load_json():
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.loads(f.readline())["snapshot"]
+
+    serializer, compressor = default_codecs()
+    print(f"{messages_count} messages, snapshot codecs: {'msgpack' if serializer else 'json'}"
+          f" + {'zstd' if compressor else 'zlib'}")
+    results = [
+        ("json save", best_of(save_json)),
+        ("snapshot save", best_of(lambda: write_snapshot(snap_path, session))),
+        ("json load", best_of(load_json)),
+        ("snapshot load", best_of(lambda: read_snapshot(snap_path))),
+        (f"snapshot load last {last_n}", best_of(lambda: read_snapshot(snap_path, last_n=last_n))),
+    ]
+    for name, seconds in results:
+        print(f"{name:>28}: {seconds * 1000:9.2f} ms")
+    print(f"{'json size':>28}: {os.path.getsize(json_path) / 1024:9.1f} KB")
+    print(f"{'snapshot size':>28}: {os.path.getsize(snap_path) / 1024:9.1f} KB")
+    for path in (json_path, snap_path):
+        os.remove(path)
+    os.rmdir(folder)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the session snapshot format against JSON.")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--last", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.messages, args.last, args.repeat)
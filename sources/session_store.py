@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional
+
+from sources.logger import Logger
+from sources.blob_store import get_blob_store
+from sources.session_snapshot import SNAPSHOT_EXT, write_snapshot, read_snapshot
+
+INDEX_FILENAME = "sessions_index.json"
+
+class SessionJournal:
+    """
+    Append-only JSONL journal of a session memory.
+    Each line is either a pushed message {"message": ...}, a removed section {"op": "clear_section", "start": i, "end": j}
+    (memory[i:j] removed) or the whole memory {"snapshot": [...]}, written when the memory is otherwise edited (clear, reset...).
+    Lines reach the OS at once, fsync is batched: every fsync_every lines, fsync_interval seconds or on flush().
+    """
+    def __init__(self, store: "SessionStore", session_id: str, agent_type: str, path: str):
+        self.store = store
+        self.session_id = session_id
+        self.agent_type = agent_type
+        self.path = path
+        self.message_count = 0
+        self._file = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.time()
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            due = self._unsynced >= self.store.fsync_every or time.time() - self._last_sync >= self.store.fsync_interval
+        if due:
+            self.flush()
+
+    def append(self, message: dict) -> None:
+        self.message_count += 1
+        self.write({"message": message})
+
+    def clear_section(self, start: int, end: int, message_count: int) -> None:
+        """
+        Record the removal of the messages [start:end), message_count is the number of messages left.
+        """
+        self.message_count = message_count
+        self.write({"op": "clear_section", "start": start, "end": end})
+
+    def snapshot(self, messages: List[dict]) -> None:
+        self.message_count = len(messages)
+        self.write({"snapshot": messages})
+
+    def flush(self) -> None:
+        """
+        fsync the pending lines and update the session index.
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.time()
+        self.store.update_session(self)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._file.close()
+        self.store.close_session(self)
+
+class SessionStore:
+    """
+    SessionStore keeps the session journals of the agents memories under a root folder (conversations/<agent>/)
+    and a small index of the sessions (id, agent, start/end time, message count, path),
+    so the last session of an agent is found without listing the folders.
+    """
+    def __init__(self, root: str = "conversations/", fsync_every: int = 16, fsync_interval: float = 2.0):
+        self.logger = Logger("memory.log")
+        self.root = root
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self._index = None
+        self._open: Dict[str, SessionJournal] = {}
+        self._lock = threading.Lock()
+
+    def load_index(self) -> dict:
+        if self._index is None:
+            self._index = {"sessions": {}, "last": {}}
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (json.JSONDecodeError, OSError) as e:
+                self.logger.warning(f"Unreadable session index {self.index_path}, starting a new one: {e}")
+        return self._index
+
+    def write_index(self) -> None:
+        """
+        Write the index atomically, a crash never leaves a partial index.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def open_journal(self, session_id: str, agent_type: str, filename: str) -> SessionJournal:
+        """
+        Create the journal of a new session, at <root>/<agent_type>/<filename>.
+        """
+        folder = os.path.join(self.root, agent_type)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, filename)
+        journal = SessionJournal(self, session_id, agent_type, path)
+        with self._lock:
+            index = self.load_index()
+            index["sessions"][session_id] = {"id": session_id, "agent": agent_type, "path": path,
+                                             "start": time.time(), "end": time.time(), "messages": 0}
+            index["last"][agent_type] = session_id
+            self._open[session_id] = journal
+            self.write_index()
+        return journal
+
+    def update_session(self, journal: SessionJournal) -> None:
+        with self._lock:
+            entry = self.load_index()["sessions"].get(journal.session_id)
+            if entry is None:
+                return
+            entry["end"] = time.time()
+            entry["messages"] = journal.message_count
+            self.write_index()
+
+    def close_session(self, journal: SessionJournal) -> None:
+        with self._lock:
+            self._open.pop(journal.session_id, None)
+
+    def last_session(self, agent_type: str) -> Optional[dict]:
+        """
+        Get the index entry of the last session of an agent, None if there is none.
+        """
+        with self._lock:
+            index = self.load_index()
+            entry = index["sessions"].get(index["last"].get(agent_type))
+        if entry is None or not os.path.exists(entry["path"]):
+            return None
+        return entry
+
+    @staticmethod
+    def read_journal(path: str) -> List[dict]:
+        """
+        Replay a journal into the memory it recorded. A truncated last line (crash while writing) is ignored.
+        """
+        messages = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "snapshot" in record:
+                    messages = list(record["snapshot"])
+                elif "message" in record:
+                    messages.append(record["message"])
+                elif record.get("op") == "clear_section":
+                    messages = messages[:record["start"]] + messages[record["end"]:]
+        return messages
+
+    @staticmethod
+    def read_session(path: str, last_n: Optional[int] = None) -> List[dict]:
+        """
+        Read a saved session whatever its format: binary snapshot, journal or legacy JSON save.
+        Args:
+            path (str): The session file
+            last_n (int, optional): Only keep the system prompt and the last last_n messages,
+                                    only the records needed are read from a binary snapshot
+        """
+        if path.endswith(SNAPSHOT_EXT):
+            return read_snapshot(path, last_n)
+        if path.endswith(".jsonl"):
+            messages = SessionStore.read_journal(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+        if last_n is not None and last_n + 1 < len(messages):
+            head = messages[:1] if messages[0].get('role') == 'system' else []
+            messages = head + messages[len(messages) - last_n:]
+        return messages
+
+    def compact(self, max_sessions: int = 0, binary: bool = False) -> None:
+        """
+        Bound the size of the store: keep the last max_sessions journaled sessions of each agent,
+        rewrite each closed journal as a single snapshot line and remove the blobs the kept sessions no longer reference.
+        With binary, the closed journals are converted to binary snapshots even when the pruning is disabled.
+        The whole-memory saves of older versions (memory_*.txt) are left untouched.
+        Args:
+            max_sessions (int): Sessions kept per agent, 0 disables the pruning (and the compaction unless binary)
+            binary (bool): Rewrite the closed journals as binary snapshots (see session_snapshot.py) instead
+        """
+        prune = max_sessions > 0
+        if not prune and not binary:
+            return
+        removed, compacted = 0, 0
+        with self._lock:
+            index = self.load_index()
+            by_agent: Dict[str, List[dict]] = {}
+            for entry in index["sessions"].values():
+                by_agent.setdefault(entry["agent"], []).append(entry)
+            for agent_type, entries in by_agent.items():
+                entries.sort(key=lambda e: e["start"], reverse=True)
+                for i, entry in enumerate(entries):
+                    if entry["id"] in self._open:
+                        continue
+                    if (prune and i >= max_sessions) or not os.path.exists(entry["path"]):
+                        if os.path.exists(entry["path"]):
+                            os.remove(entry["path"])
+                        del index["sessions"][entry["id"]]
+                        removed += 1
+                    elif binary and entry["path"].endswith(".jsonl"):
+                        entry["path"] = self.convert_journal(entry["path"])
+                        compacted += 1
+                    elif prune and self.compact_journal(entry["path"]):
+                        compacted += 1
+            for agent_type in index["last"].copy():
+                if index["last"][agent_type] not in index["sessions"]:
+                    del index["last"][agent_type]
+            self.write_index()
+            if prune:
+                referenced = {message['blob'] for entry in index["sessions"].values() if os.path.exists(entry["path"])
+                              for message in self.read_session(entry["path"]) if 'blob' in message}
+        blobs = get_blob_store(os.path.join(self.root, "blobs")).collect_garbage(referenced) if prune else 0
+        self.logger.info(f"Session store compacted: {compacted} journals compacted, {removed} old sessions removed, "
+                         f"{blobs} unreferenced blobs removed.")
+
+    def compact_journal(self, path: str) -> bool:
+        """
+        Rewrite a journal as a single snapshot line, return True if it was rewritten.
+        """
+        if not path.endswith(".jsonl"):
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            lines = sum(1 for _ in f)
+        if lines <= 1:
+            return False
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"snapshot": self.read_journal(path)}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return True
+
+    def convert_journal(self, path: str) -> str:
+        """
+        Rewrite a journal as a binary snapshot, return the path of the snapshot.
+        """
+        snapshot_path = path[:-len(".jsonl")] + SNAPSHOT_EXT
+        write_snapshot(snapshot_path, self.read_journal(path))
+        os.remove(path)
+        return snapshot_path
+
+_stores: Dict[str, SessionStore] = {}
+_stores_lock = threading.Lock()
+
+def get_session_store(root: str = "conversations/") -> SessionStore:
+    """
+    Get the session store of a folder, shared by all the memories saving there.
+    """
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = SessionStore(root)
+        return _stores[root]
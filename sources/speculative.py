@@ -0,0 +1,75 @@
+import threading
+from typing import Any, Dict, Optional
+
+from sources.logger import Logger
+
+class ForwardCounter:
+    """
+    Context manager counting the forward passes of a torch module.
+    """
+    def __init__(self, module: Any):
+        self.module = module
+        self.count = 0
+        self._handle = None
+
+    def _hook(self, module, inputs, output) -> None:
+        self.count += 1
+
+    def __enter__(self) -> "ForwardCounter":
+        self._handle = self.module.register_forward_hook(self._hook)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._handle.remove()
+
+class DecodingStats:
+    """
+    DecodingStats aggregates the local decoding throughput per agent type, and the draft acceptance rate of speculative decoding.
+    In assisted generation every verification pass of the main model accepts n draft tokens and adds one of its own,
+    so accepted = new tokens - main model passes, while every draft model pass proposes one token.
+    """
+    def __init__(self):
+        self.logger = Logger("provider.log")
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent_type: Optional[str], new_tokens: int, elapsed: float,
+               target_calls: int = 0, draft_calls: int = 0) -> None:
+        """
+        Record a generation.
+        Args:
+            agent_type (str): Type of the requesting agent
+            new_tokens (int): Number of generated tokens
+            elapsed (float): Generation time in seconds
+            target_calls (int): Forward passes of the main model, speculative decoding only
+            draft_calls (int): Forward passes of the draft model, speculative decoding only
+        """
+        mode = "speculative" if draft_calls else "standard"
+        key = f"{agent_type or 'unknown'}:{mode}"
+        accepted = max(0, min(new_tokens - target_calls, draft_calls))
+        with self._lock:
+            stats = self._stats.setdefault(key, {"generations": 0, "tokens": 0, "time": 0.0,
+                                                 "proposed": 0, "accepted": 0})
+            stats["generations"] += 1
+            stats["tokens"] += new_tokens
+            stats["time"] += elapsed
+            stats["proposed"] += draft_calls
+            stats["accepted"] += accepted
+        message = f"Decoding ({key}): {new_tokens} tokens in {elapsed:.1f}s ({new_tokens / max(elapsed, 1e-6):.1f} tokens/s)"
+        if draft_calls:
+            message += f", draft acceptance {accepted}/{draft_calls} ({accepted / draft_calls:.0%})"
+        self.logger.info(message)
+
+    def report(self) -> dict:
+        """
+        Get the tokens/sec and the draft acceptance rate of each agent type and decoding mode.
+        """
+        with self._lock:
+            return {
+                key: {
+                    "generations": stats["generations"],
+                    "tokens_per_sec": round(stats["tokens"] / stats["time"], 2) if stats["time"] else 0.0,
+                    "acceptance_rate": round(stats["accepted"] / stats["proposed"], 3) if stats["proposed"] else None
+                }
+                for key, stats in self._stats.items()
+            }
@@ -11,6 +11,9 @@ from sources.llm_provider import Provider
 from sources.interaction import Interaction
 from sources.agents import CasualAgent, CoderAgent, FileAgent, PlannerAgent, BrowserAgent
 from sources.browser import Browser, create_driver
+from sources.model_registry import model_registry
+from sources.cache import cache_from_config
+from sources.session_store import get_session_store
 
 def is_running_in_docker():
     """Detect if code is running inside a Docker container."""
@@ -50,11 +53,22 @@ def initialize_system(config, logger):
         
         headless = True
     
+    response_cache = None
+    if config.getboolean('CACHE', 'llm_responses', fallback=False):
+        response_cache = cache_from_config(config, "llm_responses")
     provider = Provider(
         provider_name=config["MAIN"]["provider_name"],
         model=config["MAIN"]["provider_model"],
         server_address=config["MAIN"]["provider_server_address"],
-        is_local=config.getboolean('MAIN', 'is_local')
+        is_local=config.getboolean('MAIN', 'is_local'),
+        response_cache=response_cache,
+        cache_sampled=config.getboolean('CACHE', 'cache_sampled', fallback=False),
+        greedy_decoding=config.getboolean('CACHE', 'greedy_decoding', fallback=False),
+        draft_model=config.get('SPECULATIVE', 'draft_model', fallback='') or None,
+        speculative_agent_types=config.get('SPECULATIVE', 'agent_types', fallback='').split(),
+        num_assistant_tokens=config.getint('SPECULATIVE', 'num_assistant_tokens', fallback=5),
+        precision=config.get('LOCAL_MODEL', 'precision', fallback='auto'),
+        gguf_model=config.get('LOCAL_MODEL', 'gguf_model', fallback='') or None
     )
     logger.info(f"Provider initialized: {provider.provider_name} ({provider.model})")
 
@@ -115,4 +129,8 @@ def initialize_system(config, logger):
         langs=languages
     )
     logger.info("Interaction initialized")
+    model_registry.start_idle_reaper(ttl=config.getfloat('MAIN', 'model_idle_ttl', fallback=0))
+    get_session_store().compact(max_sessions=config.getint('MAIN', 'max_saved_sessions', fallback=0),
+                                binary=config.get('MAIN', 'session_format', fallback='jsonl') == 'snapshot')
+    logger.info(f"Shared models: {model_registry.report()}")
     return interaction
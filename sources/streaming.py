@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Dict
+
+from sources.logger import Logger
+
+class TokenStream:
+    """
+    TokenStream forwards the tokens generated in the agents worker thread to the API clients.
+    Each query get a channel identified by its uid, events are buffered until a client subscribe.
+    """
+    def __init__(self, stale_after: float = 600):
+        self.logger = Logger("backend.log")
+        self.stale_after = stale_after
+        self._channels: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def open(self, uid: str) -> None:
+        """
+        Open a channel for a query. Must be called from the event loop serving the clients.
+        """
+        self.cleanup()
+        with self._lock:
+            self._channels[uid] = {
+                "loop": asyncio.get_running_loop(),
+                "queue": asyncio.Queue(),
+                "created": time.time(),
+                "closed": False
+            }
+
+    def publish(self, uid: str, event: dict) -> None:
+        """
+        Publish an event to a channel, safe to call from any thread.
+        """
+        with self._lock:
+            channel = self._channels.get(uid)
+            if channel is None or channel["closed"]:
+                return
+            channel["loop"].call_soon_threadsafe(channel["queue"].put_nowait, event)
+
+    def close(self, uid: str) -> None:
+        """
+        Close a channel, subscribers receive the buffered events then a final done event.
+        """
+        with self._lock:
+            channel = self._channels.get(uid)
+            if channel is None or channel["closed"]:
+                return
+            # closed under the lock: no event is published after the done event, and done is sent once
+            channel["closed"] = True
+            channel["loop"].call_soon_threadsafe(channel["queue"].put_nowait, {"type": "done"})
+
+    def exists(self, uid: str) -> bool:
+        with self._lock:
+            return uid in self._channels
+
+    async def subscribe(self, uid: str) -> AsyncIterator[dict]:
+        """
+        Yield the events of a channel until it is closed.
+        """
+        with self._lock:
+            channel = self._channels.get(uid)
+        if channel is None:
+            return
+        try:
+            while True:
+                event = await channel["queue"].get()
+                yield event
+                if event.get("type") == "done":
+                    break
+        finally:
+            with self._lock:
+                if channel["closed"]:
+                    self._channels.pop(uid, None)
+
+    def cleanup(self) -> None:
+        """
+        Drop closed channels nobody subscribed to.
+        """
+        now = time.time()
+        with self._lock:
+            stale = [uid for uid, channel in self._channels.items()
+                     if channel["closed"] and now - channel["created"] > self.stale_after]
+            for uid in stale:
+                self._channels.pop(uid, None)
+        if stale:
+            self.logger.info(f"Dropped {len(stale)} unread token streams.")
@@ -0,0 +1,140 @@
+"""
+Local stand-in for the self-hosted LLM server, used to test the server provider protocol.
+
+Modes:
+    - "legacy": only GET /get_updated_sentence returning the whole sentence
+    - "long_poll": GET /get_updated_sentence?offset=n&wait=s answering with incremental deltas
+    - "sse": GET /stream server-sent events, plus the long-poll route
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class StubGeneration:
+    def __init__(self, answer: str, token_delay: float):
+        self.answer = answer
+        self.token_delay = token_delay
+        self.sentence = ""
+        self.is_complete = False
+        self.condition = threading.Condition()
+        self.polls = 0
+
+    def start(self) -> None:
+        with self.condition:
+            self.sentence = ""
+            self.is_complete = False
+        threading.Thread(target=self._generate, daemon=True).start()
+
+    def _generate(self) -> None:
+        for word in self.answer.split(" "):
+            time.sleep(self.token_delay)
+            with self.condition:
+                self.sentence += word if not self.sentence else " " + word
+                self.condition.notify_all()
+        with self.condition:
+            self.is_complete = True
+            self.condition.notify_all()
+
+    def wait_update(self, offset: int, timeout: float) -> None:
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.sentence) > offset or self.is_complete, timeout=timeout)
+
+class LLMServerStub:
+    def __init__(self, mode: str = "sse", answer: str = "Hello, I am a stub LLM server.", token_delay: float = 0.01):
+        self.mode = mode
+        self.generation = StubGeneration(answer, token_delay)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LLMServerStub":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _make_handler(self):
+        stub = self
+        generation = self.generation
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, content: dict, status: int = 200) -> None:
+                body = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                path = urlparse(self.path).path
+                if path == "/generate":
+                    generation.start()
+                self.send_json({"message": "ok"})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/stream" and stub.mode == "sse":
+                    self.stream_events()
+                elif url.path == "/get_updated_sentence":
+                    generation.polls += 1
+                    if stub.mode == "legacy":
+                        with generation.condition:
+                            self.send_json({"sentence": generation.sentence, "is_complete": generation.is_complete})
+                        return
+                    offset = int(query.get("offset", ["0"])[0])
+                    generation.wait_update(offset, float(query.get("wait", ["0"])[0]))
+                    with generation.condition:
+                        self.send_json({"delta": generation.sentence[offset:],
+                                        "offset": len(generation.sentence),
+                                        "is_complete": generation.is_complete})
+                else:
+                    self.send_json({"error": "not found"}, status=404)
+
+            def stream_events(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                offset = 0
+                while True:
+                    generation.wait_update(offset, timeout=5)
+                    with generation.condition:
+                        delta = generation.sentence[offset:]
+                        offset = len(generation.sentence)
+                        is_complete = generation.is_complete
+                    event = json.dumps({"delta": delta, "is_complete": is_complete})
+                    self.wfile.write(f"data: {event}\n\n".encode())
+                    self.wfile.flush()
+                    if is_complete:
+                        break
+                self.close_connection = True
+
+        return Handler
+
+if __name__ == "__main__":
+    stub = LLMServerStub(mode="sse").start()
+    print(f"Stub LLM server running at {stub.address}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,49 @@
+import unittest
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.blob_store import BlobStore
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = BlobStore(self.root, max_memory_bytes=64)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def count_blobs(self):
+        return sum(len(files) for _, _, files in os.walk(self.root))
+
+    def test_put_deduplicates(self):
+        page = "search result " * 500
+        ref = self.store.put(page)
+        self.assertEqual(self.store.put(page), ref)
+        self.assertEqual(self.count_blobs(), 1)
+        self.assertLess(os.path.getsize(self.store.blob_path(ref)), len(page)) # stored compressed
+
+    def test_get_from_disk(self):
+        ref = self.store.put("a" * 100)
+        self.store.put("b" * 100) # evicts the first text from the in-memory LRU
+        self.assertEqual(BlobStore(self.root).get(ref), "a" * 100)
+        self.assertEqual(self.store.get(ref), "a" * 100)
+        self.assertIsNone(self.store.get("0" * 64))
+
+    def test_collect_garbage(self):
+        kept = self.store.put("kept " * 100)
+        dropped = self.store.put("dropped " * 100)
+        recent = self.store.put("recent " * 100)
+        old = time.time() - 2 * 86400
+        for ref in (kept, dropped):
+            os.utime(self.store.blob_path(ref), (old, old))
+        self.assertEqual(self.store.collect_garbage([kept]), 1)
+        self.assertFalse(os.path.exists(self.store.blob_path(dropped)))
+        self.assertTrue(os.path.exists(self.store.blob_path(kept)))
+        self.assertTrue(os.path.exists(self.store.blob_path(recent)))
+
+if __name__ == '__main__':
+    unittest.main()
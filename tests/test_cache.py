@@ -0,0 +1,61 @@
+import unittest
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.cache import PersistentCache
+
+class TestPersistentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.db")
+        self.cache = PersistentCache(self.path, namespace="test", max_memory_items=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_make_key_stable(self):
+        a = PersistentCache.make_key("model", [{"role": "user", "content": "hi"}], {"temperature": 0})
+        b = PersistentCache.make_key("model", [{"content": "hi", "role": "user"}], {"temperature": 0})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, PersistentCache.make_key("model", [{"role": "user", "content": "hi"}], {"temperature": 1}))
+
+    def test_memory_then_disk(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.set("a", "answer")
+        self.assertEqual(self.cache.get("a"), "answer")
+        reopened = PersistentCache(self.path, namespace="test")
+        self.assertEqual(reopened.get("a"), "answer")
+        self.assertEqual(reopened.disk_hits, 1)
+        self.assertEqual(reopened.get("a"), "answer")
+        self.assertEqual(reopened.memory_hits, 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_namespaces_are_isolated(self):
+        self.cache.set("a", "answer")
+        other = PersistentCache(self.path, namespace="other")
+        self.assertIsNone(other.get("a"))
+
+    def test_ttl(self):
+        cache = PersistentCache(self.path, namespace="ttl", ttl=0.05)
+        cache.set("a", "answer")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_size_eviction(self):
+        cache = PersistentCache(self.path, namespace="size", max_disk_bytes=25)
+        for key in ["a", "b", "c"]:
+            cache.set(key, "x" * 10)
+            time.sleep(0.01)
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), "x" * 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.constrained_decoding import SchemaPrefixMatcher, JsonSchemaLogitsProcessor
+
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plan": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "agent": {"type": "string", "enum": ["Coder", "File", "Web", "Casual"]},
+                    "id": {"type": "string"},
+                    "need": {"type": "array", "items": {"type": "string"}},
+                    "task": {"type": "string"}
+                }
+            }
+        }
+    }
+}
+
+class TestSchemaPrefixMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = SchemaPrefixMatcher(PLAN_SCHEMA)
+        self.plan = {"plan": [
+            {"agent": "Web", "id": "1", "need": [], "task": "Search \"weather\" APIs"},
+            {"agent": "Coder", "id": "2", "need": ["1"], "task": "Write the app"}
+        ]}
+
+    def test_valid_document(self):
+        """Test the canonical serialization of a valid plan is accepted and complete"""
+        state = self.matcher.feed(self.matcher.initial_state(), json.dumps(self.plan))
+        self.assertTrue(self.matcher.is_complete(state))
+
+    def test_every_prefix_is_valid(self):
+        """Test the document can be fed in chunks, as tokens"""
+        text = json.dumps(self.plan)
+        state = self.matcher.initial_state()
+        for i in range(0, len(text), 3):
+            state = self.matcher.feed(state, text[i:i + 3])
+            self.assertIsNotNone(state)
+        self.assertTrue(self.matcher.is_complete(state))
+
+    def test_rejects_unknown_agent(self):
+        self.assertIsNone(self.matcher.feed(self.matcher.initial_state(), '{"plan": [{"agent": "Pilot'))
+
+    def test_rejects_empty_plan(self):
+        self.assertIsNone(self.matcher.feed(self.matcher.initial_state(), '{"plan": []'))
+        matcher = SchemaPrefixMatcher({"type": "object", "properties": {
+            "plan": {**PLAN_SCHEMA["properties"]["plan"], "minItems": 0}}})
+        self.assertTrue(matcher.is_complete(matcher.feed(matcher.initial_state(), '{"plan": []}')))
+
+    def test_rejects_text_outside_document(self):
+        self.assertIsNone(self.matcher.feed(self.matcher.initial_state(), 'Here is the plan'))
+        state = self.matcher.feed(self.matcher.initial_state(), json.dumps(self.plan))
+        self.assertIsNone(self.matcher.feed(state, "\n"))
+
+    def test_rejects_raw_newline_in_string(self):
+        self.assertIsNone(self.matcher.feed(self.matcher.initial_state(), '{"plan": [{"agent": "Web", "id": "1\n'))
+
+    def test_nullable(self):
+        """Test a value of a list of types, as the need of a plan task: an array or null"""
+        matcher = SchemaPrefixMatcher({"type": "object", "properties": {"need": {"type": ["array", "null"], "items": {"type": "string"}}}})
+        self.assertTrue(matcher.is_complete(matcher.feed(matcher.initial_state(), '{"need": null}')))
+        self.assertTrue(matcher.is_complete(matcher.feed(matcher.initial_state(), '{"need": ["1"]}')))
+        self.assertIsNone(matcher.feed(matcher.initial_state(), '{"need": nu1'))
+        self.assertIsNone(matcher.feed(matcher.initial_state(), '{"need": "1"'))
+
+    def test_integer(self):
+        matcher = SchemaPrefixMatcher({"type": "array", "items": {"type": "integer"}})
+        self.assertTrue(matcher.is_complete(matcher.feed(matcher.initial_state(), "[1, 23]")))
+        self.assertIsNone(matcher.feed(matcher.initial_state(), "[1, a"))
+
+class CharTokenizer:
+    """One token per character, the token id is the code point."""
+    def decode(self, ids, skip_special_tokens=False):
+        return "".join(chr(i) for i in ids)
+
+class TestJsonSchemaLogitsProcessor(unittest.TestCase):
+    def setUp(self):
+        self.processor = JsonSchemaLogitsProcessor(PLAN_SCHEMA, CharTokenizer(), eos_token_id=[0])
+
+    def allows(self, state, text):
+        return self.processor.matcher.feed(state, text) is not None
+
+    def test_state_after_rollback(self):
+        prefix = [ord(c) for c in '{"plan": [']
+        fresh = self.processor.row_state(0, prefix)
+        self.assertTrue(self.allows(fresh, '{'))
+        # draft tokens accepted by the processor then rejected by the verification
+        self.processor.row_state(0, prefix + [ord(c) for c in '{"agent'])
+        state = self.processor.row_state(0, prefix)
+        self.assertTrue(self.allows(state, '{'))
+        self.assertFalse(self.allows(state, '"'))
+        self.assertEqual(state, JsonSchemaLogitsProcessor(PLAN_SCHEMA, CharTokenizer(), [0]).row_state(0, prefix))
+
+    def test_state_after_divergence(self):
+        prefix = [ord(c) for c in '{"plan": [{"agent": "']
+        self.processor.row_state(0, prefix + [ord(c) for c in 'Cod'])
+        state = self.processor.row_state(0, prefix + [ord(c) for c in 'We'])
+        self.assertTrue(self.allows(state, 'b"'))
+        self.assertFalse(self.allows(state, 'er"'))
+
+if __name__ == '__main__':
+    unittest.main()
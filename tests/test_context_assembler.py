@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.context_budget import ContextBudget
+from sources.context_assembler import ContextAssembler, SUMMARY_HEADER
+
+class TestContextAssembler(unittest.TestCase):
+    def setUp(self):
+        budget = ContextBudget("test-model", max_context=400, count_fn=lambda text: len(text.split()), reserve_tokens=0)
+        self.assembler = ContextAssembler(budget)
+        self.memory = [{'role': 'system', 'content': "You are a helpful assistant."}]
+
+    def add_turn(self, i):
+        self.memory.append({'role': 'user', 'content': f"question {i} " + "word " * 20})
+        self.memory.append({'role': 'assistant', 'content': f"answer {i} " + "word " * 20})
+
+    def test_short_session_unchanged(self):
+        self.add_turn(0)
+        self.assertEqual(self.assembler.assemble(self.memory), self.memory)
+
+    def test_window_fits_and_pins_system_prompt(self):
+        for i in range(30):
+            self.add_turn(i)
+            context = self.assembler.assemble(self.memory)
+            self.assertIs(context[0], self.memory[0])
+            self.assertLessEqual(self.assembler.budget.count_messages(context), 400)
+            self.assertIs(context[-1], self.memory[-1])
+        self.assertTrue(context[1]['content'].startswith(SUMMARY_HEADER))
+        self.assertEqual(context[2]['role'], 'assistant')
+
+    def test_layout_is_prefix_stable(self):
+        """Test the context only grows by appending between two slides of the window"""
+        slides = 0
+        previous = None
+        for i in range(30):
+            self.add_turn(i)
+            context = self.assembler.assemble(self.memory)
+            if previous is not None:
+                if context[:len(previous)] == previous:
+                    self.assertEqual(context[len(previous):], self.memory[-2:])
+                else:
+                    slides += 1
+            previous = context
+        self.assertGreater(slides, 0)
+        self.assertLess(slides, 10)
+
+    def test_removed_window_start(self):
+        for i in range(30):
+            self.add_turn(i)
+        self.assembler.assemble(self.memory)
+        self.memory = self.memory[:1] + self.memory[-2:]
+        self.assertEqual(self.assembler.assemble(self.memory), self.memory)
+
+    def test_replaced_window_start(self):
+        """Test the window start survives the replacement of its message by a summarized copy"""
+        for i in range(30):
+            self.add_turn(i)
+        context = self.assembler.assemble(self.memory)
+        cut = next(i for i, message in enumerate(self.memory) if message is context[2])
+        self.assertGreater(cut, 1)
+        summarized = {'role': self.memory[cut]['role'], 'content': "short summary"}
+        old, self.memory[cut] = self.memory[cut], summarized
+        self.assembler.replace_message(old, summarized)
+        self.assertEqual(self.assembler.find_first_kept(self.memory), cut)
+        self.assertIs(self.assembler.assemble(self.memory)[2], summarized)
+
+    def test_digest_waits_for_summary(self):
+        """Test a dropped message keeps its head until its summary is ready, without blocking"""
+        summaries = {}
+        assembler = ContextAssembler(self.assembler.budget, summary_fn=lambda message: summaries.get(message['content']))
+        message = {'role': 'user', 'content': "question " + "word " * 200}
+        self.assertTrue(assembler.digest(message).startswith("- user: question word"))
+        summaries[message['content']] = "short summary"
+        self.assertEqual(assembler.digest(message), "- user: short summary")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.context_budget import ContextBudget, known_context_size, approximate_token_count, DEFAULT_CONTEXT_SIZE, MESSAGE_OVERHEAD
+
+class TestContextBudget(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        def count_words(text):
+            self.calls.append(text)
+            return len(text.split())
+        self.budget = ContextBudget("test-model", max_context=100, count_fn=count_words, reserve_tokens=20)
+
+    def test_known_context_size(self):
+        self.assertEqual(known_context_size("Qwen/Qwen2.5-3B-Instruct"), 32768)
+        self.assertEqual(known_context_size("gpt-4o-mini"), 128000)
+        self.assertIsNone(known_context_size("my-model"))
+        self.assertEqual(ContextBudget(None).max_context, DEFAULT_CONTEXT_SIZE)
+
+    def test_approximate_count(self):
+        self.assertEqual(approximate_token_count(""), 0)
+        self.assertEqual(approximate_token_count("the cat sat."), 4)
+        self.assertEqual(approximate_token_count("tokenization"), 3)
+
+    def test_counts_are_memoized(self):
+        self.assertEqual(self.budget.count("one two three"), 3)
+        self.assertEqual(self.budget.count("one two three"), 3)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_message_count_cached_on_message(self):
+        message = {'role': 'user', 'content': "one two three"}
+        self.assertEqual(self.budget.count_message(message), 3 + MESSAGE_OVERHEAD)
+        message['tokens'] = 42
+        self.assertEqual(self.budget.count_message(message), 42)
+
+    def test_available(self):
+        messages = [{'role': 'system', 'content': "a b c d", 'tokens': 10},
+                    {'role': 'user', 'content': "e f", 'tokens': 30}]
+        self.assertEqual(self.budget.prompt_limit, 80)
+        self.assertEqual(self.budget.available(messages), 40)
+        self.assertTrue(self.budget.fits(messages))
+        self.assertFalse(self.budget.fits(messages + [{'role': 'user', 'content': "g", 'tokens': 41}]))
+
+    def test_truncate(self):
+        text = " ".join(f"w{i}" for i in range(50))
+        truncated = self.budget.truncate(text, 10)
+        self.assertLessEqual(self.budget.count(truncated), 10)
+        self.assertTrue(text.startswith(truncated))
+        self.assertEqual(self.budget.truncate(text, 60), text)
+        self.assertEqual(self.budget.truncate(text, 0), "")
+
+if __name__ == '__main__':
+    unittest.main()
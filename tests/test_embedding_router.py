@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import importlib.util
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+def bag_of_words(texts):
+    """Tiny deterministic embedding: hashed word counts, L2 normalized."""
+    import zlib
+    import numpy as np
+
+    vectors = np.zeros((len(texts), 128), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[i, zlib.crc32(word.strip(".,?!").encode()) % 128] += 1
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+FEW_SHOTS = [
+    ("write a python script to sort a list", "code"),
+    ("debug this java code", "coding"),
+    ("search the web for the latest news", "web"),
+    ("find on the web the price of a laptop", "web"),
+    ("find the file report.pdf on my drive", "files"),
+    ("tell me a funny story", "talk"),
+]
+
+@unittest.skipUnless(HAS_NUMPY, "numpy is required")
+class TestEmbeddingRouter(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_classify(self):
+        from sources.embedding_router import EmbeddingRouter
+
+        router = EmbeddingRouter(FEW_SHOTS, embed_fn=bag_of_words)
+        self.assertIn("code", router.labels)
+        self.assertNotIn("coding", router.labels) # alias of code
+        predictions = router.classify("debug this python script", ["talk", "web", "code", "files"])
+        self.assertEqual(predictions[0][0], "code")
+        self.assertEqual(len(predictions), 4)
+        self.assertAlmostEqual(sum(confidence for _, confidence in predictions), 1.0, places=5)
+        self.assertEqual(router.classify("search the web for news", ["web", "files"])[0][0], "web")
+
+    def test_prototypes_snapshot(self):
+        from sources.embedding_router import EmbeddingRouter
+        from sources.router_snapshot import RouterSnapshots
+
+        calls = []
+        def counting_embed(texts):
+            calls.append(len(texts))
+            return bag_of_words(texts)
+
+        snapshots = RouterSnapshots(self.root, base_path=self.root, base_version="bag-of-words")
+        first = EmbeddingRouter(FEW_SHOTS, embed_fn=counting_embed, snapshots=snapshots)
+        second = EmbeddingRouter(FEW_SHOTS, embed_fn=counting_embed, snapshots=snapshots)
+        self.assertEqual(len(calls), 1) # prototypes embedded once, then loaded
+        self.assertEqual(first.labels, second.labels)
+        self.assertTrue((first.prototypes == second.prototypes).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import sys
+import importlib.util
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.inference_engine import InferenceEngine, EngineOverloadedError
+
+HAS_TORCH = importlib.util.find_spec("torch") is not None and importlib.util.find_spec("transformers") is not None
+
+class TinyTokenizer:
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(str(i) for i in ids)
+
+def tiny_model():
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=4, max_position_embeddings=128)
+    return LlamaForCausalLM(config).eval()
+
+@unittest.skipUnless(HAS_TORCH, "torch and transformers are required")
+class TestInferenceEngine(unittest.TestCase):
+    def setUp(self):
+        self.model = tiny_model()
+        self.kwargs = {"max_new_tokens": 8, "do_sample": False, "eos_token_id": []}
+        self.prompts = [[1, 5, 9, 2], [1, 7, 3, 3, 8, 4, 2], [1, 2]]
+
+    def reference(self, prompt):
+        import torch
+        out = self.model.generate(torch.tensor([prompt]), max_new_tokens=8, do_sample=False)
+        return TinyTokenizer().decode(out[0][len(prompt):].tolist())
+
+    def test_batched_matches_sequential(self):
+        engine = InferenceEngine(self.model, TinyTokenizer(), max_batch_size=3)
+        futures = [engine.submit(prompt, self.kwargs) for prompt in self.prompts]
+        results = [future.result(timeout=60) for future in futures]
+        self.assertEqual(results, [self.reference(prompt) for prompt in self.prompts])
+        self.assertEqual([future.new_tokens for future in futures], [8, 8, 8])
+        self.assertTrue(all(future.elapsed > 0 for future in futures))
+
+    def test_streaming(self):
+        engine = InferenceEngine(self.model, TinyTokenizer(), max_batch_size=2)
+        pieces = []
+        answer = engine.generate(self.prompts[0], self.kwargs, on_text=pieces.append)
+        self.assertEqual("".join(pieces), answer)
+
+class TestAdmission(unittest.TestCase):
+    def test_bounded_queue(self):
+        engine = InferenceEngine(model=None, tokenizer=None, max_queue=1, admission_timeout=0.01)
+        engine.start = lambda: None # no decode loop, the queue is never drained
+        engine.submit([1], {})
+        with self.assertRaises(EngineOverloadedError):
+            engine.submit([1], {})
+
+    def test_failed_admission_keeps_loop_alive(self):
+        engine = InferenceEngine(model=None, tokenizer=None)
+        def admit(request):
+            if request.input_ids == [0]:
+                raise RuntimeError("bad request")
+            request.future.set_result("ok")
+        engine._admit = admit
+        failing = engine.submit([0], {})
+        with self.assertRaises(RuntimeError):
+            failing.result(timeout=5)
+        self.assertEqual(engine.submit([1], {}).result(timeout=5), "ok")
+
+class CountingTokenizer(TinyTokenizer):
+    def __init__(self):
+        self.decoded = []
+
+    def decode(self, ids, skip_special_tokens=True):
+        self.decoded.append(len(ids))
+        return super().decode(ids, skip_special_tokens)
+
+class TestIncrementalDecode(unittest.TestCase):
+    def test_decodes_new_tokens_only(self):
+        from sources.inference_engine import GenerationRequest
+        tokenizer = CountingTokenizer()
+        engine = InferenceEngine(model=None, tokenizer=tokenizer)
+        pieces = []
+        request = GenerationRequest([1], {"max_new_tokens": 50, "stop_strings": ["4 9"]}, on_text=pieces.append)
+        request.started = 0
+        tokens = list(range(10, 40)) + [4, 9, 7]
+        finished = [engine._accept(request, token) for token in tokens]
+        self.assertEqual(finished.index(True), 31) # stopped on the token completing "4 9"
+        self.assertEqual(request.text, TinyTokenizer().decode(tokens))
+        self.assertEqual("".join(pieces), request.text)
+        self.assertLessEqual(max(tokenizer.decoded), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import os
+import sys
+import importlib.util
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.keyword_router import KeywordMatcher, trie_pattern
+from sources.logger import Logger
+
+HAS_ROUTER_DEPS = all(importlib.util.find_spec(name) is not None for name in ("torch", "transformers", "adaptive_classifier"))
+
+class TestKeywordMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = KeywordMatcher.from_directory(roles=["talk", "web", "code", "files"])
+
+    def test_trie_pattern(self):
+        import re
+        pattern = re.compile(trie_pattern(["search", "search for", "sea", "link"]))
+        self.assertEqual(pattern.match("search for news").group(), "search for")
+        self.assertEqual(pattern.match("seat").group(), "sea")
+        self.assertIsNone(pattern.match("lin"))
+
+    def test_packs_route_roles(self):
+        self.assertEqual(self.matcher.match("Search the web for the latest tesla news"), "web")
+        self.assertEqual(self.matcher.match("cercami la pagina ufficiale di Python"), "web")
+        self.assertEqual(self.matcher.match("Write a python script to ping a website's server"), None) # ambiguous
+        self.assertEqual(self.matcher.match("Can you debug this? The traceback is below"), "code")
+        self.assertEqual(self.matcher.match("find the file old_project.zip on my drive"), "files")
+        self.assertEqual(self.matcher.match("嘿，你能搜索网页上关于股票市场的最新新闻吗？"), "web")
+        self.assertIsNone(self.matcher.match("Tell me a funny story"))
+
+    def test_word_boundaries(self):
+        self.assertIsNone(self.matcher.match("I saw her on linkedin"))
+        self.assertEqual(self.matcher.match("open https://example.com"), "web")
+
+    def test_roles_of_available_agents_only(self):
+        matcher = KeywordMatcher.from_directory(roles=["talk", "code"])
+        self.assertIsNone(matcher.match("search the web for cats"))
+        self.assertEqual(matcher.roles, ["code"])
+
+    def test_custom_pack(self):
+        matcher = KeywordMatcher({"de": {"word_boundaries": True, "roles": {"web": ["im Internet suchen"]}}})
+        self.assertEqual(matcher.match("Bitte im internet suchen"), "web")
+        self.assertEqual(matcher.matches("bitte im internet suchen"), {"web": ["im internet suchen"]})
+
+    def test_multi_step_cues(self):
+        self.assertEqual(self.matcher.multi_step_cue("Find the file toto.pdf then use its content"), "then")
+        self.assertIsNone(self.matcher.match("Find the file toto.pdf then use its content to reply to Jojo"))
+        self.assertIsNone(self.matcher.match("cerca il file budget.xlsx e poi crea un grafico"))
+
+    def test_complex_tasks_skip_fast_path(self):
+        """Test multi-step tasks (HIGH examples of the complexity classifier) never take the fast path"""
+        matcher = KeywordMatcher.from_directory(roles=["talk", "web", "code", "files", "planification"])
+        for text in ["Find the latest research papers on AI and build save in a file",
+                     "Find ‘gallery_list.pdf’, then build a web app to show my pics",
+                     "Find ‘budget_2025.xlsx’, analyze it, and make a chart for my boss",
+                     "Find a public API for sports scores and build a web app to show live updates",
+                     "Organize my desktop files by extension and then write a script to list them",
+                     "can you find vitess repo, clone it and install by following the readme"]:
+            self.assertIsNone(matcher.match(text), text)
+
+class FakeAgent:
+    def __init__(self, type, role):
+        self.type = type
+        self.role = role
+        self.agent_name = type
+
+class FakeClassifier:
+    def __init__(self, label):
+        self.label = label
+        self.calls = 0
+
+    def predict(self, text):
+        self.calls += 1
+        return [(self.label, 0.9)]
+
+@unittest.skipUnless(HAS_ROUTER_DEPS, "torch, transformers and adaptive_classifier are required")
+class TestKeywordFastPath(unittest.TestCase):
+    def setUp(self):
+        from sources.router import AgentRouter
+        from sources.routing_stats import RoutingStats
+
+        self.agents = [FakeAgent("casual_agent", "talk"), FakeAgent("code_agent", "code"), FakeAgent("file_agent", "files"),
+                       FakeAgent("browser_agent", "web"), FakeAgent("planner_agent", "planification")]
+        # classifiers stubbed: every query reaching them is complex, so only the fast path selects another agent
+        self.router = AgentRouter.__new__(AgentRouter)
+        self.router.agents = self.agents
+        self.router.logger = Logger("router.log")
+        self.router.lang_analysis = MagicMock(detect_language=MagicMock(return_value="en"))
+        self.router.complexity_classifier = FakeClassifier("HIGH")
+        self.router.router_vote_scored = MagicMock(return_value=("talk", 0.5))
+        self.router.routing_cache = None
+        self.router.stats = RoutingStats()
+        self.router.keyword_matcher = KeywordMatcher.from_directory(roles=[agent.role for agent in self.agents])
+
+    def test_single_step_fast_path(self):
+        self.assertIs(self.router.route("Search the web for the latest tesla news"), self.agents[3])
+        self.assertEqual(self.router.complexity_classifier.calls, 0)
+
+    def test_complex_examples_reach_planner(self):
+        high = [text for text, label in self.router.few_shots_complexity() if label == "HIGH"]
+        self.assertGreater(len(high), 30)
+        for text in high:
+            self.assertIs(self.router.route(text), self.agents[4], text)
+        self.assertEqual(self.router.complexity_classifier.calls, len(high))
+
+if __name__ == '__main__':
+    unittest.main()
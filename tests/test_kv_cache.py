@@ -0,0 +1,65 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.kv_cache import PrefixCache, common_prefix_length
+
+class FakeKVCache:
+    """
+    Minimal stand-in for a transformers Cache (get_seq_length/crop).
+    """
+    def __init__(self, length: int):
+        self.length = length
+
+    def get_seq_length(self) -> int:
+        return self.length
+
+    def crop(self, length: int) -> None:
+        self.length = min(self.length, length)
+
+class TestPrefixCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = PrefixCache(max_sessions=2)
+        self.history = [{'role': 'system', 'content': 'You are a coder.'}]
+
+    def test_common_prefix_length(self):
+        self.assertEqual(common_prefix_length([1, 2, 3], [1, 2, 4]), 2)
+        self.assertEqual(common_prefix_length([], [1]), 0)
+        self.assertEqual(common_prefix_length([1, 2], [1, 2, 3]), 2)
+
+    def test_miss_then_hit(self):
+        key = PrefixCache.session_key(self.history)
+        past, reused = self.cache.lookup(key, [1, 2, 3])
+        self.assertIsNone(past)
+        self.assertEqual(reused, 0)
+        self.cache.store(key, [1, 2, 3, 10, 11], FakeKVCache(4))
+        past, reused = self.cache.lookup(key, [1, 2, 3, 10, 11, 20, 21])
+        self.assertIsNotNone(past)
+        self.assertEqual(reused, 4) # bounded by the cached KV length
+        self.assertEqual(past.get_seq_length(), 4)
+        self.assertEqual(self.cache.hit_ratio, 0.5)
+
+    def test_crop_to_divergence(self):
+        key = PrefixCache.session_key(self.history)
+        self.cache.store(key, [1, 2, 3, 4, 5], FakeKVCache(5))
+        past, reused = self.cache.lookup(key, [1, 2, 9, 9])
+        self.assertEqual(reused, 2)
+        self.assertEqual(past.get_seq_length(), 2)
+
+    def test_last_token_always_prefilled(self):
+        key = PrefixCache.session_key(self.history)
+        self.cache.store(key, [1, 2, 3], FakeKVCache(3))
+        _, reused = self.cache.lookup(key, [1, 2, 3])
+        self.assertEqual(reused, 2)
+
+    def test_lru_eviction(self):
+        for i in range(3):
+            self.cache.store(f"session{i}", [1, 2, 3], FakeKVCache(3))
+        past, _ = self.cache.lookup("session0", [1, 2, 3, 4])
+        self.assertIsNone(past)
+        past, _ = self.cache.lookup("session2", [1, 2, 3, 4])
+        self.assertIsNotNone(past)
+
+if __name__ == '__main__':
+    unittest.main()
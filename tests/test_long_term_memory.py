@@ -0,0 +1,75 @@
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+import importlib.util
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+def bag_of_words(texts):
+    """Tiny deterministic embedding: hashed word counts, L2 normalized."""
+    import zlib
+    import numpy as np
+
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[i, zlib.crc32(word.strip(".,?!").encode()) % 64] += 1
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+@unittest.skipUnless(HAS_NUMPY, "numpy is required")
+class TestLongTermMemory(unittest.TestCase):
+    def setUp(self):
+        from sources.long_term_memory import LongTermMemory
+
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "ltm")
+        self.ltm = LongTermMemory(self.path, embed_fn=bag_of_words)
+        self.messages = [
+            {'role': 'system', 'content': "You are a helpful assistant and you answer questions."},
+            {'role': 'user', 'content': "How do I configure the nginx reverse proxy for my flask app?"},
+            {'role': 'assistant', 'content': "Add a location block with proxy_pass to the flask port in nginx."},
+            {'role': 'user', 'content': "What is a good recipe for a chocolate cake with berries?"},
+            {'role': 'user', 'content': "ok"},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_add_skips_system_short_and_duplicates(self):
+        self.assertEqual(self.ltm.add(self.messages, session_id="s1"), 3)
+        self.assertEqual(self.ltm.add(self.messages, session_id="s2"), 0)
+        self.assertEqual(os.path.getsize(self.ltm.vectors_path), 3 * 64 * 2) # float16 rows
+
+    def test_search(self):
+        self.ltm.add(self.messages, session_id="s1")
+        results = self.ltm.search("nginx proxy for flask", k=2)
+        self.assertEqual(len(results), 2)
+        self.assertIn("nginx", results[0]['text'])
+        self.assertGreaterEqual(results[0]['score'], results[1]['score'])
+        self.assertEqual(self.ltm.search("nginx proxy for flask", k=2, exclude_session="s1"), [])
+
+    def test_reload_from_disk(self):
+        from sources.long_term_memory import LongTermMemory
+
+        self.ltm.add(self.messages, session_id="s1")
+        reloaded = LongTermMemory(self.path, embed_fn=bag_of_words)
+        self.assertEqual(len(reloaded), 3)
+        self.assertIn("cake", reloaded.search("chocolate cake recipe", k=1)[0]['text'])
+
+    def test_incremental_session_indexing(self):
+        conversations = os.path.join(self.root, "conversations")
+        os.makedirs(os.path.join(conversations, "casual_agent"))
+        path = os.path.join(conversations, "casual_agent", "memory_2026-01-12_14-38-47.txt")
+        with open(path, "w") as f:
+            json.dump(self.messages, f)
+        self.assertEqual(self.ltm.index_sessions(conversations), 3)
+        self.assertEqual(self.ltm.index_sessions(conversations), 0)
+        self.assertEqual(self.ltm.search("flask nginx", k=1)[0]['agent'], "casual_agent")
+
+if __name__ == '__main__':
+    unittest.main()
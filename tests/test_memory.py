@@ -3,9 +3,11 @@ import os
 import sys
 import json
 import datetime
+from unittest.mock import patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
 from sources.memory import Memory
+from sources.cache import PersistentCache
 
 class TestMemory(unittest.TestCase):
     def setUp(self):
@@ -35,7 +37,7 @@ class TestMemory(unittest.TestCase):
     def test_get_filename(self):
         filename = self.memory.get_filename()
         self.assertTrue(filename.startswith("memory_"))
-        self.assertTrue(filename.endswith(".txt"))
+        self.assertTrue(filename.endswith(".jsonl"))
         self.assertIn(self.memory.session_time.strftime('%Y-%m-%d'), filename)
 
     def test_save_memory(self):
@@ -52,6 +54,18 @@ class TestMemory(unittest.TestCase):
         self.assertEqual(self.memory.memory[1]['role'], "user")
         self.assertEqual(self.memory.memory[1]['content'], "Hello")
 
+    def test_push_large_output_as_blob(self):
+        page = "page text " * 1000
+        self.memory.push("user", page)
+        self.memory.push("assistant", "ok")
+        self.memory.push("user", page)
+        self.assertIn('blob', self.memory.memory[1])
+        self.assertEqual(self.memory.memory[1]['blob'], self.memory.memory[3]['blob'])
+        self.assertLess(len(self.memory.memory[1]['content']), len(page))
+        context = self.memory.get_context()
+        self.assertEqual(context[1]['content'], page)
+        self.assertNotIn('blob', context[1])
+
     def test_clear(self):
         self.memory.push("user", "Hello")
         self.memory.clear()
@@ -89,5 +103,91 @@ class TestMemory(unittest.TestCase):
         self.assertEqual(len(new_memory.memory), 3)  # System + messages
         self.assertEqual(new_memory.memory[1]['content'], "Hello")
 
+    def test_background_summary_cache(self):
+        cache = PersistentCache(":memory:", namespace="test_summaries", ttl=0)
+        long_text = "tool output " * 200
+        self.memory.push("user", long_text)
+        message = self.memory.memory[1]
+        with patch("sources.memory.get_summary_cache", return_value=cache), \
+             patch.object(self.memory, "summarize_batch", side_effect=lambda texts: ["short summary"] * len(texts)) as summarize:
+            self.memory.schedule_summaries([(1, message)])
+            self.memory.wait_compression(timeout=5)
+            self.assertEqual(self.memory.memory[1]['content'], "short summary")
+            self.assertNotIn('tokens', self.memory.memory[1])
+            self.assertEqual(self.memory.message_content(message), long_text) # swapped in a new dict, never modified in place
+            # the same text in another message is never summarized twice
+            other = {'role': 'user', 'content': long_text}
+            self.memory.memory.append(other)
+            self.memory.schedule_summaries([(2, other)])
+            self.assertEqual(self.memory.memory[2]['content'], "short summary")
+            self.assertEqual(summarize.call_count, 1)
+
+    def test_summarize_batch(self):
+        class FakeTokenizer:
+            def __call__(self, texts, **kwargs):
+                return {'input_ids': texts, 'attention_mask': None}
+            def batch_decode(self, outputs, **kwargs):
+                return outputs
+        class FakeModel:
+            def __init__(self):
+                self.batches = []
+            def generate(self, input_ids, **kwargs):
+                self.batches.append(len(input_ids))
+                return [f"summary {text.split()[1]}" for text in input_ids]
+        model = FakeModel()
+        texts = [f"text{i} " * (50 + 10 * (i % 3)) for i in range(5)] + ["short"]
+        with patch.object(self.memory, "get_summarizer", return_value=(FakeTokenizer(), model)), \
+             patch.object(self.memory, "summary_batch_size", return_value=2):
+            summaries = self.memory.summarize_batch(texts)
+        self.assertEqual(summaries[:5], [f"summary text{i}" for i in range(5)])
+        self.assertEqual(summaries[5], "short") # too short to be summarized
+        self.assertEqual(model.batches, [2, 2, 1])
+
+    def test_summary_swap_keeps_window_start(self):
+        from sources.context_budget import ContextBudget
+        from sources.context_assembler import ContextAssembler
+        budget = ContextBudget("test-model", max_context=400, count_fn=lambda text: len(text.split()), reserve_tokens=0)
+        self.memory.assembler = ContextAssembler(budget)
+        for i in range(30):
+            self.memory.memory.append({'role': 'user', 'content': f"question {i} " + "word " * 20})
+            self.memory.memory.append({'role': 'assistant', 'content': f"answer {i} " + "word " * 20})
+        first_kept = self.memory.assembler.assemble(self.memory.memory)[2]
+        cut = next(i for i, message in enumerate(self.memory.memory) if message is first_kept)
+        self.memory.swap_summary(first_kept, first_kept['content'], "short summary")
+        self.assertEqual(self.memory.memory[cut]['content'], "short summary")
+        self.assertEqual(self.memory.assembler.find_first_kept(self.memory.memory), cut)
+
+    def test_dropped_summary_never_blocks(self):
+        cache = PersistentCache(":memory:", namespace="test_dropped", ttl=0)
+        long_text = "tool output " * 200
+        message = {'role': 'user', 'content': long_text}
+        with patch("sources.memory.get_summary_cache", return_value=cache), \
+             patch.object(self.memory, "summarize", side_effect=AssertionError("summarized on the request path")), \
+             patch.object(self.memory, "schedule_summaries") as schedule:
+            self.assertIsNone(self.memory.dropped_summary(message))
+            schedule.assert_called_once_with([(-1, message)])
+            cache.set(self.memory.summary_key(long_text), "short summary")
+            self.assertEqual(self.memory.dropped_summary(message), "short summary")
+            self.assertIsNone(self.memory.dropped_summary({'role': 'user', 'content': "hi"}))
+            summarized = {'role': 'user', 'content': "a summary " * 100, 'summarized': True}
+            self.assertEqual(self.memory.dropped_summary(summarized), summarized['content'])
+            self.assertEqual(schedule.call_count, 1)
+
+    def test_reset_closes_journal(self):
+        from sources.session_store import get_session_store
+        store = get_session_store(self.memory.conversation_folder)
+        self.memory.push("user", "Hello")
+        self.memory.save_memory()
+        self.memory.push("assistant", "Hi")
+        session_id, path = self.memory.session_id, self.memory.journal.path
+        self.assertIn(session_id, store._open)
+        self.memory.reset([{"role": "system", "content": "New prompt"}])
+        self.assertIsNone(self.memory.journal)
+        self.assertNotIn(session_id, store._open)
+        self.assertNotEqual(self.memory.session_id, session_id)
+        store.compact(max_sessions=5)
+        with open(path, "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1) # closed, so compacted to a single snapshot
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,74 @@
+import unittest
+import os
+import sys
+import time
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.model_registry import ModelRegistry
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = ModelRegistry()
+        self.loads = 0
+
+    def loader(self):
+        self.loads += 1
+        return {"weights": [0] * 1000}
+
+    def test_load_once(self):
+        first = self.registry.get("test:model", self.loader)
+        second = self.registry.get("test:model", self.loader)
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, 1)
+
+    def test_concurrent_load_once(self):
+        def slow_loader():
+            time.sleep(0.1)
+            return self.loader()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get("test:model", slow_loader)))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_report(self):
+        self.registry.get("test:model", self.loader)
+        self.registry.get("test:model", self.loader)
+        report = self.registry.report()
+        self.assertIn("test:model", report)
+        self.assertEqual(report["test:model"]["hits"], 1)
+        self.assertIn("rss_mb", report["test:model"])
+
+    def test_unload_idle(self):
+        self.registry.get("test:model", self.loader)
+        self.assertEqual(self.registry.unload_idle(ttl=60), [])
+        time.sleep(0.05)
+        self.assertEqual(self.registry.unload_idle(ttl=0.01), ["test:model"])
+        self.assertFalse(self.registry.is_loaded("test:model"))
+        self.registry.get("test:model", self.loader)
+        self.assertEqual(self.loads, 2)
+
+    def test_restart_idle_reaper(self):
+        self.registry.start_idle_reaper(ttl=0.01, interval=0.01)
+        self.registry.stop_idle_reaper()
+        self.registry.start_idle_reaper(ttl=0.01, interval=0.01)
+        self.registry.get("test:model", self.loader)
+        deadline = time.time() + 5
+        while self.registry.is_loaded("test:model") and time.time() < deadline:
+            time.sleep(0.01)
+        self.registry.stop_idle_reaper()
+        self.assertFalse(self.registry.is_loaded("test:model"))
+
+    def test_rss_unknown(self):
+        with patch("sources.model_registry.get_process_rss", return_value=None):
+            self.registry.get("test:model", self.loader)
+        self.assertEqual(self.registry.report()["test:model"]["rss_mb"], "unknown")
+
+if __name__ == '__main__':
+    unittest.main()
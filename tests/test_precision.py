@@ -0,0 +1,29 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.precision import resolve_precision
+
+class TestResolvePrecision(unittest.TestCase):
+    def test_auto_on_gpu(self):
+        self.assertEqual(resolve_precision("auto", "cuda"), "fp16")
+        self.assertEqual(resolve_precision("auto", "mps"), "fp16")
+
+    def test_auto_on_cpu(self):
+        with patch("sources.precision.cpu_supports_bf16", return_value=True):
+            self.assertEqual(resolve_precision("auto", "cpu"), "bf16")
+        with patch("sources.precision.cpu_supports_bf16", return_value=False):
+            self.assertEqual(resolve_precision("auto", "cpu"), "fp32")
+
+    def test_int8_is_cpu_only(self):
+        self.assertEqual(resolve_precision("int8", "cpu"), "int8")
+        self.assertEqual(resolve_precision("int8", "cuda"), "fp16")
+
+    def test_unknown_precision(self):
+        with self.assertRaises(ValueError):
+            resolve_precision("int4", "cpu")
+
+if __name__ == '__main__':
+    unittest.main()
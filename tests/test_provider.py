@@ -9,6 +9,7 @@ import platform
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
 
 from sources.llm_provider import Provider
+from sources.cache import PersistentCache
 
 class TestIsIpOnline(unittest.TestCase):
     def setUp(self):
@@ -66,5 +67,132 @@ class TestIsIpOnline(unittest.TestCase):
             result = self.checker.is_ip_online(address)
             self.assertTrue(result)
 
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.provider = Provider("test", "test-model")
+        self.history = [{"role": "user", "content": "Make a plan"}]
+
+    def test_stream_matches_respond(self):
+        """Test the streamed chunks join to the blocking answer"""
+        chunks = list(self.provider.stream(self.history))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), self.provider.respond(self.history, verbose=False))
+
+    def test_respond_on_token(self):
+        """Test respond forwards every chunk to on_token"""
+        tokens = []
+        answer = self.provider.respond(self.history, verbose=False, on_token=tokens.append)
+        self.assertEqual("".join(tokens), answer)
+
+class TestAsyncRespond(unittest.IsolatedAsyncioTestCase):
+    async def test_arespond_matches_respond(self):
+        """Test providers without async backend fall back to the blocking respond"""
+        provider = Provider("test", "test-model")
+        history = [{"role": "user", "content": "Make a plan"}]
+        tokens = []
+        answer = await provider.arespond(history, verbose=False, on_token=tokens.append)
+        self.assertEqual(answer, provider.respond(history, verbose=False))
+        self.assertEqual("".join(tokens), answer)
+
+class TestStopSequences(unittest.TestCase):
+    def setUp(self):
+        self.provider = Provider("test", "test-model")
+        self.history = [{"role": "user", "content": "Make a plan"}]
+
+    def test_stop_is_inclusive(self):
+        """Test the answer ends with the stop string"""
+        answer = self.provider.respond(self.history, verbose=False, stop=['"agent": "Web"'])
+        self.assertTrue(answer.endswith('"agent": "Web"'))
+        self.assertNotIn('"id"', answer)
+
+    def test_stream_closed_on_stop(self):
+        """Test the provider stream is closed once the stop string is reached"""
+        closed = []
+        def chunks():
+            try:
+                yield from ["Run:\n```bash\nls", "\n```\n", "Some ", "explanation"]
+            finally:
+                closed.append(True)
+        tokens = list(self.provider.iter_until_stop(chunks(), ["\n```\n"]))
+        self.assertEqual("".join(tokens), "Run:\n```bash\nls\n```\n")
+        self.assertEqual(closed, [True])
+
+    def test_cut_at_earliest_stop(self):
+        self.assertEqual(self.provider.cut_at_stop("a NO_UPDATE b REQUEST_EXIT", ["REQUEST_EXIT", "NO_UPDATE"]), "a NO_UPDATE")
+        self.assertEqual(self.provider.cut_at_stop("no stop", ["NO_UPDATE"]), "no stop")
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = PersistentCache(":memory:", namespace="test_responses")
+        self.provider = Provider("test", "test-model", response_cache=self.cache)
+        self.history = [{"role": "user", "content": "Make a plan", "time": "now"}]
+
+    def test_hit_on_normalized_history(self):
+        """Test an identical history, up to metadata and whitespace, is served from the cache"""
+        answer = self.provider.respond(self.history, verbose=False)
+        llm = MagicMock(side_effect=AssertionError("cache bypassed"))
+        with patch.dict(self.provider.available_providers, {"test": llm}):
+            cached = self.provider.respond([{"role": "user", "content": "Make a plan  \n"}], verbose=False)
+        llm.assert_not_called()
+        self.assertEqual(cached, answer)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_greedy_decoding(self):
+        """Test the cache keeps the sampling parameters, greedy decoding is opt-in and makes the calls cacheable"""
+        provider = Provider("lm-studio", "test-model", response_cache=self.cache)
+        self.assertEqual(provider.openai_request_params({})["temperature"], 0.7)
+        self.assertIsNone(provider.response_cache_key(self.history))
+        provider = Provider("lm-studio", "test-model", response_cache=self.cache, greedy_decoding=True)
+        self.assertEqual(provider.openai_request_params({})["temperature"], 0)
+        self.assertIsNotNone(provider.response_cache_key(self.history))
+
+    def test_strict_schema_params(self):
+        """Test the schema sent as an OpenAI strict structured output has no minItems"""
+        provider = Provider("lm-studio", "test-model")
+        schema = {"title": "plan", "type": "object", "properties": {"plan": {"type": "array", "minItems": 1,
+                  "items": {"type": "object", "properties": {"need": {"type": ["array", "null"], "items": {"type": "string"}}}}}}}
+        sent = provider.openai_request_params({"json_schema": schema})["response_format"]["json_schema"]
+        self.assertTrue(sent["strict"])
+        self.assertNotIn("minItems", sent["schema"]["properties"]["plan"])
+        self.assertEqual(sent["schema"]["properties"]["plan"]["items"], schema["properties"]["plan"]["items"])
+        self.assertEqual(schema["properties"]["plan"]["minItems"], 1) # the schema of the caller is left as is
+
+    def test_sampled_calls_bypass(self):
+        """Test sampled providers skip the cache unless cache_sampled is set"""
+        provider = Provider("server", "test-model", response_cache=self.cache)
+        self.assertIsNone(provider.response_cache_key(self.history))
+        provider.cache_sampled = True
+        self.assertIsNotNone(provider.response_cache_key(self.history))
+
+class TestAsyncErrors(unittest.TestCase):
+    def run_astream(self, provider, method, handler):
+        import asyncio
+        import httpx
+        async def collect():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://backend")
+            with patch("sources.llm_provider.async_client_pool.get", return_value=client), \
+                 patch("sources.llm_provider.animate_thinking"), patch("sources.llm_provider.pretty_print"):
+                return [chunk async for chunk in getattr(provider, method)([{"role": "user", "content": "hi"}], False)]
+        return asyncio.run(collect())
+
+    def test_ollama_pulls_once(self):
+        """Test a model still missing after the pull fails instead of pulling forever"""
+        import httpx
+        requests = []
+        def handler(request):
+            requests.append(request.url.path)
+            return httpx.Response(404 if request.url.path == "/api/chat" else 200, json={})
+        with self.assertRaises(Exception) as ctx:
+            self.run_astream(Provider("ollama", "missing-model", is_local=True), "ollama_astream", handler)
+        self.assertIn("404", str(ctx.exception))
+        self.assertEqual(requests, ["/api/chat", "/api/pull", "/api/chat"])
+
+    def test_server_http_error(self):
+        """Test the async server stream handles HTTP errors like the sync one"""
+        import httpx
+        def handler(request):
+            raise httpx.ConnectError("connection refused", request=request)
+        self.assertEqual(self.run_astream(Provider("server", "model", "127.0.0.1:1"), "server_astream", handler), [])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
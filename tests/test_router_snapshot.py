@@ -0,0 +1,70 @@
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.router_snapshot import RouterSnapshots
+
+class TestRouterSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.root, "llm_router")
+        os.makedirs(self.base_path)
+        with open(os.path.join(self.base_path, "config.json"), "w") as f:
+            json.dump({"embedding_dim": 768}, f)
+        self.snapshots = RouterSnapshots(os.path.join(self.root, "snapshots"), base_path=self.base_path)
+        self.few_shots = [("hi", "talk"), ("write a python script", "code"), ("search the web", "web")]
+        self.trained = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def train(self, examples):
+        self.trained.append(examples)
+        return {"examples": examples}
+
+    @staticmethod
+    def save(classifier, path):
+        with open(os.path.join(path, "examples.json"), "w") as f:
+            json.dump(classifier, f)
+
+    @staticmethod
+    def load(path):
+        with open(os.path.join(path, "examples.json")) as f:
+            return json.load(f)
+
+    def load_or_train(self, few_shots):
+        return self.snapshots.load_or_train("tasks", few_shots, load_fn=self.load, train_fn=self.train, save_fn=self.save)
+
+    def test_trained_once(self):
+        classifier, key = self.load_or_train(self.few_shots)
+        loaded, loaded_key = self.load_or_train(list(reversed(self.few_shots))) # same example set
+        self.assertEqual(len(self.trained), 1)
+        self.assertEqual(key, loaded_key)
+        self.assertEqual(loaded['examples'], [list(example) for example in classifier['examples']])
+
+    def test_retrained_when_examples_change(self):
+        _, key = self.load_or_train(self.few_shots)
+        _, new_key = self.load_or_train(self.few_shots + [("find report.pdf", "files")])
+        self.assertEqual(len(self.trained), 2)
+        self.assertNotEqual(key, new_key)
+        self.assertEqual(os.listdir(self.snapshots.root), [f"tasks-{new_key}"]) # older snapshot removed
+
+    def test_retrained_when_base_model_changes(self):
+        _, key = self.load_or_train(self.few_shots)
+        with open(os.path.join(self.base_path, "config.json"), "w") as f:
+            json.dump({"embedding_dim": 384}, f)
+        _, new_key = self.load_or_train(self.few_shots)
+        self.assertNotEqual(key, new_key)
+
+    def test_deterministic_order(self):
+        self.load_or_train(self.few_shots)
+        shutil.rmtree(self.snapshots.root)
+        self.load_or_train(self.few_shots)
+        self.assertEqual(self.trained[0], self.trained[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.cache import PersistentCache
+from sources.routing_cache import RoutingCache, normalize_query, routing_version
+
+class FakeAgent:
+    def __init__(self, type, role):
+        self.type = type
+        self.role = role
+
+class TestRoutingCache(unittest.TestCase):
+    def setUp(self):
+        self.agents = [FakeAgent("casual_agent", "talk"), FakeAgent("code_agent", "code")]
+        self.store = PersistentCache(":memory:", namespace="routing_test", ttl=0)
+        self.cache = RoutingCache(self.store, routing_version(self.agents, "tasks-complexity"))
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  Hi!  "), "hi")
+        self.assertEqual(normalize_query("Search the WEB, for\tX?"), "search the web for x")
+        self.assertEqual(normalize_query("write c++"), "write c++")
+
+    def test_hit_on_normalized_query(self):
+        self.assertIsNone(self.cache.get("Continue", "en"))
+        self.cache.set("Continue", "en", "casual_agent", 0.9)
+        self.assertEqual(self.cache.get("continue!", "en"), ("casual_agent", 0.9))
+        self.assertIsNone(self.cache.get("continue", "fr"))
+
+    def test_long_queries_not_cached(self):
+        query = "write a python script " * 20
+        self.cache.set(query, "en", "code_agent", 0.8)
+        self.assertIsNone(self.cache.get(query, "en"))
+
+    def test_invalidated_by_version(self):
+        self.cache.set("hi", "en", "casual_agent", 1.0)
+        more_agents = self.agents + [FakeAgent("file_agent", "files")]
+        self.assertIsNone(RoutingCache(self.store, routing_version(more_agents, "tasks-complexity")).get("hi", "en"))
+        self.assertIsNone(RoutingCache(self.store, routing_version(self.agents, "retrained")).get("hi", "en"))
+        self.assertEqual(RoutingCache(self.store, routing_version(list(reversed(self.agents)), "tasks-complexity")).get("hi", "en"),
+                         ("casual_agent", 1.0))
+
+if __name__ == '__main__':
+    unittest.main()
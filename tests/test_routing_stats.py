@@ -0,0 +1,43 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.routing_stats import RoutingStats
+
+class TestRoutingStats(unittest.TestCase):
+    def test_stage_timings(self):
+        stats = RoutingStats(window=2)
+        for seconds in (0.010, 0.020, 0.030):
+            stats.record("bart", seconds)
+        with stats.stage("adaptive"):
+            pass
+        report = stats.report()
+        self.assertEqual(report['stages']['bart']['runs'], 2) # only the last runs are kept
+        self.assertEqual(report['stages']['bart']['max_ms'], 30.0)
+        self.assertEqual(stats.last("bart"), 0.030)
+        self.assertIn("adaptive", report['stages'])
+        self.assertEqual(stats.last("translate"), 0.0)
+
+    def test_query_timings(self):
+        stats = RoutingStats()
+        first, second = {}, {}
+        with stats.stage("detect", first):
+            pass
+        with stats.stage("vote", second):
+            pass
+        stats.record("translate", 0.2)
+        self.assertEqual(list(first), ["detect"]) # each query only gets the timings of its own stages
+        self.assertEqual(list(second), ["vote"])
+        self.assertEqual(stats.report()['stages']['translate']['runs'], 1)
+
+    def test_rate(self):
+        stats = RoutingStats()
+        self.assertEqual(stats.rate("escalations", "votes"), 0.0)
+        stats.count("votes", 4)
+        stats.count("escalations")
+        self.assertEqual(stats.rate("escalations", "votes"), 0.25)
+        self.assertEqual(stats.report()['counters'], {"votes": 4, "escalations": 1})
+
+if __name__ == '__main__':
+    unittest.main()
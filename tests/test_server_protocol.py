@@ -0,0 +1,43 @@
+import unittest
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sources.llm_provider import Provider
+from llm_server_stub import LLMServerStub
+
+ANSWER = "The quick brown fox jumps over the lazy dog."
+
+class TestServerProtocol(unittest.TestCase):
+    def run_provider(self, mode: str) -> tuple:
+        stub = LLMServerStub(mode=mode, answer=ANSWER, token_delay=0.01).start()
+        try:
+            provider = Provider("server", "stub-model", server_address=stub.address)
+            history = [{"role": "user", "content": "hello"}]
+            start = time.time()
+            chunks = list(provider.stream(history, verbose=False))
+            return chunks, time.time() - start, stub.generation.polls
+        finally:
+            stub.stop()
+
+    def test_sse(self):
+        chunks, _, polls = self.run_provider("sse")
+        self.assertEqual("".join(chunks), ANSWER)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(polls, 0)
+
+    def test_long_poll(self):
+        chunks, elapsed, _ = self.run_provider("long_poll")
+        self.assertEqual("".join(chunks), ANSWER)
+        self.assertLess(elapsed, 2)
+
+    def test_legacy(self):
+        chunks, elapsed, _ = self.run_provider("legacy")
+        self.assertEqual("".join(chunks), ANSWER)
+        self.assertLess(elapsed, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.session_snapshot import SnapshotReader, write_snapshot, read_snapshot, synthetic_session
+from sources.session_store import SessionStore
+
+class TestSessionSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "memory_1.snap")
+        self.session = synthetic_session(20)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        write_snapshot(self.path, self.session)
+        self.assertEqual(read_snapshot(self.path), self.session)
+
+    def test_random_access(self):
+        write_snapshot(self.path, self.session)
+        with SnapshotReader(self.path) as reader:
+            self.assertEqual(len(reader), 21)
+            self.assertEqual(reader[5], self.session[5])
+            self.assertEqual(reader[-1], self.session[-1])
+            self.assertEqual(list(reader.iter_messages(18)), self.session[18:])
+
+    def test_last_messages_only(self):
+        write_snapshot(self.path, self.session)
+        messages = read_snapshot(self.path, last_n=4)
+        self.assertEqual(messages, self.session[:1] + self.session[-4:])
+        self.assertEqual(read_snapshot(self.path, last_n=100), self.session)
+
+    def test_not_a_snapshot(self):
+        with open(self.path, "wb") as f:
+            f.write(b"{}" * 40)
+        with self.assertRaises(ValueError):
+            SnapshotReader(self.path)
+
+    def test_compact_to_snapshots(self):
+        store = SessionStore(self.root)
+        journal = store.open_journal("session-1", "code_agent", "memory_1.jsonl")
+        journal.snapshot(self.session[:3])
+        journal.append(self.session[3])
+        journal.close()
+        store.compact(max_sessions=2, binary=True)
+        entry = store.last_session("code_agent")
+        self.assertTrue(entry['path'].endswith(".snap"))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "code_agent", "memory_1.jsonl")))
+        self.assertEqual(store.read_session(entry['path']), self.session[:4])
+        self.assertEqual(SessionStore(self.root).read_session(entry['path'], last_n=1), [self.session[0], self.session[3]])
+
+    def test_convert_without_pruning(self):
+        store = SessionStore(self.root)
+        for i in range(3):
+            journal = store.open_journal(f"session-{i}", "code_agent", f"memory_{i}.jsonl")
+            journal.snapshot(self.session[:2])
+            journal.close()
+        store.compact(max_sessions=0, binary=True)
+        files = sorted(os.listdir(os.path.join(self.root, "code_agent")))
+        self.assertEqual(files, ["memory_0.snap", "memory_1.snap", "memory_2.snap"]) # converted, none pruned
+        self.assertEqual(store.read_session(store.last_session("code_agent")['path']), self.session[:2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.session_store import SessionStore
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = SessionStore(self.root, fsync_every=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_journal_replay(self):
+        journal = self.store.open_journal("session-1", "casual_agent", "memory_1.jsonl")
+        journal.snapshot([{'role': 'system', 'content': "prompt"}])
+        journal.append({'role': 'user', 'content': "hello"})
+        journal.append({'role': 'assistant', 'content': "hi"})
+        journal.flush()
+        messages = self.store.read_journal(journal.path)
+        self.assertEqual([m['content'] for m in messages], ["prompt", "hello", "hi"])
+        journal.snapshot([{'role': 'system', 'content': "prompt"}]) # memory cleared
+        journal.append({'role': 'user', 'content': "again"})
+        self.assertEqual([m['content'] for m in self.store.read_journal(journal.path)], ["prompt", "again"])
+
+    def test_clear_section_replay(self):
+        journal = self.store.open_journal("session-1", "browser_agent", "memory_1.jsonl")
+        journal.snapshot([{'role': 'system', 'content': "prompt"}])
+        for i in range(4):
+            journal.append({'role': 'user', 'content': f"page {i}"})
+        journal.clear_section(1, 3, 3)
+        journal.append({'role': 'user', 'content': "page 4"})
+        journal.close()
+        self.assertEqual([m['content'] for m in self.store.read_session(journal.path)], ["prompt", "page 2", "page 3", "page 4"])
+        with open(journal.path) as f:
+            self.assertEqual(len(f.readlines()), 7) # one small record per edit, the memory is not rewritten
+        self.assertEqual(self.store.last_session("browser_agent")['messages'], 4)
+
+    def test_truncated_line_ignored(self):
+        journal = self.store.open_journal("session-1", "casual_agent", "memory_1.jsonl")
+        journal.append({'role': 'user', 'content': "hello"})
+        journal.close()
+        with open(journal.path, "a") as f:
+            f.write('{"message": {"role": "us')
+        self.assertEqual(len(self.store.read_journal(journal.path)), 1)
+
+    def test_last_session_from_index(self):
+        for i in range(3):
+            journal = self.store.open_journal(f"session-{i}", "code_agent", f"memory_{i}.jsonl")
+            journal.append({'role': 'user', 'content': f"message {i}"})
+            journal.close()
+        entry = SessionStore(self.root).last_session("code_agent") # fresh store, read from the index file
+        self.assertEqual(entry['id'], "session-2")
+        self.assertEqual(entry['messages'], 1)
+        self.assertIsNone(self.store.last_session("file_agent"))
+
+    def test_compact(self):
+        for i in range(4):
+            journal = self.store.open_journal(f"session-{i}", "code_agent", f"memory_{i}.jsonl")
+            journal.snapshot([{'role': 'system', 'content': "prompt"}])
+            journal.append({'role': 'user', 'content': f"message {i}"})
+            journal.close()
+        legacy = [f"memory_2026-01-1{i}_14-38-47.txt" for i in range(3)]
+        for name in legacy:
+            with open(os.path.join(self.root, "code_agent", name), "w") as f:
+                json.dump([], f)
+        self.store.compact(max_sessions=0) # disabled
+        self.assertEqual(len(os.listdir(os.path.join(self.root, "code_agent"))), 7)
+        self.store.compact(max_sessions=2)
+        files = sorted(os.listdir(os.path.join(self.root, "code_agent")))
+        self.assertEqual(files, sorted(["memory_2.jsonl", "memory_3.jsonl"] + legacy)) # legacy saves are never removed
+        with open(os.path.join(self.root, "code_agent", "memory_3.jsonl")) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertEqual([m['content'] for m in self.store.read_journal(os.path.join(self.root, "code_agent", "memory_3.jsonl"))],
+                         ["prompt", "message 3"])
+        self.assertEqual(self.store.last_session("code_agent")['id'], "session-3")
+
+if __name__ == '__main__':
+    unittest.main()
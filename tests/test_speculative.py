@@ -0,0 +1,52 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.speculative import DecodingStats, ForwardCounter
+
+class FakeHandle:
+    def __init__(self, hooks, hook):
+        self.hooks, self.hook = hooks, hook
+
+    def remove(self):
+        self.hooks.remove(self.hook)
+
+class FakeModule:
+    """
+    Minimal stand-in for a torch module forward hooks.
+    """
+    def __init__(self):
+        self.hooks = []
+
+    def register_forward_hook(self, hook):
+        self.hooks.append(hook)
+        return FakeHandle(self.hooks, hook)
+
+    def __call__(self):
+        for hook in self.hooks:
+            hook(self, (), None)
+
+class TestSpeculative(unittest.TestCase):
+    def test_forward_counter(self):
+        module = FakeModule()
+        with ForwardCounter(module) as counter:
+            module()
+            module()
+        module()
+        self.assertEqual(counter.count, 2)
+        self.assertEqual(module.hooks, [])
+
+    def test_acceptance_rate(self):
+        stats = DecodingStats()
+        # 4 verification passes accepted 6 of the 10 drafted tokens, plus 4 tokens of the main model
+        stats.record("code_agent", new_tokens=10, elapsed=2.0, target_calls=4, draft_calls=10)
+        stats.record("code_agent", new_tokens=10, elapsed=5.0)
+        report = stats.report()
+        self.assertEqual(report["code_agent:speculative"]["acceptance_rate"], 0.6)
+        self.assertEqual(report["code_agent:speculative"]["tokens_per_sec"], 5.0)
+        self.assertIsNone(report["code_agent:standard"]["acceptance_rate"])
+        self.assertEqual(report["code_agent:standard"]["tokens_per_sec"], 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import os
+import sys
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+from sources.streaming import TokenStream
+
+class TestTokenStream(unittest.IsolatedAsyncioTestCase):
+    async def test_publish_from_thread(self):
+        stream = TokenStream()
+        stream.open("uid")
+        def produce():
+            for token in ["Hel", "lo", "!"]:
+                stream.publish("uid", {"type": "token", "token": token})
+            stream.close("uid")
+        thread = threading.Thread(target=produce)
+        thread.start()
+        events = [event async for event in stream.subscribe("uid")]
+        thread.join()
+        self.assertEqual("".join(e["token"] for e in events if e["type"] == "token"), "Hello!")
+        self.assertEqual(events[-1]["type"], "done")
+        self.assertFalse(stream.exists("uid"))
+
+    async def test_unknown_uid(self):
+        stream = TokenStream()
+        stream.publish("missing", {"type": "token", "token": "x"})
+        events = [event async for event in stream.subscribe("missing")]
+        self.assertEqual(events, [])
+
+    async def test_close_once(self):
+        """Test concurrent closes send a single done event and nothing is published after it"""
+        stream = TokenStream()
+        stream.open("uid")
+        threads = [threading.Thread(target=stream.close, args=("uid",)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stream.publish("uid", {"type": "token", "token": "late"})
+        await asyncio.sleep(0)
+        events = [event async for event in stream.subscribe("uid")]
+        self.assertEqual(events, [{"type": "done"}])
+
+if __name__ == '__main__':
+    unittest.main()